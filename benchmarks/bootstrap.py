@@ -0,0 +1,64 @@
+"""Count the statements executed to fetch the current schema version.
+
+Usage: PYTHONPATH=. python benchmarks/bootstrap.py [DB_URL]
+
+The statements are counted when db_config does not exist (only if it does
+not exist in the given database), when the row of the schema is missing,
+and when both exist. Without DB_URL, an in-memory SQLite database is used.
+Note that db_config and rows for schemas named "bootstrap-benchmark..."
+are left in the given database.
+"""
+
+from __future__ import annotations
+
+import sys
+import uuid
+from typing import Any
+
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.engine import Connection
+
+from dbupgrade.db import connect, fetch_current_db_versions
+
+_SCHEMA = "bootstrap-benchmark"
+
+
+def _count(conn: Connection, schema: str, statements: list[str]) -> int:
+    statements.clear()
+    fetch_current_db_versions(conn, schema)
+    return len(statements)
+
+
+def main() -> None:
+    url = sys.argv[1] if len(sys.argv) > 1 else "sqlite://"
+    engine = create_engine(url)
+    statements: list[str] = []
+
+    def record(conn: Any, cursor: Any, statement: str, *args: Any) -> None:
+        statements.append(statement)
+
+    try:
+        with connect(engine) as conn:
+            has_table = inspect(conn).has_table("db_config")
+            conn.rollback()
+            if has_table:
+                fetch_current_db_versions(conn, _SCHEMA)
+            event.listen(engine, "before_cursor_execute", record)
+            results = []
+            if not has_table:
+                results.append(("no table", _count(conn, _SCHEMA, statements)))
+            new_schema = "{}-{}".format(_SCHEMA, uuid.uuid4().hex[:8])
+            results.append(("no row", _count(conn, new_schema, statements)))
+            results.append(("existing", _count(conn, _SCHEMA, statements)))
+    finally:
+        engine.dispose()
+    for name, count in results:
+        print(
+            "{:<10} {:<10} {} statements".format(
+                engine.dialect.name, name, count
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
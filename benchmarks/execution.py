@@ -0,0 +1,62 @@
+"""Compare the per-statement overhead of the statement execution modes.
+
+Usage: PYTHONPATH=. python benchmarks/execution.py [STATEMENTS]
+
+Each mode applies the same script of single-row INSERT statements to a
+fresh in-memory SQLite database. SQLite itself is fast, so the difference
+between the modes is dominated by SQLAlchemy's statement handling.
+"""
+
+from __future__ import annotations
+
+import sys
+import time
+
+from sqlalchemy import create_engine
+
+from dbupgrade.db import (
+    EXECUTION_MODES,
+    ExecutionMode,
+    fetch_current_db_versions,
+    update_sql,
+)
+
+_TABLE = "CREATE TABLE t(id INTEGER, value VARCHAR(100))"
+
+
+def _statements(count: int) -> list[str]:
+    return [
+        "INSERT INTO t VALUES({0}, 'value {0}')".format(i)
+        for i in range(count)
+    ]
+
+
+def _run(execution: ExecutionMode, statements: list[str]) -> float:
+    engine = create_engine("sqlite://")
+    try:
+        with engine.connect() as conn:
+            fetch_current_db_versions(conn, "bench")
+            update_sql(conn, [_TABLE], "bench", 0, 0)
+            start = time.perf_counter()
+            update_sql(conn, statements, "bench", 1, 0, execution=execution)
+            return time.perf_counter() - start
+    finally:
+        engine.dispose()
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    # Statements are unique, as in real scripts, so SQLAlchemy's
+    # compiled cache does not help the text mode.
+    statements = _statements(count)
+    for execution in EXECUTION_MODES:
+        elapsed = min(_run(execution, statements) for _ in range(3))
+        print(
+            "{:<8} {:8.3f} s {:8.2f} µs/statement".format(
+                execution, elapsed, elapsed / count * 1e6
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
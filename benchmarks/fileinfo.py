@@ -0,0 +1,90 @@
+"""Measure the memory used by FileInfo objects in large script catalogs.
+
+Usage: PYTHONPATH=. python benchmarks/fileinfo.py [SCRIPTS]
+
+SCRIPTS (default: 50000) script infos are created for 100 schemas and two
+dialects. The schema and dialect names of each script are separate string
+objects, like names parsed from script headers. FileInfo is compared with
+a plain class without slots or interning, which is how FileInfo used to
+be implemented.
+"""
+
+from __future__ import annotations
+
+import gc
+import sys
+import time
+import tracemalloc
+from collections.abc import Iterator
+from typing import Any
+
+from dbupgrade.files import FileInfo
+
+_DIALECTS = ["postgresql", "sqlite"]
+
+
+class _PlainFileInfo:
+    def __init__(
+        self,
+        filename: str,
+        schema: str,
+        dialect: str,
+        version: int,
+        api_level: int,
+    ) -> None:
+        self.filename = filename
+        self.schema = schema
+        self.dialect = dialect
+        self.version = version
+        self.api_level = api_level
+        self.transaction = True
+        self.execution = None
+        self.resource = None
+        self.bulk_load = None
+
+
+def _headers(count: int) -> Iterator[tuple[str, str, str, int, int]]:
+    for i in range(count):
+        schema = "tenant-{:03}".format(i % 100)
+        dialect = _DIALECTS[i // 100 % len(_DIALECTS)]
+        version = i // (100 * len(_DIALECTS))
+        filename = "/scripts/{}/{}/{:06}.sql".format(dialect, schema, version)
+        # Parsing headers creates new strings for each script.
+        yield filename, schema, dialect.encode().decode(), version, 0
+
+
+def _measure_memory(cls: Any, count: int) -> int:
+    gc.collect()
+    tracemalloc.start()
+    infos = [cls(*h) for h in _headers(count)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del infos
+    return size
+
+
+def _measure_time(cls: Any, count: int) -> float:
+    headers = list(_headers(count))
+    timings = []
+    for _ in range(5):
+        start = time.perf_counter()
+        infos = [cls(*h) for h in headers]
+        timings.append(time.perf_counter() - start)
+        del infos
+    return min(timings)
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    for name, cls in [("plain", _PlainFileInfo), ("FileInfo", FileInfo)]:
+        size = _measure_memory(cls, count)
+        elapsed = _measure_time(cls, count)
+        print(
+            "{:<10} {:>8.1f} MiB {:>6.0f} bytes/script {:>7.1f} ms".format(
+                name, size / 2**20, size / count, elapsed * 1000
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,14 @@
+from .options import UpgradeOptions as UpgradeOptions
 from .result import (
     UpgradeResult as UpgradeResult,
     VersionResult as VersionResult,
 )
-from .upgrade import db_upgrade as db_upgrade
+from .upgrade import (
+    db_upgrade as db_upgrade,
+    db_upgrade_async as db_upgrade_async,
+    db_upgrade_many as db_upgrade_many,
+    db_upgrade_schemas as db_upgrade_schemas,
+)
 from .version import (
     MAX_API_LEVEL as MAX_API_LEVEL,
     MAX_VERSION as MAX_VERSION,
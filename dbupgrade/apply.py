@@ -1,40 +1,403 @@
 from __future__ import annotations
 
 import logging
-from collections.abc import Iterable
+import os.path
+from collections import OrderedDict
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from threading import Lock
+from typing import IO
 
+from sqlalchemy.engine import Connection
 from sqlalchemy.exc import SQLAlchemyError
 
-from .db import update_sql
-from .files import FileInfo
+from .db import (
+    DEFAULT_EXECUTION,
+    ExecutionMode,
+    begin_group,
+    execute_sql_stream,
+    supports_transactional_ddl,
+    update_sql,
+    update_versions,
+)
+from .files import FileInfo, open_sql_body
+from .sql import DEFAULT_SPLITTER, Splitter, iter_sql
+
+StatementLoader = Callable[[FileInfo], Iterable[str]]
+
+# Maximum number of scripts whose statements are kept by StatementCache.
+DEFAULT_CACHED_SCRIPTS = 256
+
+# Errors that make a script fail. Scripts are split lazily, so ValueError
+# (including UnicodeDecodeError) can be raised by a script that was
+# partially executed.
+_SCRIPT_ERRORS = (SQLAlchemyError, ValueError)
 
 
 def apply_files(
-    db_url: str, files: Iterable[FileInfo]
+    conn: Connection,
+    files: Iterable[FileInfo],
+    load: StatementLoader | None = None,
+    *,
+    execution: ExecutionMode = DEFAULT_EXECUTION,
+    bulk_inserts: bool = False,
+    group_size: int = 1,
+    version_batch_size: int = 1,
+    atomic: bool = False,
 ) -> tuple[list[FileInfo], FileInfo | None]:
+    """Apply script files in order until one fails.
+
+    If group_size is greater than 1, up to group_size consecutive scripts
+    with transactions are applied in a single transaction, see
+    apply_group(). Likewise, if version_batch_size is greater than 1,
+    db_config is only updated once for up to version_batch_size
+    consecutive scripts without transactions, see apply_batch(). If atomic
+    is True, all scripts are applied in a single transaction, see
+    apply_atomic(). Scripts are not grouped if the database does not
+    support transactional DDL. Return the applied scripts and the failed
+    script, if any.
+    """
+
+    if atomic:
+        return apply_atomic(
+            conn, files, load, execution=execution, bulk_inserts=bulk_inserts
+        )
+    if group_size > 1 and not supports_transactional_ddl(conn):
+        logging.warning(
+            "script groups are not supported with {}, "
+            "applying scripts separately".format(conn.dialect.name)
+        )
+        group_size = 1
     applied: list[FileInfo] = []
-    for file_info in files:
+    for group in _groups(files, group_size, version_batch_size):
+        if len(group) > 1:
+            apply = apply_group if group[0].transaction else apply_batch
+            group_applied, failed = apply(
+                conn,
+                group,
+                load,
+                execution=execution,
+                bulk_inserts=bulk_inserts,
+            )
+            applied.extend(group_applied)
+            if failed is not None:
+                return applied, failed
+            continue
+        file_info = group[0]
         try:
-            apply_file(db_url, file_info)
-        except SQLAlchemyError as exc:
-            logging.error(str(exc))
+            apply_file(
+                conn,
+                file_info,
+                load,
+                execution=execution,
+                bulk_inserts=bulk_inserts,
+            )
+        except _SCRIPT_ERRORS as exc:
+            _log_error(file_info, exc)
             return applied, file_info
         else:
             applied.append(file_info)
     return applied, None
 
 
-def apply_file(db_url: str, file_info: FileInfo) -> None:
+def _groups(
+    files: Iterable[FileInfo], group_size: int, batch_size: int
+) -> Iterator[list[FileInfo]]:
+    """Split files into runs of consecutive scripts that either all use
+    transactions or not, with at most group_size or batch_size scripts.
+    """
+
+    group: list[FileInfo] = []
+    for file_info in files:
+        if group and group[0].transaction != file_info.transaction:
+            yield group
+            group = []
+        group.append(file_info)
+        max_size = group_size if file_info.transaction else batch_size
+        if len(group) >= max_size:
+            yield group
+            group = []
+    if group:
+        yield group
+
+
+def apply_file(
+    conn: Connection,
+    file_info: FileInfo,
+    load: StatementLoader | None = None,
+    *,
+    execution: ExecutionMode = DEFAULT_EXECUTION,
+    bulk_inserts: bool = False,
+    record_version: bool = True,
+) -> None:
+    """Apply a script file.
+
+    execution is used unless the script has an Execution header. If the
+    script has a Bulk-Load header, its data file is streamed into its
+    COPY ... FROM STDIN statement. If record_version is False, db_config
+    is not updated.
+    """
+
+    _log_apply(file_info)
+    if load is None:
+        load = read_statements
+    update_sql(
+        conn,
+        load(file_info),
+        file_info.schema,
+        file_info.version,
+        file_info.api_level,
+        transaction=file_info.transaction,
+        execution=file_info.execution or execution,
+        bulk_inserts=bulk_inserts,
+        bulk_data=_bulk_data(file_info),
+        record_version=record_version,
+    )
+
+
+def apply_batch(
+    conn: Connection,
+    files: Sequence[FileInfo],
+    load: StatementLoader | None = None,
+    *,
+    execution: ExecutionMode = DEFAULT_EXECUTION,
+    bulk_inserts: bool = False,
+) -> tuple[list[FileInfo], FileInfo | None]:
+    """Apply several script files, updating db_config only once.
+
+    This is meant for scripts without transactions, where each update of
+    db_config is committed separately. db_config is updated after the last
+    script was applied, or, if a script fails or an exception is raised,
+    after the last script that was applied successfully. Return the
+    applied scripts and the failed script, if any. The applied scripts
+    were committed even if db_config could not be updated. In this case,
+    an error that the recorded version is stale is logged.
+    """
+
+    applied: list[FileInfo] = []
+    failed: FileInfo | None = None
+    try:
+        for file_info in files:
+            try:
+                apply_file(
+                    conn,
+                    file_info,
+                    load,
+                    execution=execution,
+                    bulk_inserts=bulk_inserts,
+                    record_version=False,
+                )
+            except _SCRIPT_ERRORS as exc:
+                _log_error(file_info, exc)
+                failed = file_info
+                break
+            applied.append(file_info)
+    finally:
+        if applied and not _record_version(conn, applied[-1]):
+            last = applied[-1]
+            logging.error(
+                "{}: version {} was applied, but could not be recorded in "
+                "db_config, the recorded version is stale".format(
+                    last.schema, last.version
+                )
+            )
+    return applied, failed
+
+
+def _record_version(conn: Connection, file_info: FileInfo) -> bool:
+    try:
+        with conn.begin():
+            update_versions(
+                conn, file_info.schema, file_info.version, file_info.api_level
+            )
+    except SQLAlchemyError as exc:
+        logging.error(str(exc))
+        return False
+    return True
+
+
+def apply_group(
+    conn: Connection,
+    files: Sequence[FileInfo],
+    load: StatementLoader | None = None,
+    *,
+    execution: ExecutionMode = DEFAULT_EXECUTION,
+    bulk_inserts: bool = False,
+) -> tuple[list[FileInfo], FileInfo | None]:
+    """Apply several script files in a single transaction.
+
+    Each script is executed within a savepoint, and db_config is only
+    updated once, after the last successful script. If a script fails, it
+    is rolled back to its savepoint, and the preceding scripts are still
+    committed. All scripts must use transactions. Nothing is applied if the
+    database does not support transactional DDL, since DDL statements
+    would commit the transaction and release the savepoints. Return the
+    applied scripts and the failed script, if any.
+    """
+
+    if not supports_transactional_ddl(conn):
+        logging.error(
+            "script groups are not supported with {}".format(conn.dialect.name)
+        )
+        return [], files[0]
+    if load is None:
+        load = read_statements
+    applied: list[FileInfo] = []
+    failed: FileInfo | None = None
+    try:
+        with begin_group(conn):
+            for file_info in files:
+                _log_apply(file_info)
+                savepoint = conn.begin_nested()
+                try:
+                    execute_sql_stream(
+                        conn,
+                        load(file_info),
+                        file_info.execution or execution,
+                        bulk_inserts=bulk_inserts,
+                        bulk_data=_bulk_data(file_info),
+                    )
+                except _SCRIPT_ERRORS as exc:
+                    savepoint.rollback()
+                    _log_error(file_info, exc)
+                    failed = file_info
+                    break
+                savepoint.commit()
+                applied.append(file_info)
+            if applied:
+                last = applied[-1]
+                update_versions(
+                    conn, last.schema, last.version, last.api_level
+                )
+    except SQLAlchemyError as exc:
+        logging.error(str(exc))
+        return [], files[0]
+    return applied, failed
+
+
+def apply_atomic(
+    conn: Connection,
+    files: Iterable[FileInfo],
+    load: StatementLoader | None = None,
+    *,
+    execution: ExecutionMode = DEFAULT_EXECUTION,
+    bulk_inserts: bool = False,
+) -> tuple[list[FileInfo], FileInfo | None]:
+    """Apply all script files in a single transaction.
+
+    If a script fails, the changes of all scripts are rolled back. Nothing
+    is applied if one of the scripts has a "Transaction: no" header or if
+    the database does not support transactional DDL. Return the applied
+    scripts and the failed script, if any.
+    """
+
+    files = list(files)
+    if not files:
+        return [], None
+    if not supports_transactional_ddl(conn):
+        logging.error(
+            "atomic upgrades are not supported with {}".format(
+                conn.dialect.name
+            )
+        )
+        return [], files[0]
+    for file_info in files:
+        if not file_info.transaction:
+            logging.error(
+                "{}: atomic upgrades require transactions".format(
+                    os.path.basename(file_info.filename)
+                )
+            )
+            return [], file_info
+    if load is None:
+        load = read_statements
+    current: FileInfo | None = None
+    try:
+        with begin_group(conn):
+            for current in files:
+                _log_apply(current)
+                execute_sql_stream(
+                    conn,
+                    load(current),
+                    current.execution or execution,
+                    bulk_inserts=bulk_inserts,
+                    bulk_data=_bulk_data(current),
+                )
+            current = None
+            last = files[-1]
+            update_versions(conn, last.schema, last.version, last.api_level)
+    except _SCRIPT_ERRORS as exc:
+        _log_error(current or files[-1], exc)
+        return [], current or files[0]
+    return files, None
+
+
+def _log_apply(file_info: FileInfo) -> None:
     logging.info(
         "applying #{0.version} (API level {0.api_level})".format(file_info)
     )
-    with open(file_info.filename, "r") as stream:
-        sql = stream.read()
-        update_sql(
-            db_url,
-            sql,
-            file_info.schema,
-            file_info.version,
-            file_info.api_level,
-            transaction=file_info.transaction,
+
+
+def _log_error(file_info: FileInfo, exc: Exception) -> None:
+    if isinstance(exc, SQLAlchemyError):
+        logging.error(str(exc))
+    else:
+        logging.error(
+            "{}: {}".format(os.path.basename(file_info.filename), exc)
         )
+
+
+def _bulk_data(file_info: FileInfo) -> Callable[[], IO[bytes]] | None:
+    if file_info.bulk_load == "copy":
+        return file_info.open_bulk_data
+    return None
+
+
+def read_statements(
+    file_info: FileInfo, splitter: Splitter = DEFAULT_SPLITTER
+) -> Iterator[str]:
+    """Read the SQL statements of a script file incrementally.
+
+    Reading starts after the script's headers.
+    """
+
+    with open_sql_body(file_info) as stream:
+        yield from iter_sql(stream, splitter=splitter)
+
+
+class StatementCache:
+    """Thread-safe cache of the SQL statements of script files.
+
+    This can be passed as statement loader to apply_files() when the same
+    scripts are applied to several databases, so that each script is only
+    read and split once. The statements of at most max_scripts scripts are
+    kept in memory. When more scripts are loaded, the least recently used
+    scripts are evicted and read again if they are needed later.
+    """
+
+    def __init__(
+        self,
+        load: StatementLoader = read_statements,
+        max_scripts: int = DEFAULT_CACHED_SCRIPTS,
+    ) -> None:
+        self._load = load
+        self._max_scripts = max_scripts
+        self._lock = Lock()
+        self._file_locks: dict[str, Lock] = {}
+        self._statements: OrderedDict[str, list[str]] = OrderedDict()
+
+    def __call__(self, file_info: FileInfo) -> list[str]:
+        filename = file_info.filename
+        with self._lock:
+            file_lock = self._file_locks.setdefault(filename, Lock())
+        with file_lock:
+            with self._lock:
+                statements = self._statements.get(filename)
+                if statements is not None:
+                    self._statements.move_to_end(filename)
+                    return statements
+            statements = list(self._load(file_info))
+            with self._lock:
+                self._statements[filename] = statements
+                while len(self._statements) > self._max_scripts:
+                    self._statements.popitem(last=False)
+            return statements
@@ -1,13 +1,18 @@
 from __future__ import annotations
 
+import re
 from argparse import ArgumentParser, Namespace
 from collections.abc import Sequence
 from dataclasses import dataclass
 
+from .db import DEFAULT_EXECUTION, EXECUTION_MODES, ExecutionMode
+from .files import DEFAULT_FILENAME_PATTERN
+from .sql import DEFAULT_SPLITTER, SPLITTERS, Splitter
+
 
 @dataclass
 class Arguments:
-    schema: str
+    schemas: list[str]
     db_url: str
     script_path: str
     api_level: int | None = None
@@ -15,12 +20,60 @@ class Arguments:
     ignore_api_level: bool = False
     quiet: bool = False
     json: bool = False
+    url_file: bool = False
+    jobs: int = 4
+    all_schemas: bool = False
+    lock: bool = False
+    cache_dir: str | None = None
+    parse_jobs: int = 1
+    filename_versions: str | None = None
+    splitter: Splitter = DEFAULT_SPLITTER
+    recursive: bool = False
+    include: Sequence[str] = ()
+    exclude: Sequence[str] = ()
+    execution: ExecutionMode = DEFAULT_EXECUTION
+    bulk_inserts: bool = False
+    group_size: int = 1
+    atomic: bool = False
+    version_batch_size: int = 1
 
     def __post_init__(self) -> None:
         if self.ignore_api_level and self.api_level is not None:
             raise ValueError(
                 "ignore_api_level and api_level are mutually exclusive"
             )
+        if self.jobs < 1:
+            raise ValueError("jobs must be at least 1")
+        if self.parse_jobs < 1:
+            raise ValueError("parse_jobs must be at least 1")
+        if self.group_size < 1:
+            raise ValueError("group_size must be at least 1")
+        if self.version_batch_size < 1:
+            raise ValueError("version_batch_size must be at least 1")
+        if self.atomic and self.group_size > 1:
+            raise ValueError("atomic and group_size are mutually exclusive")
+        if self.all_schemas and self.schemas:
+            raise ValueError("all_schemas and schemas are mutually exclusive")
+        if not self.all_schemas and not self.schemas:
+            raise ValueError("no schema given")
+        if self.url_file and not self.single_schema:
+            raise ValueError("url_file requires a single schema")
+
+    @property
+    def single_schema(self) -> bool:
+        return not self.all_schemas and len(self.schemas) == 1
+
+
+@dataclass
+class BundleArguments:
+    script_path: str
+    bundle_file: str
+    quiet: bool = False
+    parse_jobs: int = 1
+    splitter: Splitter = DEFAULT_SPLITTER
+    recursive: bool = False
+    include: Sequence[str] = ()
+    exclude: Sequence[str] = ()
 
 
 def arguments_from_args(args: Namespace) -> Arguments:
@@ -33,6 +86,22 @@ def arguments_from_args(args: Namespace) -> Arguments:
         args.ignore_api_level,
         args.quiet,
         args.json,
+        args.url_file,
+        args.jobs,
+        args.all_schemas,
+        args.lock,
+        args.cache_dir,
+        args.parse_jobs,
+        args.filename_versions,
+        args.splitter,
+        args.recursive,
+        tuple(args.include or ()),
+        tuple(args.exclude or ()),
+        args.execution,
+        args.bulk_inserts,
+        args.group_size,
+        args.atomic,
+        args.version_batch_size,
     )
 
 
@@ -40,10 +109,14 @@ def parse_args(argv: Sequence[str]) -> Arguments:
     parser = ArgumentParser(
         prog=argv[0], description="upgrade a database schema"
     )
-    parser.add_argument("schema", help="database schema to upgrade")
+    parser.add_argument(
+        "schema", nargs="*", help="database schemas to upgrade"
+    )
     parser.add_argument("db_url", help="URL of the database to upgrade")
     parser.add_argument(
-        "script_path", help="directory that contains the SQL scripts"
+        "script_path",
+        help="directory, bundle file, zip file, or package:NAME that "
+        "contains the SQL scripts",
     )
     parser.add_argument(
         "-q",
@@ -56,6 +129,92 @@ def parse_args(argv: Sequence[str]) -> Arguments:
         action="store_true",
         help="print upgrade information as JSON, implies -q",
     )
+    parser.add_argument(
+        "-A",
+        "--all-schemas",
+        action="store_true",
+        help="upgrade all schemas that have scripts in script_path",
+    )
+    parser.add_argument(
+        "--url-file",
+        action="store_true",
+        help="db_url is a file that contains one database URL per line",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=4,
+        help="number of databases to upgrade concurrently (default: 4)",
+    )
+    parser.add_argument(
+        "--lock",
+        action="store_true",
+        help="hold a database-wide lock while upgrading",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        metavar="DIR",
+        help="directory to cache parsed script headers in",
+    )
+    parser.add_argument(
+        "--parse-jobs",
+        metavar="N",
+        type=int,
+        default=1,
+        help="number of script headers to read concurrently (default: 1)",
+    )
+    parser.add_argument(
+        "--filename-versions",
+        metavar="REGEX",
+        nargs="?",
+        const=DEFAULT_FILENAME_PATTERN,
+        help="skip scripts whose file name indicates an applied version "
+        "(default pattern: '%(const)s')",
+    )
+    parser.add_argument(
+        "--splitter",
+        choices=SPLITTERS,
+        default=DEFAULT_SPLITTER,
+        help="implementation used to split scripts into statements "
+        "(default: %(default)s)",
+    )
+    _add_discovery_arguments(parser)
+    parser.add_argument(
+        "--execution",
+        choices=EXECUTION_MODES,
+        default=DEFAULT_EXECUTION,
+        help="how statements are executed, unless overridden by a "
+        "script's Execution header (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--bulk-inserts",
+        action="store_true",
+        help="execute runs of single-row INSERT statements into the same "
+        "table using executemany()",
+    )
+    parser.add_argument(
+        "--group-size",
+        metavar="N",
+        type=int,
+        default=1,
+        help="apply up to N consecutive scripts in one transaction, "
+        "using a savepoint per script (default: 1)",
+    )
+    parser.add_argument(
+        "--atomic",
+        action="store_true",
+        help="apply all scripts in a single transaction and roll back all "
+        "changes if one fails",
+    )
+    parser.add_argument(
+        "--version-batch-size",
+        metavar="N",
+        type=int,
+        default=1,
+        help="update db_config once for up to N consecutive scripts "
+        "without transactions (default: 1)",
+    )
     group = parser.add_mutually_exclusive_group()
     group.add_argument(
         "-l", "--api-level", help="maximum API level to upgrade to", type=int
@@ -70,4 +229,97 @@ def parse_args(argv: Sequence[str]) -> Arguments:
         "-m", "--max-version", help="maximum version to upgrade to", type=int
     )
     args = parser.parse_args(argv[1:])
+    if args.jobs < 1:
+        parser.error("argument -j/--jobs: must be at least 1")
+    if args.parse_jobs < 1:
+        parser.error("argument --parse-jobs: must be at least 1")
+    if args.group_size < 1:
+        parser.error("argument --group-size: must be at least 1")
+    if args.atomic and args.group_size > 1:
+        parser.error("argument --atomic: not allowed with --group-size")
+    if args.version_batch_size < 1:
+        parser.error("argument --version-batch-size: must be at least 1")
+    if args.filename_versions is not None:
+        _check_filename_pattern(parser, args.filename_versions)
+    if args.all_schemas and args.schema:
+        parser.error("argument -A/--all-schemas: not allowed with schema")
+    if not args.all_schemas and not args.schema:
+        parser.error("the following arguments are required: schema")
+    if args.url_file and (args.all_schemas or len(args.schema) > 1):
+        parser.error("argument --url-file: requires a single schema")
     return arguments_from_args(args)
+
+
+def _check_filename_pattern(parser: ArgumentParser, pattern: str) -> None:
+    try:
+        regex = re.compile(pattern)
+    except re.error as exc:
+        parser.error("argument --filename-versions: {}".format(exc))
+    if regex.groups < 1:
+        parser.error("argument --filename-versions: pattern has no group")
+
+
+def parse_bundle_args(argv: Sequence[str]) -> BundleArguments:
+    parser = ArgumentParser(
+        description="compile SQL scripts into a bundle file",
+    )
+    parser.add_argument(
+        "script_path", help="directory that contains the SQL scripts"
+    )
+    parser.add_argument("bundle_file", help="bundle file to write")
+    parser.add_argument(
+        "-q",
+        "--quiet",
+        action="store_true",
+        help="suppress informational output",
+    )
+    parser.add_argument(
+        "--parse-jobs",
+        metavar="N",
+        type=int,
+        default=1,
+        help="number of script headers to read concurrently (default: 1)",
+    )
+    parser.add_argument(
+        "--splitter",
+        choices=SPLITTERS,
+        default=DEFAULT_SPLITTER,
+        help="implementation used to split scripts into statements "
+        "(default: %(default)s)",
+    )
+    _add_discovery_arguments(parser)
+    args = parser.parse_args(argv[1:])
+    if args.parse_jobs < 1:
+        parser.error("argument --parse-jobs: must be at least 1")
+    return BundleArguments(
+        args.script_path,
+        args.bundle_file,
+        args.quiet,
+        args.parse_jobs,
+        args.splitter,
+        args.recursive,
+        tuple(args.include or ()),
+        tuple(args.exclude or ()),
+    )
+
+
+def _add_discovery_arguments(parser: ArgumentParser) -> None:
+    parser.add_argument(
+        "-r",
+        "--recursive",
+        action="store_true",
+        help="also search subdirectories of script_path for SQL scripts",
+    )
+    parser.add_argument(
+        "--include",
+        metavar="GLOB",
+        action="append",
+        help="only use scripts matching this pattern (can be repeated)",
+    )
+    parser.add_argument(
+        "--exclude",
+        metavar="GLOB",
+        action="append",
+        help="skip scripts and directories matching this pattern "
+        "(can be repeated)",
+    )
@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import re
+from collections.abc import Iterable, Iterator, Sequence
+from dataclasses import dataclass, field
+from typing import IO, Any, Literal
+
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import DBAPIError, InvalidRequestError
+
+# Values of the Bulk-Load header. "copy" streams the script's data file
+# into the script's COPY ... FROM STDIN statement (PostgreSQL only).
+BulkLoad = Literal["copy"]
+BULK_LOADS: tuple[BulkLoad, ...] = ("copy",)
+
+# Maximum number of rows sent in one executemany() call.
+MAX_INSERT_ROWS = 1000
+
+_COPY_CHUNK_SIZE = 64 * 1024
+
+_IDENT = r'(?:[A-Za-z_][\w$]*|"(?:[^"]|"")+"|`[^`]+`|\[[^\]]+\])'
+_INSERT_RE = re.compile(
+    r"\s*(INSERT\s+INTO\s+{ident}(?:\s*\.\s*{ident})?"
+    r"\s*(?:\([^()']*\))?\s*VALUES)\s*\((.*)\)\s*".format(ident=_IDENT),
+    re.IGNORECASE | re.DOTALL,
+)
+# Only literals whose value does not depend on the database are accepted:
+# strings without backslashes, 64-bit integers, NULL, TRUE, and FALSE.
+_VALUE_RE = re.compile(
+    r"\s*(?:'((?:[^'\\]|'')*)'|([-+]?\d+)|(NULL|TRUE|FALSE))\s*(,|$)",
+    re.IGNORECASE,
+)
+_COPY_FROM_STDIN_RE = re.compile(
+    r"(?:\s|--[^\n]*\n|/\*.*?\*/)*COPY\b.*\bFROM\s+STDIN\b",
+    re.IGNORECASE | re.DOTALL,
+)
+_KEYWORD_VALUES: dict[str, bool | None] = {
+    "NULL": None,
+    "TRUE": True,
+    "FALSE": False,
+}
+_MIN_INT = -(2**63)
+_MAX_INT = 2**63 - 1
+
+
+@dataclass
+class InsertRun:
+    """Consecutive single-row INSERT statements into the same columns.
+
+    prefix is the common part of the statements up to and including the
+    VALUES keyword. rows contains the literal values of each statement.
+    """
+
+    prefix: str
+    rows: list[tuple[Any, ...]] = field(default_factory=list)
+
+    @property
+    def columns(self) -> int:
+        return len(self.rows[0])
+
+
+def parse_insert(statement: str) -> tuple[str, tuple[Any, ...]] | None:
+    """Parse a single-row INSERT statement with literal values.
+
+    Return the part of the statement up to and including VALUES and the
+    values. Return None if the statement is not such an INSERT.
+    """
+
+    m = _INSERT_RE.fullmatch(statement)
+    if not m:
+        return None
+    prefix, values_sql = m.groups()
+    values: list[Any] = []
+    pos = 0
+    separator = ","
+    while separator:
+        vm = _VALUE_RE.match(values_sql, pos)
+        if not vm:
+            return None
+        string, number, keyword, separator = vm.groups()
+        if string is not None:
+            values.append(string.replace("''", "'"))
+        elif number is not None:
+            value = int(number)
+            if not _MIN_INT <= value <= _MAX_INT:
+                return None
+            values.append(value)
+        else:
+            values.append(_KEYWORD_VALUES[keyword.upper()])
+        pos = vm.end()
+    return " ".join(prefix.split()), tuple(values)
+
+
+def group_inserts(
+    statements: Iterable[str], max_rows: int = MAX_INSERT_ROWS
+) -> Iterator[str | InsertRun]:
+    """Group runs of structurally identical INSERT statements.
+
+    Runs of at least two single-row INSERT statements with literal values
+    into the same table and columns are returned as InsertRun, with at most
+    max_rows rows each. All other statements are returned as is.
+    """
+
+    run: InsertRun | None = None
+    pending: str | None = None
+    for statement in statements:
+        parsed = parse_insert(statement)
+        if parsed is not None:
+            prefix, values = parsed
+            if (
+                run is not None
+                and run.prefix == prefix
+                and run.columns == len(values)
+                and len(run.rows) < max_rows
+            ):
+                run.rows.append(values)
+                continue
+        if run is not None:
+            yield pending if len(run.rows) == 1 and pending else run
+        if parsed is None:
+            run = None
+            pending = None
+            yield statement
+        else:
+            run = InsertRun(parsed[0], [parsed[1]])
+            pending = statement
+    if run is not None:
+        yield pending if len(run.rows) == 1 and pending else run
+
+
+def execute_insert_run(conn: Connection, run: InsertRun) -> None:
+    """Execute the statements of an InsertRun using executemany()."""
+    paramstyle = conn.dialect.paramstyle
+    prefix = run.prefix
+    rows: Sequence[Any] = run.rows
+    if paramstyle in ("format", "pyformat"):
+        prefix = prefix.replace("%", "%%")
+        placeholders = ["%s"] * run.columns
+    elif paramstyle == "numeric":
+        placeholders = [":{}".format(i + 1) for i in range(run.columns)]
+    elif paramstyle == "numeric_dollar":
+        placeholders = ["${}".format(i + 1) for i in range(run.columns)]
+    elif paramstyle == "named":
+        placeholders = [":p{}".format(i + 1) for i in range(run.columns)]
+        rows = [
+            {"p{}".format(i + 1): v for i, v in enumerate(row)}
+            for row in run.rows
+        ]
+    else:
+        placeholders = ["?"] * run.columns
+    sql = "{} ({})".format(prefix, ", ".join(placeholders))
+    conn.exec_driver_sql(sql, rows)
+
+
+def is_copy_from_stdin(statement: str) -> bool:
+    return _COPY_FROM_STDIN_RE.match(statement) is not None
+
+
+def copy_from_stdin(conn: Connection, statement: str, data: IO[bytes]) -> None:
+    """Execute a COPY ... FROM STDIN statement, streaming data into it."""
+    driver = conn.dialect.driver
+    if conn.dialect.name != "postgresql" or driver not in (
+        "psycopg2",
+        "psycopg",
+        "pg8000",
+    ):
+        raise InvalidRequestError(
+            "COPY FROM STDIN is not supported with {}+{}".format(
+                conn.dialect.name, driver
+            )
+        )
+    dbapi = conn.dialect.loaded_dbapi
+    cursor: Any = conn.connection.cursor()
+    try:
+        if driver == "psycopg2":
+            cursor.copy_expert(statement, data, size=_COPY_CHUNK_SIZE)
+        elif driver == "psycopg":
+            with cursor.copy(statement) as copy:
+                while chunk := data.read(_COPY_CHUNK_SIZE):
+                    copy.write(chunk)
+        else:
+            cursor.execute(statement, stream=data)
+    except dbapi.Error as exc:
+        raise DBAPIError.instance(
+            statement, None, exc, dbapi.Error, dialect=conn.dialect
+        ) from exc
+    finally:
+        cursor.close()
@@ -0,0 +1,263 @@
+from __future__ import annotations
+
+import io
+import json
+import logging
+import mmap
+import os
+import os.path
+import posixpath
+import shutil
+import struct
+from collections.abc import Iterator, Sequence
+from operator import attrgetter
+from tempfile import NamedTemporaryFile
+from typing import IO, Any
+
+from .apply import read_statements
+from .files import (
+    FileInfo,
+    Traversable,
+    collect_sql_files,
+    collect_sql_resources,
+)
+from .resources import resolve_script_path
+from .sql import DEFAULT_SPLITTER, Splitter
+from .sql_file import parse_sql_files
+
+# A bundle consists of the magic string, the statements of all scripts,
+# the JSON encoded index, and the offset of the index as trailer. The
+# statements of each script are stored as JSON lines, one per statement,
+# followed by the script's data file if it has a Bulk-Load header.
+BUNDLE_VERSION = 3
+
+_MAGIC = b"dbupgrade bundle\n"
+_TRAILER = struct.Struct(">Q")
+
+
+class BundleError(Exception):
+    pass
+
+
+class BundledFileInfo(FileInfo):
+    """Information about a script stored in a bundle.
+
+    The statements of the script are only decoded when
+    read_bundled_statements() is called.
+    """
+
+    __slots__ = (
+        "bundle_file",
+        "offset",
+        "length",
+        "bulk_data_offset",
+        "bulk_data_length",
+    )
+
+    def __init__(
+        self,
+        filename: str,
+        schema: str,
+        dialect: str,
+        version: int,
+        api_level: int,
+        bundle_file: str,
+        offset: int,
+        length: int,
+    ) -> None:
+        super().__init__(filename, schema, dialect, version, api_level)
+        self.bundle_file = bundle_file
+        self.offset = offset
+        self.length = length
+        self.bulk_data_offset = 0
+        self.bulk_data_length = 0
+
+    def open_bulk_data(self) -> IO[bytes]:
+        start = self.bulk_data_offset
+        with _map_bundle(self.bundle_file) as data:
+            return io.BytesIO(data[start : start + self.bulk_data_length])
+
+
+def is_bundle(path: str) -> bool:
+    """Return whether path is a bundle file."""
+    if not os.path.isfile(path):
+        return False
+    with open(path, "rb") as stream:
+        return stream.read(len(_MAGIC)) == _MAGIC
+
+
+def write_bundle(
+    script_path: str | Traversable,
+    bundle_file: str,
+    *,
+    splitter: Splitter = DEFAULT_SPLITTER,
+    max_workers: int = 1,
+    recursive: bool = False,
+    include: Sequence[str] = (),
+    exclude: Sequence[str] = (),
+) -> list[FileInfo]:
+    """Compile the SQL scripts in script_path into a bundle file.
+
+    The scripts are grouped by schema and dialect and sorted by version.
+    Scripts with invalid headers are skipped with a warning. script_path
+    can be anything accepted by resolve_script_path(), except a bundle.
+    recursive, include, and exclude work like in collect_sql_files().
+    Return the bundled scripts.
+    """
+
+    source = resolve_script_path(script_path)
+    scripts: Sequence[str | Traversable]
+    if isinstance(source, str):
+        scripts = collect_sql_files(
+            source, recursive=recursive, include=include, exclude=exclude
+        )
+    else:
+        scripts = collect_sql_resources(
+            source, recursive=recursive, include=include, exclude=exclude
+        )
+    files = parse_sql_files(scripts, max_workers=max_workers)
+    files.sort(key=attrgetter("sort_key"))
+    directory = os.path.dirname(bundle_file) or "."
+    with NamedTemporaryFile(
+        "wb", dir=directory, prefix=".bundle-", delete=False
+    ) as stream:
+        try:
+            stream.write(_MAGIC)
+            index = [
+                _write_script(stream, info, _relpath(info, source), splitter)
+                for info in files
+            ]
+            index_offset = stream.tell()
+            stream.write(
+                json.dumps(
+                    {
+                        "version": BUNDLE_VERSION,
+                        "splitter": splitter,
+                        "scripts": index,
+                    }
+                ).encode()
+            )
+            stream.write(_TRAILER.pack(index_offset))
+            # NamedTemporaryFile creates files that only the owner can read.
+            os.chmod(stream.name, 0o644 & ~_umask())
+        except BaseException:
+            stream.close()
+            os.unlink(stream.name)
+            raise
+    os.replace(stream.name, bundle_file)
+    return files
+
+
+def _umask() -> int:
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+def _relpath(info: FileInfo, source: str | Traversable) -> str:
+    if isinstance(source, str):
+        return os.path.relpath(info.filename, source).replace(os.sep, "/")
+    return posixpath.relpath(info.filename, str(source))
+
+
+def _write_script(
+    stream: IO[bytes], info: FileInfo, name: str, splitter: Splitter
+) -> dict[str, Any]:
+    logging.info("bundling {}".format(name))
+    offset = stream.tell()
+    for stmt in read_statements(info, splitter):
+        stream.write(json.dumps(stmt).encode() + b"\n")
+    length = stream.tell() - offset
+    bulk_data_offset = stream.tell()
+    if info.bulk_load is not None:
+        with info.open_bulk_data() as data:
+            shutil.copyfileobj(data, stream)
+    return {
+        "filename": name,
+        "schema": info.schema,
+        "dialect": info.dialect,
+        "version": info.version,
+        "apiLevel": info.api_level,
+        "transaction": info.transaction,
+        "execution": info.execution,
+        "bulkLoad": info.bulk_load,
+        "offset": offset,
+        "length": length,
+        "bulkDataOffset": bulk_data_offset,
+        "bulkDataLength": stream.tell() - bulk_data_offset,
+    }
+
+
+def read_bundle(bundle_file: str) -> list[BundledFileInfo]:
+    """Read the index of a bundle file.
+
+    Statements are only read when read_bundled_statements() is called for
+    a script. The bundle is memory-mapped while reading, but no file or
+    mapping is kept open between calls.
+    """
+
+    try:
+        data = _map_bundle(bundle_file)
+    except ValueError:
+        raise BundleError("{}: not a bundle".format(bundle_file)) from None
+    with data:
+        return _read_index(bundle_file, data)
+
+
+def _map_bundle(bundle_file: str) -> mmap.mmap:
+    with open(bundle_file, "rb") as stream:
+        return mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _read_index(bundle_file: str, data: mmap.mmap) -> list[BundledFileInfo]:
+    if (
+        len(data) < len(_MAGIC) + _TRAILER.size
+        or data[: len(_MAGIC)] != _MAGIC
+    ):
+        raise BundleError("{}: not a bundle".format(bundle_file))
+    (index_offset,) = _TRAILER.unpack_from(data, len(data) - _TRAILER.size)
+    try:
+        index = json.loads(data[index_offset : len(data) - _TRAILER.size])
+    except ValueError as exc:
+        raise BundleError(
+            "{}: invalid index: {}".format(bundle_file, exc)
+        ) from None
+    if not isinstance(index, dict) or index.get("version") != BUNDLE_VERSION:
+        raise BundleError("{}: unsupported bundle version".format(bundle_file))
+    return [_file_info_from_json(bundle_file, j) for j in index["scripts"]]
+
+
+def _file_info_from_json(
+    bundle_file: str, j: dict[str, Any]
+) -> BundledFileInfo:
+    info = BundledFileInfo(
+        os.path.join(bundle_file, j["filename"]),
+        j["schema"],
+        j["dialect"],
+        j["version"],
+        j["apiLevel"],
+        bundle_file,
+        j["offset"],
+        j["length"],
+    )
+    info.transaction = j["transaction"]
+    info.execution = j["execution"]
+    info.bulk_load = j["bulkLoad"]
+    info.bulk_data_offset = j["bulkDataOffset"]
+    info.bulk_data_length = j["bulkDataLength"]
+    return info
+
+
+def read_bundled_statements(file_info: FileInfo) -> Iterator[str]:
+    """Read the SQL statements of a script from a bundle."""
+    if not isinstance(file_info, BundledFileInfo):
+        raise TypeError("{} is not bundled".format(file_info.filename))
+    pos = file_info.offset
+    end = pos + file_info.length
+    if pos == end:
+        return
+    with _map_bundle(file_info.bundle_file) as data:
+        while pos < end:
+            eol = data.find(b"\n", pos, end)
+            yield json.loads(data[pos:eol])
+            pos = eol + 1
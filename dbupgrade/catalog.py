@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import logging
+from bisect import bisect_left, bisect_right
+from collections.abc import Iterable
+from itertools import pairwise
+from operator import attrgetter
+
+from .files import FileInfo
+from .filter import Filter
+from .version import MAX_API_LEVEL, MAX_VERSION
+
+
+class _Scripts:
+    """The scripts of a schema and dialect, sorted by version."""
+
+    def __init__(self, files: list[FileInfo]) -> None:
+        files.sort(key=attrgetter("version"))
+        self.files = files
+        self.versions = [f.version for f in files]
+        self.duplicates: list[int] = []
+        self.gaps: list[tuple[int, int]] = []
+        for previous, version in pairwise(self.versions):
+            if version == previous:
+                if not self.duplicates or self.duplicates[-1] != version:
+                    self.duplicates.append(version)
+            elif version > previous + 1:
+                self.gaps.append((previous + 1, version - 1))
+
+
+class ScriptCatalog:
+    """Index of script files by schema and dialect.
+
+    The catalog is built once from the parsed script files and can then be
+    queried for the scripts to apply to any schema using bisection. Missing
+    and duplicate versions are detected when the catalog is built and
+    logged when they affect the scripts returned by scripts().
+    """
+
+    def __init__(self, files: Iterable[FileInfo]) -> None:
+        by_key: dict[tuple[str, str], list[FileInfo]] = {}
+        for file_info in files:
+            key = file_info.schema, file_info.dialect
+            by_key.setdefault(key, []).append(file_info)
+        self._scripts = {key: _Scripts(fs) for key, fs in by_key.items()}
+
+    def schemas(self, dialect: str) -> list[str]:
+        """Return the sorted names of all schemas with scripts for dialect."""
+        return sorted(s for s, d in self._scripts if d == dialect)
+
+    def gaps(self, schema: str, dialect: str) -> list[tuple[int, int]]:
+        """Return the inclusive ranges of missing versions of a schema."""
+        scripts = self._scripts.get((schema, dialect))
+        return list(scripts.gaps) if scripts is not None else []
+
+    def duplicates(self, schema: str, dialect: str) -> list[int]:
+        """Return the versions of a schema that have several scripts."""
+        scripts = self._scripts.get((schema, dialect))
+        return list(scripts.duplicates) if scripts is not None else []
+
+    def scripts(
+        self,
+        schema: str,
+        dialect: str,
+        min_version: int,
+        max_version: int = MAX_VERSION,
+        api_level: int = MAX_API_LEVEL,
+    ) -> list[FileInfo]:
+        """Return the scripts from min_version to max_version, inclusive.
+
+        Scripts that require an API level higher than api_level are
+        skipped. The scripts are sorted by version.
+        """
+
+        scripts = self._scripts.get((schema, dialect))
+        if scripts is None:
+            return []
+        start = bisect_left(scripts.versions, min_version)
+        end = bisect_right(scripts.versions, max_version)
+        if start < end:
+            _log_problems(
+                schema,
+                dialect,
+                scripts,
+                scripts.versions[start],
+                scripts.versions[end - 1],
+            )
+        return [
+            f for f in scripts.files[start:end] if f.api_level <= api_level
+        ]
+
+    def select(self, filter_: Filter) -> list[FileInfo]:
+        """Return the scripts that match filter_, sorted by version."""
+        matcher = filter_.version_matcher
+        return self.scripts(
+            filter_.schema,
+            filter_.dialect,
+            matcher.min_version,
+            matcher.max_version,
+            matcher.target_api_level,
+        )
+
+
+def _log_problems(
+    schema: str, dialect: str, scripts: _Scripts, first: int, last: int
+) -> None:
+    for start, end in scripts.gaps:
+        if first < start and end < last:
+            versions = (
+                "version {}".format(start)
+                if start == end
+                else "versions {}-{}".format(start, end)
+            )
+            logging.warning(
+                "{} ({}): no scripts for {}".format(schema, dialect, versions)
+            )
+    for version in scripts.duplicates:
+        if first <= version <= last:
+            logging.warning(
+                "{} ({}): several scripts for version {}".format(
+                    schema, dialect, version
+                )
+            )
@@ -1,16 +1,50 @@
 from __future__ import annotations
 
-from collections.abc import Sequence
-from typing import TYPE_CHECKING, Any
-
-from sqlalchemy import create_engine, text as sa_text
+from collections.abc import (
+    AsyncIterator,
+    Callable,
+    Iterable,
+    Iterator,
+    Sequence,
+)
+from contextlib import asynccontextmanager, contextmanager
+from typing import IO, Literal
+
+from sqlalchemy import bindparam, create_engine, text as sa_text
 from sqlalchemy.engine import Connection, Engine
-from sqlalchemy.exc import SQLAlchemyError
-
-from .sql import split_sql
-
-if TYPE_CHECKING:
-    from sqlalchemy import Row
+from sqlalchemy.exc import DBAPIError, InvalidRequestError, SQLAlchemyError
+from sqlalchemy.ext.asyncio import (
+    AsyncConnection,
+    AsyncEngine,
+    create_async_engine,
+)
+
+from .bulk import (
+    InsertRun,
+    copy_from_stdin,
+    execute_insert_run,
+    group_inserts,
+    is_copy_from_stdin,
+)
+
+# How script statements are executed: "text" compiles each statement as
+# a SQLAlchemy text() construct, "driver" passes it to the database driver
+# as is, without looking for bind parameters. "batch" works like "driver",
+# but sends several statements per driver call where possible.
+ExecutionMode = Literal["text", "driver", "batch"]
+EXECUTION_MODES: tuple[ExecutionMode, ...] = ("text", "driver", "batch")
+DEFAULT_EXECUTION: ExecutionMode = "text"
+
+# Dialects whose DDL statements commit the current transaction implicitly.
+_NON_TRANSACTIONAL_DDL_DIALECTS = ("mysql", "mariadb", "oracle")
+
+# Maximum number of statements sent in one driver call in batch mode.
+BATCH_SIZE = 100
+
+# CLIENT_MULTI_STATEMENTS flag of the MySQL client protocol.
+_MYSQL_MULTI_STATEMENTS = 1 << 16
+
+_NO_PARAMETERS = {"no_parameters": True}
 
 SQL_CREATE_DB_CONFIG = """
     CREATE TABLE db_config(
@@ -20,9 +54,12 @@ SQL_CREATE_DB_CONFIG = """
     )
 """
 
+# Dialects that support CREATE TABLE IF NOT EXISTS.
+_IF_NOT_EXISTS_DIALECTS = ("sqlite", "postgresql", "mysql", "mariadb")
+
 SQL_SELECT_VERSIONS = """
-    SELECT version, api_level FROM db_config
-        WHERE {quote}schema{quote} = :col
+    SELECT {quote}schema{quote}, version, api_level FROM db_config
+        WHERE {quote}schema{quote} IN :schemas
 """
 
 SQL_INSERT_DEFAULT_VERSIONS = """
@@ -36,27 +73,30 @@ SQL_UPDATE_VERSIONS = """
 """
 
 
-def _quote_char(engine: Engine) -> str:
-    dialect = engine.dialect.name.split("+")[0]
-    return "`" if dialect == "mysql" else '"'
+def _dialect_name(conn: Connection) -> str:
+    """Return the name of the connection's dialect without the driver."""
+    return conn.dialect.name.split("+")[0]
 
 
-def _execute_sql_ignore_errors(engine: Engine, query: str) -> None:
+def _quote_char(conn: Connection) -> str:
+    return "`" if _dialect_name(conn) == "mysql" else '"'
+
+
+def _execute_sql_ignore_errors(conn: Connection, query: str) -> None:
     try:
-        with engine.begin() as connection:
-            connection.execute(sa_text(query))
+        with conn.begin():
+            conn.execute(sa_text(query))
     except SQLAlchemyError:
         pass
 
 
 class _EngineContext:
-    def __init__(self, db_url: str, **kwargs: Any) -> None:
+    def __init__(self, db_url: str) -> None:
         self._db_url = db_url
-        self._kwargs = kwargs
         self._engine: Engine | None = None
 
     def __enter__(self) -> Engine:
-        self._engine = create_engine(self._db_url, future=True, **self._kwargs)
+        self._engine = create_engine(self._db_url, future=True)
         return self._engine
 
     def __exit__(self, *args: object) -> None:
@@ -65,81 +105,409 @@ class _EngineContext:
         self._engine = None
 
 
-def fetch_current_db_versions(db_url: str, schema: str) -> tuple[int, int]:
+@contextmanager
+def connect(db: str | Engine | Connection) -> Iterator[Connection]:
+    """Open a connection that is used for a whole upgrade run.
+
+    db can be a database URL, an existing engine, or an existing
+    connection. If a URL is given, a new engine is created and disposed of
+    when the context is left. If an engine is given, a connection is checked
+    out of its pool and returned to it afterwards. A connection is used
+    as is and is not closed. It must not have a transaction in progress.
+    """
+
+    if isinstance(db, Connection):
+        if db.in_transaction():
+            raise ValueError("connection has a transaction in progress")
+        yield db
+    elif isinstance(db, Engine):
+        with db.connect() as conn:
+            yield conn
+    else:
+        with _EngineContext(db) as engine, engine.connect() as conn:
+            yield conn
+
+
+@asynccontextmanager
+async def connect_async(
+    db: str | AsyncEngine | AsyncConnection,
+) -> AsyncIterator[AsyncConnection]:
+    """Asynchronous version of connect().
+
+    db can be a database URL using an asyncio driver, an existing
+    AsyncEngine, or an existing AsyncConnection.
+    """
+
+    if isinstance(db, AsyncConnection):
+        if db.in_transaction():
+            raise ValueError("connection has a transaction in progress")
+        yield db
+    elif isinstance(db, AsyncEngine):
+        async with db.connect() as conn:
+            yield conn
+    else:
+        engine = create_async_engine(db)
+        try:
+            async with engine.connect() as conn:
+                yield conn
+        finally:
+            await engine.dispose()
+
+
+@contextmanager
+def _autocommit(conn: Connection) -> Iterator[None]:
+    """Switch a connection to AUTOCOMMIT mode for the duration of the
+    context, then restore its previous isolation level.
+    """
+
+    options = conn.get_execution_options()
+    old_level = options.get("isolation_level", conn.default_isolation_level)
+    conn.execution_options(isolation_level="AUTOCOMMIT")
+    try:
+        yield
+    finally:
+        conn.execution_options(isolation_level=old_level)
+
+
+def fetch_current_db_versions(
+    conn: Connection, schema: str
+) -> tuple[int, int]:
     """Return the current version and API level of the database for the
     given schema.
 
     This function creates the db_config table if it does not exist. It also
     creates a row for the given schema if it does not exist. In both cases
-    the returned version and API level is 0.
+    the returned version and API level is 0. If the table and row exist,
+    only a single SELECT statement is executed.
     """
 
-    with _EngineContext(db_url) as engine:
-        return _fetch_or_create_version_info(engine, schema)
+    return fetch_current_db_versions_many(conn, [schema])[schema]
+
+
+def fetch_current_db_versions_many(
+    conn: Connection, schemas: Iterable[str]
+) -> dict[str, tuple[int, int]]:
+    """Return the current version and API level of the database for each
+    of the given schemas.
+
+    The versions of all schemas are fetched using a single query. Like
+    fetch_current_db_versions(), this function creates the db_config table
+    and missing rows.
+    """
+
+    return _fetch_or_create_version_info(conn, list(schemas))
 
 
 def _fetch_or_create_version_info(
-    engine: Engine, schema: str
-) -> tuple[int, int]:
-    _try_creating_db_config_table(engine)
-    versions = _try_fetching_version_info_for_schema(engine, schema)
-    if versions:
-        return versions
+    conn: Connection, schemas: Sequence[str]
+) -> dict[str, tuple[int, int]]:
+    # In the common case, db_config and all rows exist, and a single
+    # SELECT is executed.
+    try:
+        versions = _fetch_version_info_for_schemas(conn, schemas)
+    except DBAPIError:
+        # Most likely, db_config does not exist yet. The SELECT is repeated,
+        # in case it failed for another reason.
+        _create_db_config_table(conn)
+        versions = _fetch_version_info_for_schemas(conn, schemas)
+    missing = [schema for schema in schemas if schema not in versions]
+    if missing:
+        _insert_default_version_info(conn, missing)
+        versions.update((schema, (-1, 0)) for schema in missing)
+    return {schema: versions[schema] for schema in schemas}
+
+
+def _create_db_config_table(conn: Connection) -> None:
+    quote_char = _quote_char(conn)
+    query = SQL_CREATE_DB_CONFIG.format(quote=quote_char)
+    if _dialect_name(conn) in _IF_NOT_EXISTS_DIALECTS:
+        query = query.replace("CREATE TABLE", "CREATE TABLE IF NOT EXISTS", 1)
+        with conn.begin():
+            conn.execute(sa_text(query))
     else:
-        _insert_default_version_info(engine, schema)
-        return -1, 0
+        _execute_sql_ignore_errors(conn, query)
 
 
-def _try_creating_db_config_table(engine: Engine) -> None:
-    quote_char = _quote_char(engine)
-    query = SQL_CREATE_DB_CONFIG.format(quote=quote_char)
-    _execute_sql_ignore_errors(engine, query)
+def _fetch_version_info_for_schemas(
+    conn: Connection, schemas: Sequence[str]
+) -> dict[str, tuple[int, int]]:
+    sql = SQL_SELECT_VERSIONS.format(quote=_quote_char(conn))
+    query = sa_text(sql).bindparams(bindparam("schemas", expanding=True))
+    with conn.begin():
+        result = conn.execute(query, {"schemas": schemas})
+        return {
+            schema: (version, api_level)
+            for schema, version, api_level in result.fetchall()
+        }
 
 
-def _try_fetching_version_info_for_schema(
-    engine: Engine, schema: str
-) -> tuple[int, int] | None:
-    sql = SQL_SELECT_VERSIONS.format(quote=_quote_char(engine))
+def _insert_default_version_info(
+    conn: Connection, schemas: Sequence[str]
+) -> None:
+    # Rows inserted concurrently by another upgrade run are kept.
+    sql = SQL_INSERT_DEFAULT_VERSIONS.format(quote=_quote_char(conn))
+    dialect = _dialect_name(conn)
+    if dialect in ("sqlite", "postgresql"):
+        sql += "ON CONFLICT DO NOTHING"
+    elif dialect in ("mysql", "mariadb"):
+        sql = sql.replace("INSERT INTO", "INSERT IGNORE INTO", 1)
     query = sa_text(sql)
-    with engine.begin() as connection:
-        result = connection.execute(query, {"col": schema})
-        rows: Sequence[Row[tuple[int, int]]] = result.fetchall()
-    return (rows[0][0], rows[0][1]) if len(rows) == 1 else None
+    with conn.begin():
+        conn.execute(query, [{"schema": schema} for schema in schemas])
+
+
+def supports_transactional_ddl(conn: Connection) -> bool:
+    """Return whether DDL statements can be rolled back on a database."""
+    return _dialect_name(conn) not in _NON_TRANSACTIONAL_DDL_DIALECTS
 
 
-def _insert_default_version_info(engine: Engine, schema: str) -> None:
-    quote_char = _quote_char(engine)
-    query = sa_text(SQL_INSERT_DEFAULT_VERSIONS.format(quote=quote_char))
-    with engine.begin() as connection:
-        connection.execute(query, {"schema": schema})
+@contextmanager
+def begin_group(conn: Connection) -> Iterator[None]:
+    """Begin a transaction for a group of scripts.
+
+    Each script of the group is executed within a savepoint, using
+    conn.begin_nested().
+    """
+
+    with conn.begin():
+        if _dialect_name(conn) == "sqlite" and not getattr(
+            conn.connection.dbapi_connection, "in_transaction", False
+        ):
+            # pysqlite only emits BEGIN before DML statements. Without it,
+            # the first SAVEPOINT starts the transaction and releasing it
+            # commits.
+            conn.exec_driver_sql("BEGIN")
+        yield
 
 
 def update_sql(
-    db_url: str,
-    sql: str,
+    conn: Connection,
+    statements: Iterable[str],
     schema: str,
     version: int,
     api_level: int,
     *,
     transaction: bool = True,
+    execution: ExecutionMode = DEFAULT_EXECUTION,
+    bulk_inserts: bool = False,
+    bulk_data: Callable[[], IO[bytes]] | None = None,
+    record_version: bool = True,
+) -> None:
+    """Execute the statements of a script and update the schema version.
+
+    If bulk_inserts is True, runs of single-row INSERT statements into the
+    same table are executed using executemany(). If bulk_data is given,
+    it is called to open the data that is streamed into COPY ... FROM STDIN
+    statements. If record_version is False, the schema version is not
+    updated.
+    """
+
+    if transaction:
+        _update_sql(
+            conn,
+            statements,
+            schema,
+            version,
+            api_level,
+            execution,
+            bulk_inserts,
+            bulk_data,
+            record_version,
+        )
+    else:
+        # Batches are executed as a unit, which would change the semantics
+        # of scripts that run outside of a transaction.
+        if execution == "batch":
+            execution = "driver"
+        with _autocommit(conn):
+            _update_sql(
+                conn,
+                statements,
+                schema,
+                version,
+                api_level,
+                execution,
+                bulk_inserts,
+                bulk_data,
+                record_version,
+            )
+
+
+def _update_sql(
+    conn: Connection,
+    statements: Iterable[str],
+    schema: str,
+    version: int,
+    api_level: int,
+    execution: ExecutionMode,
+    bulk_inserts: bool,
+    bulk_data: Callable[[], IO[bytes]] | None,
+    record_version: bool,
 ) -> None:
-    kwargs = {} if transaction else {"isolation_level": "AUTOCOMMIT"}
-    with _EngineContext(db_url, **kwargs) as engine:
-        with engine.begin() as conn:
-            _execute_sql_stream(conn, sql)
-            _update_versions(conn, schema, version, api_level)
+    with conn.begin():
+        execute_sql_stream(
+            conn,
+            statements,
+            execution,
+            bulk_inserts=bulk_inserts,
+            bulk_data=bulk_data,
+        )
+        if record_version:
+            update_versions(conn, schema, version, api_level)
+
+
+def execute_sql_stream(
+    conn: Connection,
+    statements: Iterable[str],
+    execution: ExecutionMode = DEFAULT_EXECUTION,
+    *,
+    bulk_inserts: bool = False,
+    bulk_data: Callable[[], IO[bytes]] | None = None,
+) -> None:
+    """Run a stream of SQL statements against a database.
 
+    The statements are executed in the current transaction. bulk_inserts
+    and bulk_data work like in update_sql(). If bulk_data is given, only
+    one COPY ... FROM STDIN statement is allowed, since the data can only
+    be streamed once.
+    """
 
-def _execute_sql_stream(conn: Connection, sql: str) -> None:
-    """Run the SQL statements in a stream against a database."""
-    for query in split_sql(sql):
+    execute_batch = _batch_executor(conn) if execution == "batch" else None
+    items: Iterable[str | InsertRun] = (
+        group_inserts(statements) if bulk_inserts else statements
+    )
+    batch: list[str] = []
+    copied = False
+    for item in items:
+        copy = (
+            bulk_data is not None
+            and isinstance(item, str)
+            and is_copy_from_stdin(item)
+        )
+        if isinstance(item, str) and not copy:
+            if execute_batch is None:
+                _execute_statement(conn, item, execution)
+                continue
+            batch.append(item)
+            if len(batch) < BATCH_SIZE:
+                continue
+        if batch:
+            assert execute_batch is not None
+            execute_batch(conn, batch)
+            batch = []
+        if isinstance(item, InsertRun):
+            execute_insert_run(conn, item)
+        elif copy:
+            assert bulk_data is not None
+            if copied:
+                raise InvalidRequestError(
+                    "only one COPY FROM STDIN statement is allowed per script"
+                )
+            copied = True
+            with bulk_data() as data:
+                copy_from_stdin(conn, item, data)
+    if batch:
+        assert execute_batch is not None
+        execute_batch(conn, batch)
+
+
+def _execute_statement(
+    conn: Connection, query: str, execution: ExecutionMode
+) -> None:
+    if execution == "text":
         conn.execute(sa_text(query))
+    else:
+        # no_parameters makes sure that the driver does not interpret
+        # percent signs as parameter placeholders.
+        conn.exec_driver_sql(query, execution_options=_NO_PARAMETERS)
 
 
-def _update_versions(
+def _batch_executor(
+    conn: Connection,
+) -> Callable[[Connection, list[str]], None] | None:
+    """Return a function to execute a batch of statements in one call.
+
+    Return None if the database driver does not support executing
+    multiple statements at once.
+    """
+
+    dialect = conn.dialect
+    if dialect.name == "postgresql" and dialect.driver in (
+        "psycopg2",
+        "psycopg",
+    ):
+        return _execute_batch_replay
+    if dialect.name in ("mysql", "mariadb") and dialect.driver in (
+        "mysqldb",
+        "pymysql",
+    ):
+        dbapi_conn = conn.connection.dbapi_connection
+        client_flag = getattr(dbapi_conn, "client_flag", 0)
+        if client_flag & _MYSQL_MULTI_STATEMENTS:
+            return _execute_batch_multi_result
+    # SQLite's executescript() is not used, since it commits the current
+    # transaction first.
+    return None
+
+
+def _join_batch(batch: Sequence[str]) -> str:
+    # Put the delimiter on its own line, so that it can't end up in a
+    # trailing line comment.
+    return "\n;\n".join(batch)
+
+
+def _execute_batch_replay(conn: Connection, batch: list[str]) -> None:
+    """Execute a batch as a single multi-statement string.
+
+    If the batch fails, it is rolled back to a savepoint and replayed
+    statement by statement, so that the error refers to the statement that
+    actually failed.
+    """
+
+    if len(batch) == 1:
+        conn.exec_driver_sql(batch[0], execution_options=_NO_PARAMETERS)
+        return
+    savepoint = conn.begin_nested()
+    try:
+        conn.exec_driver_sql(
+            _join_batch(batch), execution_options=_NO_PARAMETERS
+        )
+    except DBAPIError:
+        savepoint.rollback()
+        for query in batch:
+            conn.exec_driver_sql(query, execution_options=_NO_PARAMETERS)
+        raise
+    savepoint.commit()
+
+
+def _execute_batch_multi_result(conn: Connection, batch: list[str]) -> None:
+    """Execute a batch as a single multi-statement string.
+
+    The driver returns a separate result for each statement. These are
+    counted to determine the statement that failed.
+    """
+
+    dbapi = conn.dialect.loaded_dbapi
+    cursor = conn.connection.cursor()
+    index = 0
+    try:
+        cursor.execute(_join_batch(batch))
+        index = 1
+        while cursor.nextset():
+            index += 1
+    except dbapi.Error as exc:
+        raise DBAPIError.instance(
+            batch[index], None, exc, dbapi.Error, dialect=conn.dialect
+        ) from exc
+    finally:
+        cursor.close()
+
+
+def update_versions(
     conn: Connection, schema: str, version: int, api_level: int
 ) -> None:
-    query = sa_text(SQL_UPDATE_VERSIONS.format(quote=_quote_char(conn.engine)))
+    """Record the version and API level of a schema in db_config."""
+    query = sa_text(SQL_UPDATE_VERSIONS.format(quote=_quote_char(conn)))
     conn.execute(
         query, {"schema": schema, "version": version, "api_level": api_level}
     )
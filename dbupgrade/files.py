@@ -1,8 +1,58 @@
+from __future__ import annotations
+
+import io
+import json
+import logging
+import os
 import os.path
-from os import listdir
+import posixpath
+import re
+import sys
+from collections.abc import Sequence
+from dataclasses import dataclass
+from fnmatch import fnmatchcase
+from typing import IO, TYPE_CHECKING, Any, Literal, overload
+
+if sys.version_info >= (3, 11):
+    from importlib.resources.abc import Traversable as Traversable
+else:
+    from importlib.abc import Traversable as Traversable
+
+if TYPE_CHECKING:
+    from .bulk import BulkLoad
+    from .db import ExecutionMode
+
+# Matches file names like "0123-create-foo.sql".
+DEFAULT_FILENAME_PATTERN = r"(?P<version>\d+)-"
+
+# Name of the optional index file in script directories. It is a JSON
+# object with the highest script version in the directory's subtree as
+# "maxVersion", and allows to skip subtrees whose scripts are all applied.
+DIRECTORY_INDEX = ".dbupgrade.json"
 
 
 class FileInfo:
+    """Information about a script file.
+
+    Instances use slots, since catalogs can contain many thousands of
+    scripts. Schema and dialect names are interned, as they are shared by
+    many scripts.
+    """
+
+    __slots__ = (
+        "filename",
+        "schema",
+        "dialect",
+        "version",
+        "api_level",
+        "transaction",
+        "execution",
+        "resource",
+        "bulk_load",
+        "body_offset",
+        "_sort_key",
+    )
+
     def __init__(
         self,
         filename: str,
@@ -12,11 +62,48 @@ class FileInfo:
         api_level: int,
     ) -> None:
         self.filename = filename
-        self.schema = schema
-        self.dialect = dialect
+        self.schema = sys.intern(schema)
+        self.dialect = sys.intern(dialect)
         self.version = version
         self.api_level = api_level
         self.transaction = True
+        # None means that the default execution mode is used.
+        self.execution: ExecutionMode | None = None
+        # Set for scripts that are read from a zip file or package.
+        self.resource: Traversable | None = None
+        # Set for scripts with a Bulk-Load header.
+        self.bulk_load: BulkLoad | None = None
+        # Byte offset of the first line after the headers.
+        self.body_offset = 0
+        self._sort_key: tuple[str, str, int] | None = None
+
+    def open_bulk_data(self) -> IO[bytes]:
+        """Open the data file of a script with a Bulk-Load header.
+
+        The data file has the same name as the script, but with the
+        extension ".csv" instead of ".sql".
+        """
+
+        name = bulk_data_filename(self.filename)
+        if self.resource is None:
+            return open(name, "rb")
+        parent = getattr(self.resource, "parent", None)
+        if parent is None:
+            raise FileNotFoundError(name)
+        resource: Traversable = parent.joinpath(os.path.basename(name))
+        return resource.open("rb")
+
+    @property
+    def sort_key(self) -> tuple[str, str, int]:
+        """Key that orders scripts by schema, dialect, and version.
+
+        The key is computed on first use and cached, so schema, dialect,
+        and version must not be changed afterwards.
+        """
+
+        if self._sort_key is None:
+            self._sort_key = (self.schema, self.dialect, self.version)
+        return self._sort_key
 
     def __lt__(self, other: "FileInfo") -> bool:
         if self.schema != other.schema or self.dialect != other.dialect:
@@ -33,9 +120,203 @@ class FileInfo:
         )
 
 
-def collect_sql_files(directory: str) -> list[str]:
-    return [
-        os.path.join(directory, fn)
-        for fn in listdir(directory)
-        if fn.endswith(".sql")
-    ]
+def collect_sql_files(
+    directory: str,
+    filename_pattern: str | None = None,
+    min_version: int | None = None,
+    *,
+    recursive: bool = False,
+    include: Sequence[str] = (),
+    exclude: Sequence[str] = (),
+) -> list[str]:
+    """Return the paths of all SQL files in a directory.
+
+    If filename_pattern and min_version are given, files whose name
+    indicates a version lower than min_version are skipped without being
+    opened. See filename_version() for details.
+
+    If recursive is True, subdirectories are searched as well, except for
+    directories that contain a directory index (see DIRECTORY_INDEX)
+    stating that all their scripts have a version lower than min_version.
+
+    If include is not empty, only files matching at least one of its glob
+    patterns are returned. Files and directories matching one of the
+    patterns in exclude are skipped. Patterns without a slash are matched
+    against the name of a file or directory, other patterns against its
+    path relative to directory, using slashes as separators.
+    """
+
+    selector = _Selector(
+        filename_pattern, min_version, recursive, include, exclude
+    )
+    files: list[str] = []
+
+    def scan(path: str, prefix: str) -> None:
+        with os.scandir(path) as it:
+            for entry in it:
+                relpath = prefix + entry.name
+                if entry.name.endswith(".sql") and entry.is_file():
+                    if selector.wants_file(relpath):
+                        files.append(entry.path)
+                elif entry.is_dir(follow_symlinks=False):
+                    if selector.wants_directory(entry.path, relpath):
+                        scan(entry.path, relpath + "/")
+
+    scan(directory, "")
+    return files
+
+
+def collect_sql_resources(
+    directory: Traversable,
+    filename_pattern: str | None = None,
+    min_version: int | None = None,
+    *,
+    recursive: bool = False,
+    include: Sequence[str] = (),
+    exclude: Sequence[str] = (),
+) -> list[Traversable]:
+    """Return all SQL files in a directory of a zip file or package.
+
+    This works like collect_sql_files(), but nothing is extracted to disk.
+    """
+
+    selector = _Selector(
+        filename_pattern, min_version, recursive, include, exclude
+    )
+    files: list[Traversable] = []
+
+    def scan(resource: Traversable, prefix: str) -> None:
+        for r in resource.iterdir():
+            relpath = prefix + r.name
+            if r.name.endswith(".sql") and r.is_file():
+                if selector.wants_file(relpath):
+                    files.append(r)
+            elif r.is_dir():
+                if selector.wants_directory(r, relpath):
+                    scan(r, relpath + "/")
+
+    scan(directory, "")
+    return files
+
+
+@dataclass
+class _Selector:
+    filename_pattern: str | None
+    min_version: int | None
+    recursive: bool
+    include: Sequence[str]
+    exclude: Sequence[str]
+
+    def wants_file(self, relpath: str) -> bool:
+        if self.include and not _matches_any(relpath, self.include):
+            return False
+        if _matches_any(relpath, self.exclude):
+            return False
+        return _version_at_least(
+            posixpath.basename(relpath),
+            self.filename_pattern,
+            self.min_version,
+        )
+
+    def wants_directory(
+        self, directory: str | Traversable, relpath: str
+    ) -> bool:
+        if not self.recursive or _matches_any(relpath, self.exclude):
+            return False
+        return not _fully_applied(directory, self.min_version)
+
+
+def _matches_any(relpath: str, patterns: Sequence[str]) -> bool:
+    name = posixpath.basename(relpath)
+    return any(
+        fnmatchcase(relpath if "/" in pattern else name, pattern)
+        for pattern in patterns
+    )
+
+
+def _fully_applied(
+    directory: str | Traversable, min_version: int | None
+) -> bool:
+    """Return whether all scripts below directory are already applied.
+
+    This is the case if the directory contains a directory index whose
+    maxVersion is lower than min_version.
+    """
+
+    if min_version is None:
+        return False
+    try:
+        if isinstance(directory, str):
+            with open(os.path.join(directory, DIRECTORY_INDEX), "r") as f:
+                j = json.load(f)
+        else:
+            index = directory.joinpath(DIRECTORY_INDEX)
+            if not index.is_file():
+                return False
+            j = json.loads(index.read_text())
+    except FileNotFoundError:
+        return False
+    except (OSError, ValueError) as exc:
+        logging.warning(
+            "ignoring invalid directory index in {}: {}".format(directory, exc)
+        )
+        return False
+    max_version = j.get("maxVersion") if isinstance(j, dict) else None
+    return isinstance(max_version, int) and max_version < min_version
+
+
+@overload
+def open_sql_file(
+    file_info: FileInfo, mode: Literal["r"] = ...
+) -> IO[str]: ...
+@overload
+def open_sql_file(file_info: FileInfo, mode: Literal["rb"]) -> IO[bytes]: ...
+def open_sql_file(file_info: FileInfo, mode: str = "r") -> IO[Any]:
+    """Open a script file, which may be stored in a zip file or package."""
+    if file_info.resource is None:
+        return open(file_info.filename, mode)
+    elif mode == "rb":
+        return file_info.resource.open("rb")
+    else:
+        return file_info.resource.open("r")
+
+
+def open_sql_body(file_info: FileInfo) -> IO[str]:
+    """Open a script file for reading, skipping its headers."""
+    stream = open_sql_file(file_info, "rb")
+    try:
+        stream.seek(file_info.body_offset)
+        return io.TextIOWrapper(stream)
+    except BaseException:
+        stream.close()
+        raise
+
+
+def bulk_data_filename(filename: str) -> str:
+    """Return the name of the data file that belongs to a script."""
+    return os.path.splitext(filename)[0] + ".csv"
+
+
+def _version_at_least(
+    filename: str, filename_pattern: str | None, min_version: int | None
+) -> bool:
+    if filename_pattern is None or min_version is None:
+        return True
+    version = filename_version(filename, filename_pattern)
+    return version is None or version >= min_version
+
+
+def filename_version(filename: str, filename_pattern: str) -> int | None:
+    """Return the version of a script as indicated by its file name.
+
+    filename_pattern is a regular expression that is matched against the
+    start of the file's base name. The version is taken from the group
+    named "version" or, if there is no such group, from the first group.
+    Return None if the pattern does not match.
+    """
+
+    m = re.match(filename_pattern, os.path.basename(filename))
+    if not m:
+        return None
+    group: str | int = "version" if "version" in m.re.groupindex else 1
+    return int(m.group(group))
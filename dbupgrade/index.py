@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import os.path
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import NamedTemporaryFile
+from typing import Any
+
+from .files import FileInfo
+from .sql_file import ParseError, parse_sql_file
+
+INDEX_VERSION = 4
+
+
+def index_path(cache_dir: str, script_path: str) -> str:
+    """Return the path of the header index for a script directory."""
+    key = hashlib.sha1(os.path.abspath(script_path).encode()).hexdigest()
+    return os.path.join(cache_dir, "index-{}.json".format(key[:16]))
+
+
+def parse_sql_files_indexed(
+    files: Iterable[str], index_file: str, *, max_workers: int = 1
+) -> list[FileInfo]:
+    """Parse the headers of SQL files, using an on-disk index.
+
+    The index stores the parsed headers of each file, together with its size
+    and modification time. Only files that are not in the index or that
+    have changed are parsed. Entries of files that are not passed, for
+    example because they were skipped by their file name, are kept as long
+    as the files exist, and are removed otherwise. max_workers works like
+    in parse_sql_files().
+    """
+
+    files = list(files)
+    old_entries = _read_index(index_file)
+
+    def entry_for(fn: str) -> dict[str, Any]:
+        return _current_entry(fn, old_entries.get(fn))
+
+    entries: Iterable[dict[str, Any]]
+    if max_workers > 1 and len(files) > 1:
+        with ThreadPoolExecutor(max_workers) as executor:
+            entries = list(executor.map(entry_for, files))
+    else:
+        entries = map(entry_for, files)
+    new_entries: dict[str, dict[str, Any]] = {}
+    file_infos = []
+    for fn, entry in zip(files, entries, strict=True):
+        new_entries[fn] = entry
+        if "error" in entry:
+            logging.warning(os.path.basename(fn) + ": " + entry["error"])
+        else:
+            file_infos.append(_file_info_from_json(fn, entry["info"]))
+    for fn, entry in old_entries.items():
+        if fn not in new_entries and os.path.exists(fn):
+            new_entries[fn] = entry
+    if new_entries != old_entries:
+        _write_index(index_file, new_entries)
+    return file_infos
+
+
+def _current_entry(
+    filename: str, entry: dict[str, Any] | None
+) -> dict[str, Any]:
+    st = os.stat(filename)
+    if (
+        entry is None
+        or entry["size"] != st.st_size
+        or entry["mtime"] != st.st_mtime_ns
+    ):
+        entry = _parse_entry(filename, st.st_size, st.st_mtime_ns)
+    return entry
+
+
+def _parse_entry(filename: str, size: int, mtime: int) -> dict[str, Any]:
+    entry: dict[str, Any] = {"size": size, "mtime": mtime}
+    try:
+        entry["info"] = _file_info_to_json(parse_sql_file(filename))
+    except ParseError as exc:
+        entry["error"] = str(exc)
+    return entry
+
+
+def _file_info_to_json(info: FileInfo) -> dict[str, Any]:
+    return {
+        "schema": info.schema,
+        "dialect": info.dialect,
+        "version": info.version,
+        "apiLevel": info.api_level,
+        "transaction": info.transaction,
+        "execution": info.execution,
+        "bulkLoad": info.bulk_load,
+        "bodyOffset": info.body_offset,
+    }
+
+
+def _file_info_from_json(filename: str, j: dict[str, Any]) -> FileInfo:
+    info = FileInfo(
+        filename, j["schema"], j["dialect"], j["version"], j["apiLevel"]
+    )
+    info.transaction = j["transaction"]
+    info.execution = j["execution"]
+    info.bulk_load = j["bulkLoad"]
+    info.body_offset = j["bodyOffset"]
+    return info
+
+
+def _read_index(index_file: str) -> dict[str, dict[str, Any]]:
+    try:
+        with open(index_file, "r") as stream:
+            j = json.load(stream)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as exc:
+        logging.warning(
+            "ignoring invalid index {}: {}".format(index_file, exc)
+        )
+        return {}
+    if not isinstance(j, dict) or j.get("version") != INDEX_VERSION:
+        return {}
+    files: dict[str, dict[str, Any]] = j.get("files", {})
+    return files
+
+
+def _write_index(index_file: str, entries: dict[str, dict[str, Any]]) -> None:
+    directory = os.path.dirname(index_file) or "."
+    try:
+        os.makedirs(directory, exist_ok=True)
+        with NamedTemporaryFile(
+            "w", dir=directory, prefix=".index-", delete=False
+        ) as stream:
+            json.dump({"version": INDEX_VERSION, "files": entries}, stream)
+    except OSError as exc:
+        logging.warning("could not write index {}: {}".format(index_file, exc))
+        return
+    try:
+        os.replace(stream.name, index_file)
+    except OSError as exc:
+        os.unlink(stream.name)
+        logging.warning("could not write index {}: {}".format(index_file, exc))
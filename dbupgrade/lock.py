@@ -0,0 +1,203 @@
+from __future__ import annotations
+
+import logging
+import os
+import zlib
+from collections.abc import Callable
+
+from sqlalchemy import (
+    Column,
+    MetaData,
+    String,
+    Table,
+    insert,
+    select,
+    text as sa_text,
+)
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # type: ignore[assignment]
+
+LOCK_NAME = "dbupgrade"
+LOCK_TABLE = "dbupgrade_lock"
+
+_LOCK_KEY = zlib.crc32(LOCK_NAME.encode())
+
+_lock_table = Table(
+    LOCK_TABLE, MetaData(), Column("name", String(100), primary_key=True)
+)
+
+
+class LockError(Exception):
+    pass
+
+
+class MigrationLock:
+    """Lock that serializes database upgrades across processes.
+
+    The lock is held per database. The locking mechanism depends on the
+    database dialect:
+
+    * PostgreSQL: a session-level advisory lock.
+    * MySQL and MariaDB: a named lock using GET_LOCK().
+    * SQLite: an exclusive file lock on a ".lock" file next to the
+      database file.
+    * Other databases: a row lock on the only row of the dbupgrade_lock
+      table, held by a separate connection. The table is created if it
+      does not exist.
+    """
+
+    def __init__(self, conn: Connection) -> None:
+        self._conn = conn
+        self._release: Callable[[], None] | None = None
+
+    def __enter__(self) -> MigrationLock:
+        self.acquire()
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.release()
+
+    def acquire(self, *, blocking: bool = True) -> bool:
+        """Acquire the lock, waiting until it is free.
+
+        If blocking is False, return False instead of waiting if the lock
+        is held by another process. This is not supported for databases
+        that use the dbupgrade_lock table.
+        """
+
+        if self._release is not None:
+            raise LockError("lock is already held")
+        if blocking:
+            logging.info("waiting for migration lock")
+        dialect = self._conn.dialect.name
+        if dialect == "postgresql":
+            self._release = _lock_postgresql(self._conn, blocking)
+        elif dialect in ["mysql", "mariadb"]:
+            self._release = _lock_mysql(self._conn, blocking)
+        elif dialect == "sqlite":
+            self._release = _lock_sqlite(self._conn, blocking)
+        elif blocking:
+            self._release = _lock_table_row(self._conn)
+        else:
+            raise LockError(
+                "non-blocking locks are not supported with " + dialect
+            )
+        if self._release is None:
+            return False
+        logging.info("acquired migration lock")
+        return True
+
+    def release(self) -> None:
+        if self._release is None:
+            return
+        release, self._release = self._release, None
+        try:
+            release()
+        except SQLAlchemyError as exc:
+            logging.warning("could not release migration lock: " + str(exc))
+
+
+def _lock_postgresql(
+    conn: Connection, blocking: bool
+) -> Callable[[], None] | None:
+    with conn.begin():
+        if blocking:
+            conn.execute(
+                sa_text("SELECT pg_advisory_lock(:key)"), {"key": _LOCK_KEY}
+            )
+        elif not conn.execute(
+            sa_text("SELECT pg_try_advisory_lock(:key)"), {"key": _LOCK_KEY}
+        ).scalar():
+            return None
+
+    def release() -> None:
+        with conn.begin():
+            conn.execute(
+                sa_text("SELECT pg_advisory_unlock(:key)"), {"key": _LOCK_KEY}
+            )
+
+    return release
+
+
+def _lock_mysql(conn: Connection, blocking: bool) -> Callable[[], None] | None:
+    with conn.begin():
+        result = conn.execute(
+            sa_text("SELECT GET_LOCK(:name, :timeout)"),
+            {"name": LOCK_NAME, "timeout": -1 if blocking else 0},
+        ).scalar()
+    if result == 0 and not blocking:
+        return None
+    if result != 1:
+        raise LockError("could not acquire lock " + LOCK_NAME)
+
+    def release() -> None:
+        with conn.begin():
+            conn.execute(
+                sa_text("SELECT RELEASE_LOCK(:name)"), {"name": LOCK_NAME}
+            )
+
+    return release
+
+
+def _lock_sqlite(
+    conn: Connection, blocking: bool
+) -> Callable[[], None] | None:
+    database = conn.engine.url.database
+    if not database or database == ":memory:":
+        # In-memory databases can't be shared between processes.
+        return lambda: None
+    if fcntl is None:
+        raise LockError("file locking is not supported on this platform")
+    fd = os.open(database + ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(
+            fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+        )
+    except BlockingIOError:
+        os.close(fd)
+        return None
+    except OSError:
+        os.close(fd)
+        raise
+
+    def release() -> None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+    return release
+
+
+def _lock_table_row(conn: Connection) -> Callable[[], None]:
+    try:
+        _create_lock_row(conn)
+    except SQLAlchemyError:
+        # Another process might have created the table concurrently.
+        _create_lock_row(conn)
+    query = (
+        select(_lock_table.c.name)
+        .where(_lock_table.c.name == LOCK_NAME)
+        .with_for_update()
+    )
+    lock_conn = conn.engine.connect()
+    try:
+        lock_conn.begin()
+        lock_conn.execute(query)
+    except BaseException:
+        lock_conn.close()
+        raise
+    return lock_conn.close
+
+
+def _create_lock_row(conn: Connection) -> None:
+    with conn.begin():
+        _lock_table.create(conn, checkfirst=True)
+    try:
+        with conn.begin():
+            conn.execute(insert(_lock_table).values(name=LOCK_NAME))
+    except IntegrityError:
+        pass
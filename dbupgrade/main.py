@@ -3,12 +3,21 @@ from __future__ import annotations
 import json
 import logging
 import sys
-from typing import Any
+from collections.abc import Mapping
+from typing import Any, Literal
 
-from .args import Arguments, parse_args
+from .args import (
+    Arguments,
+    BundleArguments,
+    parse_args,
+    parse_bundle_args,
+)
+from .bundle import write_bundle
 from .files import FileInfo
+from .options import upgrade_options_from_args
 from .result import UpgradeResult
-from .upgrade import db_upgrade
+from .upgrade import db_upgrade, db_upgrade_many, db_upgrade_schemas
+from .url import display_url
 from .version import version_info_from_args
 
 
@@ -16,30 +25,110 @@ def main() -> None:
     try:
         args = parse_args(sys.argv)
         _configure_logging(args)
-        result = db_upgrade(
-            args.schema,
-            args.db_url,
+        result: UpgradeResult | Mapping[str, UpgradeResult]
+        if args.url_file:
+            result = db_upgrade_many(
+                args.schemas[0],
+                _read_db_urls(args.db_url),
+                args.script_path,
+                version_info_from_args(args),
+                upgrade_options_from_args(args),
+                max_workers=args.jobs,
+            )
+            success = all(r.success for r in result.values())
+            if args.json:
+                _print_json(result, "databases")
+        elif args.single_schema:
+            result = db_upgrade(
+                args.schemas[0],
+                args.db_url,
+                args.script_path,
+                version_info_from_args(args),
+                upgrade_options_from_args(args),
+            )
+            success = result.success
+            if args.json:
+                _print_json(result)
+        else:
+            result = db_upgrade_schemas(
+                None if args.all_schemas else args.schemas,
+                args.db_url,
+                args.script_path,
+                version_info_from_args(args),
+                upgrade_options_from_args(args),
+            )
+            success = all(r.success for r in result.values())
+            if args.json:
+                _print_json(result, "schemas")
+        if not success:
+            sys.exit(1)
+    except KeyboardInterrupt:
+        sys.exit(1)
+
+
+def bundle_main() -> None:
+    try:
+        args = parse_bundle_args(sys.argv)
+        _configure_logging(args)
+        write_bundle(
             args.script_path,
-            version_info_from_args(args),
+            args.bundle_file,
+            splitter=args.splitter,
+            max_workers=args.parse_jobs,
+            recursive=args.recursive,
+            include=args.include,
+            exclude=args.exclude,
         )
-        if args.json:
-            _print_json(result)
-        if not result.success:
-            sys.exit(1)
     except KeyboardInterrupt:
         sys.exit(1)
 
 
-def _configure_logging(args: Arguments) -> None:
+def _read_db_urls(filename: str) -> list[str]:
+    """Read database URLs from a file, one per line.
+
+    Empty lines and lines starting with "#" are ignored.
+    """
+
+    with open(filename, "r") as stream:
+        lines = [line.strip() for line in stream]
+    return [line for line in lines if line and not line.startswith("#")]
+
+
+def _configure_logging(args: Arguments | BundleArguments) -> None:
     log_level = logging.INFO
-    if args.json:
+    if isinstance(args, Arguments) and args.json:
         log_level = logging.ERROR
     elif args.quiet:
         log_level = logging.WARNING
     logging.basicConfig(level=log_level)
 
 
-def _print_json(result: UpgradeResult) -> None:
+def _print_json(
+    result: UpgradeResult | Mapping[str, UpgradeResult],
+    key: Literal["databases", "schemas"] = "databases",
+) -> None:
+    if isinstance(result, UpgradeResult):
+        j = _json_result(result)
+    elif key == "databases":
+        j = {
+            "success": all(r.success for r in result.values()),
+            "databases": [
+                {"url": display_url(url), **_json_result(r)}
+                for url, r in result.items()
+            ],
+        }
+    else:
+        j = {
+            "success": all(r.success for r in result.values()),
+            "schemas": [
+                {"schema": schema, **_json_result(r)}
+                for schema, r in result.items()
+            ],
+        }
+    print(json.dumps(j))
+
+
+def _json_result(result: UpgradeResult) -> dict[str, Any]:
     j: dict[str, Any] = {
         "success": result.success,
         "oldVersion": {
@@ -56,7 +145,9 @@ def _print_json(result: UpgradeResult) -> None:
     }
     if result.failed_script:
         j["failedScript"] = _json_script(result.failed_script)
-    print(json.dumps(j))
+    if result.error is not None:
+        j["error"] = result.error
+    return j
 
 
 def _json_script(script: FileInfo) -> dict[str, Any]:
@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+from collections.abc import Sequence
+from dataclasses import dataclass
+
+from .args import Arguments
+from .db import DEFAULT_EXECUTION, ExecutionMode
+from .sql import DEFAULT_SPLITTER, Splitter
+
+
+@dataclass
+class UpgradeOptions:
+    lock: bool = False
+    cache_dir: str | None = None
+    parse_workers: int = 1
+    filename_pattern: str | None = None
+    splitter: Splitter = DEFAULT_SPLITTER
+    recursive: bool = False
+    include: Sequence[str] = ()
+    exclude: Sequence[str] = ()
+    execution: ExecutionMode = DEFAULT_EXECUTION
+    bulk_inserts: bool = False
+    group_size: int = 1
+    version_batch_size: int = 1
+    atomic: bool = False
+
+
+def upgrade_options_from_args(args: Arguments) -> UpgradeOptions:
+    return UpgradeOptions(
+        lock=args.lock,
+        cache_dir=args.cache_dir,
+        parse_workers=args.parse_jobs,
+        filename_pattern=args.filename_versions,
+        splitter=args.splitter,
+        recursive=args.recursive,
+        include=args.include,
+        exclude=args.exclude,
+        execution=args.execution,
+        bulk_inserts=args.bulk_inserts,
+        group_size=args.group_size,
+        version_batch_size=args.version_batch_size,
+        atomic=args.atomic,
+    )
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import importlib.resources
+import os.path
+import posixpath
+import zipfile
+from pathlib import Path
+
+from .files import Traversable
+
+PACKAGE_PREFIX = "package:"
+
+
+def resolve_script_path(script_path: str | Traversable) -> str | Traversable:
+    """Resolve the location of the SQL scripts.
+
+    script_path can be one of:
+
+    * the path of a directory or bundle file,
+    * the path of a zip file, optionally followed by a directory inside
+      the archive, as in "app.whl/app/sql",
+    * "package:" followed by the name of a package, optionally followed by
+      a directory inside the package, as in "package:app/sql",
+    * a Traversable, for example as returned by importlib.resources.files().
+
+    Return a file system path if possible, otherwise a Traversable.
+    """
+
+    if isinstance(script_path, str):
+        if script_path.startswith(PACKAGE_PREFIX):
+            script_path = _package_resource(script_path[len(PACKAGE_PREFIX) :])
+        else:
+            return _zip_path(script_path) or script_path
+    if isinstance(script_path, Path):
+        return str(script_path)
+    return script_path
+
+
+def _package_resource(name: str) -> Traversable:
+    package, _, directory = name.partition("/")
+    resource = importlib.resources.files(package)
+    if directory:
+        resource = resource.joinpath(directory)
+    return resource
+
+
+def _zip_path(path: str) -> zipfile.Path | None:
+    archive, inner = path, ""
+    while not os.path.exists(archive):
+        parent, name = os.path.split(archive)
+        if not name or parent == archive:
+            return None
+        archive, inner = parent, posixpath.join(name, inner)
+    if not os.path.isfile(archive) or not zipfile.is_zipfile(archive):
+        return None
+    return zipfile.Path(archive, inner)
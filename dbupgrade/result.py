@@ -11,6 +11,9 @@ class UpgradeResult:
     new_version: VersionResult
     applied_scripts: list[FileInfo]
     failed_script: FileInfo | None = None
+    # Set if the upgrade could not be attempted, for example because the
+    # database could not be connected to. The versions are -1 in that case.
+    error: str | None = None
 
     @property
     def was_upgraded(self) -> bool:
@@ -18,7 +21,7 @@ class UpgradeResult:
 
     @property
     def success(self) -> bool:
-        return self.failed_script is None
+        return self.failed_script is None and self.error is None
 
 
 @dataclass
@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import os.path
+from collections.abc import Iterator
+from tempfile import NamedTemporaryFile
+from typing import IO
+
+import sqlparse
+
+from .apply import read_statements
+from .files import FileInfo, open_sql_file
+from .sql import DEFAULT_SPLITTER, Splitter
+
+# Increase when the cached statements of a script change, for example
+# because the headers are no longer passed to the splitter.
+SPLIT_CACHE_VERSION = 2
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+
+_SUFFIX = ".jsonl"
+_READ_SIZE = 1024 * 1024
+
+
+def split_cache_dir(cache_dir: str) -> str:
+    """Return the directory of the statement cache in a cache directory."""
+    return os.path.join(cache_dir, "statements")
+
+
+class SplitCache:
+    """On-disk cache of the SQL statements of script files.
+
+    Entries are keyed by a hash of a script's contents, together with the
+    cache version, the splitter, and the sqlparse version, so that a change
+    to any of them invalidates old entries. Each entry stores one JSON
+    encoded statement per line, so that statements can be read and written
+    incrementally. When the entries grow larger than max_size bytes, the
+    least recently used ones are removed.
+
+    Instances can be passed as statement loader to apply_files().
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        splitter: Splitter = DEFAULT_SPLITTER,
+        max_size: int = DEFAULT_MAX_SIZE,
+    ) -> None:
+        self.directory = directory
+        self.splitter = splitter
+        self.max_size = max_size
+
+    def __call__(self, file_info: FileInfo) -> Iterator[str]:
+        path = os.path.join(self.directory, self._key(file_info) + _SUFFIX)
+        try:
+            stream = open(path, "r", encoding="utf-8")
+        except OSError:
+            yield from self._split_and_store(file_info, path)
+        else:
+            with stream:
+                _touch(path)
+                for line in stream:
+                    yield json.loads(line)
+
+    def _key(self, file_info: FileInfo) -> str:
+        stamp = "{}:{}:{}:".format(
+            SPLIT_CACHE_VERSION, self.splitter, sqlparse.__version__
+        )
+        h = hashlib.sha256(stamp.encode())
+        with open_sql_file(file_info, "rb") as stream:
+            while chunk := stream.read(_READ_SIZE):
+                h.update(chunk)
+        return h.hexdigest()
+
+    def _split_and_store(
+        self, file_info: FileInfo, path: str
+    ) -> Iterator[str]:
+        entry = self._create_entry()
+        try:
+            for stmt in read_statements(file_info, self.splitter):
+                if entry is not None:
+                    entry = _write_statement(entry, stmt)
+                yield stmt
+        except BaseException:
+            if entry is not None:
+                _discard(entry)
+            raise
+        if entry is not None:
+            self._store(entry, path)
+
+    def _create_entry(self) -> IO[str] | None:
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            return NamedTemporaryFile(
+                "w",
+                encoding="utf-8",
+                dir=self.directory,
+                prefix=".entry-",
+                delete=False,
+            )
+        except OSError as exc:
+            logging.warning("could not write statement cache: {}".format(exc))
+            return None
+
+    def _store(self, entry: IO[str], path: str) -> None:
+        try:
+            entry.close()
+            os.replace(entry.name, path)
+        except OSError as exc:
+            logging.warning("could not write statement cache: {}".format(exc))
+            _discard(entry)
+            return
+        self._evict()
+
+    def _evict(self) -> None:
+        """Remove the least recently used entries that exceed max_size."""
+        entries = []
+        try:
+            with os.scandir(self.directory) as it:
+                for e in it:
+                    if e.name.endswith(_SUFFIX) and e.is_file():
+                        st = e.stat()
+                        entries.append((st.st_mtime_ns, st.st_size, e.path))
+        except OSError as exc:
+            logging.warning("could not clean statement cache: {}".format(exc))
+            return
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            except OSError as exc:
+                logging.warning(
+                    "could not clean statement cache: {}".format(exc)
+                )
+                return
+            total -= size
+
+
+def _write_statement(entry: IO[str], stmt: str) -> IO[str] | None:
+    try:
+        entry.write(json.dumps(stmt) + "\n")
+    except OSError as exc:
+        logging.warning("could not write statement cache: {}".format(exc))
+        _discard(entry)
+        return None
+    return entry
+
+
+def _discard(entry: IO[str]) -> None:
+    try:
+        entry.close()
+    except OSError:
+        pass
+    try:
+        os.unlink(entry.name)
+    except OSError:
+        pass
+
+
+def _touch(path: str) -> None:
+    try:
+        os.utime(path)
+    except OSError:
+        pass
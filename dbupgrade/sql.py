@@ -1,34 +1,105 @@
+from __future__ import annotations
+
 import re
+from collections.abc import Callable, Iterable, Iterator
+from functools import lru_cache
+from typing import Literal
 
 import sqlparse
+from sqlparse import tokens as T
+from sqlparse.lexer import Lexer
+
+Splitter = Literal["native", "sqlparse"]
+SPLITTERS: tuple[Splitter, ...] = ("native", "sqlparse")
+DEFAULT_SPLITTER: Splitter = "native"
 
 _SQL_DELIMITER = ";"
 _SQL_COMMENT_RE = re.compile(r"(--(| .*))$")
 _SQL_DELIMITER_RE = re.compile(r"^\s*delimiter\s*(.+)$", re.IGNORECASE)
 _PLACEHOLDER = "\ufffc"
 
+# Scripts are handed to sqlparse in chunks of at least this many characters.
+_CHUNK_SIZE = 64 * 1024
+
+# Quotes and comments, following the rules of sqlparse's lexer.
+_OPENER_RE = re.compile(
+    r"""'|"|`|--|\# |/\*|(?<![\w"$])\$(?:[_A-ZÀ-Ü]\w*)?\$""",
+    re.IGNORECASE,
+)
+_LINE_COMMENTS = {"--", "# "}
+_QUOTE_TOKENS = {
+    "'": re.compile(r"''|\\'|'"),
+    '"': re.compile(r'""|\\"|"'),
+    "`": re.compile(r"``|`"),
+    "/*": re.compile(r"\*/"),
+}
+_QUOTE_CLOSERS = {"/*": "*/"}
 
-def split_sql(sql: str) -> list[str]:
-    """Return an iterator over the SQL statements in a stream.
 
-    >>> list(split_sql("SELECT * FROM foo; DELETE FROM foo;"))
-    ... ['SELECT * FROM foo', 'DELETE FROM foo']
+def split_sql(sql: str, splitter: Splitter = DEFAULT_SPLITTER) -> list[str]:
+    """Return a list of the SQL statements in a string.
+
+    >>> split_sql("SELECT * FROM foo; DELETE FROM foo;")
+    ['SELECT * FROM foo', 'DELETE FROM foo']
     >>>
 
+    splitter selects the implementation that finds statement boundaries:
+    "native" (the default) or "sqlparse". Both return the same statements,
+    as long as the installed sqlparse version splits like sqlparse 0.6.0.
     """
-    escaped = _escape_delimiters(sql)
-    stmts = sqlparse.split(escaped)
-    unescaped = [_unescape_delimiters(s) for s in stmts]
-    processed = [_process_statement(s) for s in unescaped]
-    return [s for s in processed if s.strip()]
+    return list(iter_sql(sql.splitlines(), splitter=splitter))
+
+
+def iter_sql(
+    lines: Iterable[str],
+    *,
+    chunk_size: int = _CHUNK_SIZE,
+    splitter: Splitter = DEFAULT_SPLITTER,
+) -> Iterator[str]:
+    """Yield the SQL statements in an iterable of lines.
+
+    Unlike split_sql(), the lines are consumed incrementally, so an open
+    text file can be passed without reading the whole script into memory.
+    """
+
+    split = _SPLIT_FUNCTIONS[splitter]
+    tracker = _QuoteTracker()
+    chunk: list[str] = []
+    new_size = 0
+    threshold = chunk_size
+    for line in _escape_delimiters(lines):
+        chunk.append(line)
+        new_size += len(line)
+        # Only split after a statement that ends a line outside of any
+        # quotes or comments. The last statement of the chunk is carried
+        # over, since it may be continued by the following lines. The
+        # carried statement is split again only after at least as much new
+        # input has arrived, so that long statements like procedure bodies
+        # are split in linear time.
+        if tracker.feed(line) and new_size >= threshold:
+            if line.rstrip().endswith(";"):
+                stmts = split("\n".join(chunk))
+                carry = stmts.pop() if stmts else ""
+                yield from _finish_statements(stmts)
+                chunk = [carry]
+                new_size = 0
+                threshold = max(chunk_size, len(carry))
+    yield from _finish_statements(split("\n".join(chunk)))
+
+
+def _finish_statements(stmts: Iterable[str]) -> Iterator[str]:
+    for stmt in stmts:
+        processed = _process_statement(_unescape_delimiters(stmt))
+        if processed.strip():
+            yield processed
 
 
-def _escape_delimiters(sql: str) -> str:
-    if _PLACEHOLDER in sql:
-        raise ValueError("unexpected placeholder value in SQL string")
-    new_lines: list[str] = []
+def _escape_delimiters(lines: Iterable[str]) -> Iterator[str]:
     delimiter = ""
-    for line in sql.splitlines():
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if _PLACEHOLDER in line:
+            raise ValueError("unexpected placeholder value in SQL string")
         m = _SQL_DELIMITER_RE.match(line)
         if m:
             if m.group(1) == _SQL_DELIMITER:
@@ -39,8 +110,329 @@ def _escape_delimiters(sql: str) -> str:
             if delimiter:
                 line = line.replace(_SQL_DELIMITER, _PLACEHOLDER)
                 line = line.replace(delimiter, ";")
-            new_lines.append(line)
-    return "\n".join(new_lines)
+            yield line
+
+
+class _QuoteTracker:
+    """Track whether lines of SQL end inside a quoted string or comment."""
+
+    def __init__(self) -> None:
+        self._opener: str | None = None
+
+    def feed(self, line: str) -> bool:
+        """Process the next line.
+
+        Return whether the end of the line is outside of quoted strings,
+        quoted identifiers, and block comments.
+        """
+
+        pos = 0
+        while True:
+            if self._opener is not None:
+                end = self._find_closer(line, pos, self._opener)
+                if end is None:
+                    return False
+                pos = end
+                self._opener = None
+            m = _OPENER_RE.search(line, pos)
+            if not m:
+                return True
+            if m.group() in _LINE_COMMENTS:
+                return True
+            self._opener = m.group()
+            pos = m.end()
+
+    @staticmethod
+    def _find_closer(line: str, pos: int, opener: str) -> int | None:
+        if opener.startswith("$"):
+            end = line.find(opener, pos)
+            return None if end < 0 else end + len(opener)
+        closer = _QUOTE_CLOSERS.get(opener, opener)
+        for m in _QUOTE_TOKENS[opener].finditer(line, pos):
+            if m.group() == closer:
+                return m.end()
+        return None
+
+
+# The native splitter below finds the same statement boundaries as
+# sqlparse.split(), but only distinguishes the tokens that affect them:
+# whitespace, comments, quoted strings and identifiers, dollar-quoted
+# literals, parentheses, semicolons, and the keywords that open and close
+# BEGIN ... END blocks. The token rules are listed in the same order as in
+# sqlparse's lexer, leaving out rules that cannot affect splitting. They
+# were taken from sqlparse 0.6.0. Keywords are classified using sqlparse's
+# own lexer, which requires sqlparse 0.4.4 or newer. TestSplitters checks
+# that both splitters agree with the installed sqlparse version.
+
+# Token kinds
+_WS = 0
+_NEWLINE = 1
+_COMMENT = 2
+_BLOCK_COMMENT = 3
+_SEMICOLON = 4
+_OPEN = 5
+_CLOSE = 6
+_BLOCK_KEYWORD = 7
+_GO = 8
+_OTHER = 9
+# Resolved to one of the kinds above by _classify_keyword()
+_WORD = 10
+_KEYWORD = 11
+_DDL = 12
+
+_TOKEN_RULES: list[tuple[str, int]] = [
+    (r"(?:--|\# )\+.*?(?:\r\n|\r|\n|$)", _OTHER),  # comment hint
+    (r"(?:--|\# ).*?(?:\r\n|\r|\n|$)", _COMMENT),
+    (r"\r\n|\r|\n", _NEWLINE),
+    (r"[^\S\r\n]+", _WS),
+    (r":=|::|\*|`(?:``|[^`])*`|´(?:´´|[^´])*´", _OTHER),
+    (r"\?|%(?:\(\w+\))?s|[$:?](?<!\w[$:?])\w+|\\\w+", _OTHER),
+    (r"CASE\b", _KEYWORD),
+    (r"(?:IN|VALUES|USING|FROM|AS)\b", _OTHER),
+    (
+        r"(?:@|\#\#|\#)[A-ZÀ-Ü]\w+|[A-ZÀ-Ü]\w*(?=\s*\.(?!\d))"
+        r"|[A-ZÀ-Ü](?<=\.[A-ZÀ-Ü])\w*|[A-ZÀ-Ü]\w*(?=\()",
+        _OTHER,
+    ),
+    (
+        r"-?0x[\dA-F]+|-?\d+(?:\.\d+)?E-?\d+"
+        r"|-?(?:\d+(?:\.\d*)|\.\d+)(?![_A-ZÀ-Ü])|-?\d+(?![_A-ZÀ-Ü])",
+        _OTHER,
+    ),
+    (
+        r"'(?:''|\\'|[^'])*'|\"(?:\"\"|\\\"|[^\"])*\"|\"\"|\".*?[^\\]\""
+        r"|\[(?<![\w\])]\[)[^\]\[]+\]",
+        _OTHER,
+    ),
+    (r"END(?:\s+IF|\s+LOOP|\s+WHILE|\s+FOR|\s+CASE)?\b", _KEYWORD),
+    (r"IF\s+(?:NOT\s+)?EXISTS\b", _OTHER),
+    (r"CREATE(?:\s+OR\s+REPLACE)?\b", _DDL),
+    (r"HANDLER\s+FOR\b", _OTHER),
+    (r"GO\s\d+\b", _KEYWORD),
+    (r"(?:AT|WITH')\s+TIME\s+ZONE\s+'[^']+'", _OTHER),
+    (r"\w[$#\w]*", _WORD),
+    (r";", _SEMICOLON),
+    (r"\(", _OPEN),
+    (r"\)", _CLOSE),
+    (r"[:\[\],.]", _OTHER),
+    (r"->>?|\#>>?|@>|<@|\?\|?|\?&|-|\#-|[<>=~!]+|[+/@#%^&|^-]+", _OTHER),
+    (r"[\s\S]", _OTHER),
+]
+_TOKEN_RE = re.compile(
+    "|".join("({})".format(rule) for rule, _ in _TOKEN_RULES), re.IGNORECASE
+)
+# Indexed by the number of the matching group.
+_TOKEN_KINDS = [-1] + [kind for _, kind in _TOKEN_RULES]
+_DOLLAR_QUOTE_RE = re.compile(
+    r"(?<![\w\"$])\$(?:[_A-ZÀ-Ü]\w*)?\$", re.IGNORECASE
+)
+_TRANSACTION_KEYWORDS = {
+    "TRANSACTION",
+    "WORK",
+    "TRAN",
+    "DISTRIBUTED",
+    "DEFERRED",
+    "IMMEDIATE",
+    "EXCLUSIVE",
+}
+_BLOCK_KEYWORDS = _TRANSACTION_KEYWORDS | {
+    "DECLARE",
+    "BEGIN",
+    "FOR",
+    "WHILE",
+    "LOOP",
+    "DO",
+    "IF",
+    "CASE",
+    "END",
+    "END IF",
+    "END FOR",
+    "END WHILE",
+    "END LOOP",
+    "END CASE",
+}
+_CLOSED_BLOCKS = {
+    "END IF": ("IF",),
+    "END FOR": ("FOR",),
+    "END WHILE": ("WHILE",),
+    "END LOOP": ("LOOP", "FOR", "WHILE"),
+    "END CASE": ("CASE",),
+}
+
+
+def _split_native(sql: str) -> list[str]:
+    return _StatementSplitter().split(sql)
+
+
+class _StatementSplitter:
+    """Find statement boundaries like sqlparse's StatementSplitter."""
+
+    def __init__(self) -> None:
+        self._reset()
+
+    def _reset(self) -> None:
+        self._block_stack: list[str] = []
+        self._unconfirmed_start: str | None = None
+        self._is_create = False
+        self._seen_begin = False
+
+    def split(self, sql: str) -> list[str]:
+        statements: list[str] = []
+        start = 0
+        level = 0
+        consume_ws = False
+        has_content = False
+        self._reset()
+        match = _TOKEN_RE.match
+        pos = 0
+        length = len(sql)
+        while pos < length:
+            span = _delimited_span(sql, pos) if sql[pos] in "/$" else None
+            if span is not None:
+                kind, end = span
+            else:
+                m = match(sql, pos)
+                assert m and m.lastindex
+                kind = _TOKEN_KINDS[m.lastindex]
+                end = m.end()
+            if kind >= _WORD:
+                value = sql[pos:end]
+                kind, ttype = _classify_keyword(value, kind)
+
+            if consume_ws and kind != _WS and kind != _COMMENT:
+                statements.append(sql[start:pos].strip())
+                self._reset()
+                start = pos
+                level = 0
+                consume_ws = False
+                has_content = False
+
+            if kind == _SEMICOLON:
+                self._unconfirmed_start = None
+                if self._seen_begin and self._block_stack[-1:] == ["BEGIN"]:
+                    self._block_stack.pop()
+                    level -= 1
+                self._seen_begin = False
+                if level <= 0 and "BEGIN" not in self._block_stack:
+                    consume_ws = True
+            elif kind == _BLOCK_KEYWORD:
+                level += self._change_level(ttype, value.upper())
+                if ttype is not T.Keyword or value.upper() != "BEGIN":
+                    self._seen_begin = False
+            elif kind == _GO:
+                consume_ws = True
+            elif kind > _BLOCK_COMMENT:
+                if kind == _OPEN:
+                    level += 1
+                elif kind == _CLOSE:
+                    level -= 1
+                self._seen_begin = False
+            if kind > _NEWLINE:
+                has_content = True
+            pos = end
+        if has_content:
+            statements.append(sql[start:].strip())
+        return statements
+
+    def _change_level(self, ttype: T._TokenType, unified: str) -> int:
+        if ttype is T.Keyword.DDL and unified.startswith("CREATE"):
+            self._is_create = True
+            return 0
+        if unified == "DECLARE" and self._is_create and not self._block_stack:
+            self._block_stack.append("DECLARE")
+            return 1
+        if unified == "BEGIN":
+            self._seen_begin = True
+            if self._block_stack[-1:] == ["DECLARE"]:
+                self._block_stack[-1] = "BEGIN"
+                return 0
+            self._block_stack.append("BEGIN")
+            return 1
+        if self._seen_begin and unified in _TRANSACTION_KEYWORDS:
+            self._seen_begin = False
+            if self._block_stack[-1:] == ["BEGIN"]:
+                self._block_stack.pop()
+                return -1
+            return 0
+        if "BEGIN" in self._block_stack:
+            change = self._nested_block(unified)
+            if change is not None:
+                return change
+        if unified == "END":
+            if self._block_stack:
+                self._block_stack.pop()
+            return -1
+        expected = _CLOSED_BLOCKS.get(unified, ())
+        if self._block_stack and self._block_stack[-1] in expected:
+            self._block_stack.pop()
+            return -1
+        return 0
+
+    def _nested_block(self, unified: str) -> int | None:
+        if unified in ("FOR", "WHILE"):
+            self._unconfirmed_start = unified
+            return 0
+        if unified in ("LOOP", "DO"):
+            if self._unconfirmed_start in ("FOR", "WHILE"):
+                self._block_stack.append(self._unconfirmed_start)
+                self._unconfirmed_start = None
+                return 1
+            if unified == "LOOP":
+                self._block_stack.append("LOOP")
+                return 1
+        if unified in ("IF", "CASE"):
+            self._block_stack.append(unified)
+            return 1
+        return None
+
+
+def _delimited_span(sql: str, pos: int) -> tuple[int, int] | None:
+    """Return kind and end of a block comment or dollar-quoted literal."""
+    if sql.startswith("/*", pos):
+        end = sql.find("*/", pos + 2)
+        if end < 0:
+            return None
+        kind = _OTHER if sql.startswith("/*+", pos) else _BLOCK_COMMENT
+        return kind, end + 2
+    m = _DOLLAR_QUOTE_RE.match(sql, pos)
+    if m:
+        end = sql.find(m.group(), m.end())
+        if end >= 0:
+            return _OTHER, end + len(m.group())
+    return None
+
+
+def _classify_keyword(value: str, kind: int) -> tuple[int, T._TokenType]:
+    if kind == _WORD:
+        upper = value.upper()
+        if value != "GO" and upper not in _BLOCK_KEYWORDS:
+            if not upper.startswith("CREATE"):
+                return _OTHER, T.Name
+        ttype = _keyword_type(upper)
+    else:
+        ttype = T.Keyword.DDL if kind == _DDL else T.Keyword
+    if ttype not in T.Keyword:
+        return _OTHER, ttype
+    if ttype is T.Keyword and value.split()[0] == "GO":
+        return _GO, ttype
+    upper = value.upper()
+    if upper in _BLOCK_KEYWORDS or (
+        ttype is T.Keyword.DDL and upper.startswith("CREATE")
+    ):
+        return _BLOCK_KEYWORD, ttype
+    return _OTHER, ttype
+
+
+@lru_cache(maxsize=256)
+def _keyword_type(word: str) -> T._TokenType:
+    lexer = Lexer.get_default_instance()  # type: ignore[no-untyped-call]
+    return lexer.is_keyword(word)[0]  # type: ignore[no-any-return]
+
+
+_SPLIT_FUNCTIONS: dict[Splitter, Callable[[str], list[str]]] = {
+    "native": _split_native,
+    "sqlparse": sqlparse.split,
+}
 
 
 def _unescape_delimiters(stmt: str) -> str:
@@ -1,32 +1,119 @@
+from __future__ import annotations
+
+import locale
 import logging
 import os.path
 import re
 from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+from typing import IO
+
+from dbupgrade.bulk import BULK_LOADS, BulkLoad
+from dbupgrade.db import EXECUTION_MODES, ExecutionMode
+from dbupgrade.files import FileInfo, Traversable, filename_version
 
-from dbupgrade.files import FileInfo
+# Script headers are read in chunks of this many bytes, so that only a
+# small prefix of each script is read, even if its first statement is huge.
+HEADER_CHUNK_SIZE = 4096
 
 
 class ParseError(Exception):
     pass
 
 
-def parse_sql_files(files: Iterable[str]) -> list[FileInfo]:
+def parse_sql_files(
+    files: Iterable[str | Traversable], *, max_workers: int = 1
+) -> list[FileInfo]:
+    """Parse the headers of SQL files.
+
+    files can contain file names or files in a zip file or package.
+
+    If max_workers is greater than 1, the files are read concurrently using
+    a thread pool. The returned list and the warnings about invalid files
+    are in the same order as the given files.
+    """
+
+    files = list(files)
+    results: Iterable[FileInfo | ParseError]
+    if max_workers > 1 and len(files) > 1:
+        with ThreadPoolExecutor(max_workers) as executor:
+            results = list(executor.map(_try_parse_sql_file, files))
+    else:
+        results = map(_try_parse_sql_file, files)
     file_infos = []
-    for fn in files:
-        try:
-            file_infos.append(_parse_sql_file(fn))
-        except ParseError as exc:
-            logging.warning(os.path.basename(fn) + ": " + str(exc))
+    for fn, result in zip(files, results, strict=True):
+        if isinstance(result, ParseError):
+            logging.warning(_basename(fn) + ": " + str(result))
+        else:
+            file_infos.append(result)
     return file_infos
 
 
-def _parse_sql_file(filename: str) -> FileInfo:
-    with open(filename, "r") as stream:
-        return parse_sql_stream(stream, filename)
+def check_filename_versions(
+    file_infos: Iterable[FileInfo], filename_pattern: str
+) -> list[FileInfo]:
+    """Skip files whose Version header does not match their file name.
+
+    Files whose name does not match filename_pattern are not checked.
+    """
+
+    checked = []
+    for info in file_infos:
+        version = filename_version(info.filename, filename_pattern)
+        if version is None or version == info.version:
+            checked.append(info)
+        else:
+            logging.warning(
+                os.path.basename(info.filename)
+                + ": version header does not match file name"
+            )
+    return checked
+
+
+def _basename(filename: str | Traversable) -> str:
+    if isinstance(filename, str):
+        return os.path.basename(filename)
+    return filename.name
+
+
+def _try_parse_sql_file(
+    filename: str | Traversable,
+) -> FileInfo | ParseError:
+    try:
+        return parse_sql_file(filename)
+    except ParseError as exc:
+        return exc
+
+
+def parse_sql_file(filename: str | Traversable) -> FileInfo:
+    if isinstance(filename, str):
+        with open(filename, "rb") as stream:
+            return parse_sql_binary_stream(stream, filename)
+    with filename.open("rb") as stream:
+        info = parse_sql_binary_stream(stream, str(filename))
+    info.resource = filename
+    return info
+
+
+def parse_sql_binary_stream(stream: IO[bytes], filename: str) -> FileInfo:
+    """Parse the headers at the start of a binary stream.
+
+    Only the headers and the first line after them are read, see
+    read_sql_headers(). The body_offset of the returned FileInfo is set to
+    the byte offset of the first line after the headers.
+    """
+
+    headers, offset = read_sql_headers(stream)
+    info = _file_info(headers, filename)
+    info.body_offset = offset
+    return info
 
 
 def parse_sql_stream(stream: Iterable[str], filename: str) -> FileInfo:
-    headers = _parse_sql_headers(stream)
+    return _file_info(_parse_sql_headers(stream), filename)
+
+
+def _file_info(headers: dict[str, str], filename: str) -> FileInfo:
     try:
         schema = headers["schema"]
         dialect = headers["dialect"]
@@ -38,6 +125,14 @@ def parse_sql_stream(stream: Iterable[str], filename: str) -> FileInfo:
     info = FileInfo(filename, schema, dialect, version, api_level)
     if "transaction" in headers:
         info.transaction = _bool_header(headers, "transaction")
+    if "execution" in headers:
+        info.execution = _execution_header(headers, "execution")
+    if "bulk-load" in headers:
+        info.bulk_load = _bulk_load_header(headers, "bulk-load")
+        if dialect != "postgresql":
+            raise ParseError(
+                "header requires the postgresql dialect: bulk-load"
+            )
     return info
 
 
@@ -46,6 +141,42 @@ _line_re = re.compile(
 )
 
 
+def read_sql_headers(stream: IO[bytes]) -> tuple[dict[str, str], int]:
+    """Read the headers at the start of a binary stream.
+
+    The stream is read in chunks of HEADER_CHUNK_SIZE bytes until the first
+    line that is not a header. Return the headers and the byte offset of
+    that line.
+    """
+
+    encoding = locale.getpreferredencoding(False)
+    headers: dict[str, str] = {}
+    offset = 0
+    pending = b""
+    while True:
+        chunk = stream.read(HEADER_CHUNK_SIZE)
+        lines = (pending + chunk).splitlines(keepends=True)
+        # The last line may continue in the next chunk, unless the end of
+        # the stream was reached.
+        pending = lines.pop() if chunk and lines else b""
+        for line in lines:
+            try:
+                m = _line_re.match(line.decode(encoding))
+            except UnicodeDecodeError:
+                m = None
+            if not m:
+                return headers, offset
+            headers[m.group(1).lower()] = m.group(2).strip()
+            offset += len(line)
+        if not chunk:
+            return headers, offset
+        # Stop at a long first statement line instead of reading it fully.
+        if len(pending) >= HEADER_CHUNK_SIZE and not _line_re.match(
+            pending.decode(encoding, "ignore")
+        ):
+            return headers, offset
+
+
 def _parse_sql_headers(stream: Iterable[str]) -> dict[str, str]:
     matches = []
     for line in stream:
@@ -67,6 +198,32 @@ def _bool_header(headers: dict[str, str], header_name: str) -> bool:
         ) from None
 
 
+def _execution_header(
+    headers: dict[str, str], header_name: str
+) -> ExecutionMode:
+    value = headers[header_name]
+    for mode in EXECUTION_MODES:
+        if value == mode:
+            return mode
+    raise ParseError(
+        "header must be one of {}: {}".format(
+            ", ".join(repr(m) for m in EXECUTION_MODES), header_name
+        )
+    )
+
+
+def _bulk_load_header(headers: dict[str, str], header_name: str) -> BulkLoad:
+    value = headers[header_name]
+    for bulk_load in BULK_LOADS:
+        if value == bulk_load:
+            return bulk_load
+    raise ParseError(
+        "header must be one of {}: {}".format(
+            ", ".join(repr(b) for b in BULK_LOADS), header_name
+        )
+    )
+
+
 def _int_header(headers: dict[str, str], header_name: str) -> int:
     try:
         return int(headers[header_name])
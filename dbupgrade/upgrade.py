@@ -1,29 +1,369 @@
 from __future__ import annotations
 
+import asyncio
 import logging
 from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import AbstractContextManager, nullcontext
+from functools import partial
 
-from .apply import apply_files
-from .db import fetch_current_db_versions
-from .files import FileInfo, collect_sql_files
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from .apply import (
+    StatementCache,
+    StatementLoader,
+    apply_files,
+    read_statements,
+)
+from .bundle import is_bundle, read_bundle, read_bundled_statements
+from .catalog import ScriptCatalog
+from .db import (
+    connect,
+    connect_async,
+    fetch_current_db_versions,
+    fetch_current_db_versions_many,
+)
+from .files import (
+    FileInfo,
+    Traversable,
+    collect_sql_files,
+    collect_sql_resources,
+)
 from .filter import Filter
+from .index import index_path, parse_sql_files_indexed
+from .lock import MigrationLock
+from .options import UpgradeOptions
+from .resources import resolve_script_path
 from .result import UpgradeResult, VersionResult
-from .sql_file import parse_sql_files
-from .url import dialect_from_url
+from .split_cache import SplitCache, split_cache_dir
+from .sql_file import check_filename_versions, parse_sql_files
+from .url import display_url
 from .version import VersionInfo, create_version_matcher
 
+# Seconds between attempts to acquire a SQLite lock in db_upgrade_async().
+_LOCK_POLL_INTERVAL = 0.1
+
 
 def db_upgrade(
+    schema: str,
+    db_url: str | Engine | Connection,
+    script_path: str | Traversable,
+    version_info: VersionInfo,
+    options: UpgradeOptions | None = None,
+) -> UpgradeResult:
+    """Upgrade a database schema using the SQL scripts in script_path.
+
+    script_path is a directory, a bundle file, a zip file, or a package,
+    see read_script_files(). db_url is either a database URL or an existing
+    SQLAlchemy engine or connection. Engines and connections are not
+    disposed of or closed.
+    """
+
+    options = options or UpgradeOptions()
+    with connect(db_url) as conn, _migration_lock(conn, options):
+        old_version, old_api_level, filter_ = create_filter(
+            schema, conn, version_info
+        )
+        files = read_files_to_apply(script_path, filter_, options)
+        applied_scripts, failed_script = apply_files(
+            conn,
+            files,
+            _statement_loader(script_path, options),
+            execution=options.execution,
+            bulk_inserts=options.bulk_inserts,
+            group_size=options.group_size,
+            version_batch_size=options.version_batch_size,
+            atomic=options.atomic,
+        )
+    return _upgrade_result(
+        old_version, old_api_level, applied_scripts, failed_script
+    )
+
+
+def db_upgrade_schemas(
+    schemas: Iterable[str] | None,
+    db_url: str | Engine | Connection,
+    script_path: str | Traversable,
+    version_info: VersionInfo,
+    options: UpgradeOptions | None = None,
+) -> dict[str, UpgradeResult]:
+    """Upgrade several database schemas in one database.
+
+    If schemas is None, all schemas that have scripts for the database's
+    dialect in script_path are upgraded. The scripts are only collected and
+    parsed once, and the current versions of all schemas are fetched using
+    a single query. A failure in one schema does not prevent the other
+    schemas from being upgraded. Return the result of each upgrade, keyed
+    by schema name.
+    """
+
+    options = options or UpgradeOptions()
+    results: dict[str, UpgradeResult] = {}
+    with connect(db_url) as conn, _migration_lock(conn, options):
+        dialect = conn.dialect.name
+        if schemas is None:
+            catalog = ScriptCatalog(read_script_files(script_path, options))
+            schemas = catalog.schemas(dialect)
+            versions = fetch_current_db_versions_many(conn, schemas)
+        else:
+            versions = fetch_current_db_versions_many(conn, schemas)
+            min_version = min((v for v, _ in versions.values()), default=-1)
+            catalog = ScriptCatalog(
+                read_script_files(script_path, options, min_version + 1)
+            )
+        for schema, (old_version, old_api_level) in versions.items():
+            logging.info("upgrading schema {}".format(schema))
+            filter_ = _version_filter(
+                schema, dialect, old_version, old_api_level, version_info
+            )
+            files = catalog.select(filter_)
+            applied_scripts, failed_script = apply_files(
+                conn,
+                files,
+                _statement_loader(script_path, options),
+                execution=options.execution,
+                bulk_inserts=options.bulk_inserts,
+                group_size=options.group_size,
+                version_batch_size=options.version_batch_size,
+                atomic=options.atomic,
+            )
+            results[schema] = _upgrade_result(
+                old_version, old_api_level, applied_scripts, failed_script
+            )
+    return results
+
+
+def db_upgrade_many(
+    schema: str,
+    db_urls: Iterable[str],
+    script_path: str | Traversable,
+    version_info: VersionInfo,
+    options: UpgradeOptions | None = None,
+    *,
+    max_workers: int = 4,
+) -> dict[str, UpgradeResult]:
+    """Upgrade a database schema in several databases concurrently.
+
+    The SQL scripts are only collected, parsed, and split once. At most
+    max_workers databases are upgraded at the same time. Return the
+    result of each upgrade, keyed by database URL.
+
+    If a database cannot be upgraded because of a database or OS error,
+    for example because connecting fails, the error is recorded in its
+    result and the other databases are still upgraded. If upgrading one
+    of the databases raises any other exception, databases that have not
+    been started yet are skipped and the exception is re-raised.
+    """
+
+    options = options or UpgradeOptions()
+    catalog = ScriptCatalog(read_script_files(script_path, options))
+    load = StatementCache(_statement_loader(script_path, options))
+    with ThreadPoolExecutor(max_workers) as executor:
+        futures = {
+            db_url: executor.submit(
+                _db_upgrade_files,
+                schema,
+                db_url,
+                catalog,
+                version_info,
+                options,
+                load,
+            )
+            for db_url in db_urls
+        }
+        try:
+            return {db_url: f.result() for db_url, f in futures.items()}
+        except BaseException:
+            executor.shutdown(cancel_futures=True)
+            raise
+
+
+def _db_upgrade_files(
+    schema: str,
+    db_url: str,
+    catalog: ScriptCatalog,
+    version_info: VersionInfo,
+    options: UpgradeOptions,
+    load: StatementLoader,
+) -> UpgradeResult:
+    try:
+        return _db_upgrade_catalog(
+            schema, db_url, catalog, version_info, options, load
+        )
+    except (SQLAlchemyError, OSError) as exc:
+        logging.error("{}: {}".format(display_url(db_url), exc))
+        return UpgradeResult(
+            VersionResult(-1, -1), VersionResult(-1, -1), [], error=str(exc)
+        )
+
+
+def _db_upgrade_catalog(
     schema: str,
     db_url: str,
-    script_path: str,
+    catalog: ScriptCatalog,
     version_info: VersionInfo,
+    options: UpgradeOptions,
+    load: StatementLoader,
 ) -> UpgradeResult:
-    old_version, old_api_level, filter_ = create_filter(
-        schema, db_url, version_info
+    with connect(db_url) as conn, _migration_lock(conn, options):
+        old_version, old_api_level, filter_ = create_filter(
+            schema, conn, version_info
+        )
+        files = catalog.select(filter_)
+        applied_scripts, failed_script = apply_files(
+            conn,
+            files,
+            load,
+            execution=options.execution,
+            bulk_inserts=options.bulk_inserts,
+            group_size=options.group_size,
+            version_batch_size=options.version_batch_size,
+            atomic=options.atomic,
+        )
+    return _upgrade_result(
+        old_version, old_api_level, applied_scripts, failed_script
     )
-    files = read_files_to_apply(script_path, filter_)
-    applied_scripts, failed_script = apply_files(db_url, files)
+
+
+async def db_upgrade_async(
+    schema: str,
+    db_url: str | AsyncEngine | AsyncConnection,
+    script_path: str | Traversable,
+    version_info: VersionInfo,
+    options: UpgradeOptions | None = None,
+) -> UpgradeResult:
+    """Upgrade a database schema without blocking the event loop.
+
+    db_url is either a database URL using an asyncio driver or an existing
+    AsyncEngine or AsyncConnection. The SQL scripts are collected and
+    parsed in the event loop's default executor while the current version
+    is fetched from the database. The statements of the scripts to apply
+    are also read and split in the executor, before they are applied, and
+    are kept in memory until the upgrade is done. Only the database calls
+    run on the event loop's thread, including streaming the data files of
+    scripts with a Bulk-Load header.
+    """
+
+    options = options or UpgradeOptions()
+    loop = asyncio.get_running_loop()
+    all_files: asyncio.Future[list[FileInfo]] | None = None
+    if options.filename_pattern is None and not options.recursive:
+        all_files = loop.run_in_executor(
+            None, read_script_files, script_path, options
+        )
+    try:
+        async with connect_async(db_url) as conn:
+            lock = await _acquire_migration_lock(conn, options)
+            try:
+                old_version, old_api_level, filter_ = await conn.run_sync(
+                    lambda c: create_filter(schema, c, version_info)
+                )
+                if all_files is None:
+                    # Use the current version to skip applied scripts.
+                    all_files = loop.run_in_executor(
+                        None,
+                        read_script_files,
+                        script_path,
+                        options,
+                        filter_.version_matcher.min_version,
+                    )
+                files = ScriptCatalog(await all_files).select(filter_)
+                load = await loop.run_in_executor(
+                    None,
+                    _preload_statements,
+                    files,
+                    _statement_loader(script_path, options),
+                )
+                applied_scripts, failed_script = await conn.run_sync(
+                    apply_files,
+                    files,
+                    load,
+                    execution=options.execution,
+                    bulk_inserts=options.bulk_inserts,
+                    group_size=options.group_size,
+                    version_batch_size=options.version_batch_size,
+                    atomic=options.atomic,
+                )
+            finally:
+                if lock is not None:
+                    await conn.run_sync(lambda _: lock.release())
+    finally:
+        if all_files is not None:
+            all_files.cancel()
+    return _upgrade_result(
+        old_version, old_api_level, applied_scripts, failed_script
+    )
+
+
+def _statement_loader(
+    script_path: str | Traversable, options: UpgradeOptions
+) -> StatementLoader:
+    if isinstance(script_path, str) and is_bundle(script_path):
+        return read_bundled_statements
+    if options.cache_dir is not None:
+        directory = split_cache_dir(options.cache_dir)
+        return SplitCache(directory, options.splitter)
+    return partial(read_statements, splitter=options.splitter)
+
+
+def _preload_statements(
+    files: Iterable[FileInfo], load: StatementLoader
+) -> StatementLoader:
+    """Read the statements of files and return a loader that returns them.
+
+    Reading stops at the first script that can't be read. The returned
+    loader raises the error for that script, so that the preceding scripts
+    are still applied.
+    """
+
+    statements: dict[str, list[str] | Exception] = {}
+    for file_info in files:
+        try:
+            statements[file_info.filename] = list(load(file_info))
+        except Exception as exc:
+            statements[file_info.filename] = exc
+            break
+
+    def load_preloaded(file_info: FileInfo) -> list[str]:
+        result = statements[file_info.filename]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    return load_preloaded
+
+
+def _migration_lock(
+    conn: Connection, options: UpgradeOptions
+) -> AbstractContextManager[object]:
+    return MigrationLock(conn) if options.lock else nullcontext()
+
+
+async def _acquire_migration_lock(
+    conn: AsyncConnection, options: UpgradeOptions
+) -> MigrationLock | None:
+    if not options.lock:
+        return None
+    lock = await conn.run_sync(MigrationLock)
+    if conn.dialect.name != "sqlite":
+        # Asyncio drivers wait for the lock without blocking the loop.
+        await conn.run_sync(lambda _: lock.acquire())
+        return lock
+    # The SQLite file lock would block the event loop, so poll instead.
+    logging.info("waiting for migration lock")
+    while not await conn.run_sync(lambda _: lock.acquire(blocking=False)):
+        await asyncio.sleep(_LOCK_POLL_INTERVAL)
+    return lock
+
+
+def _upgrade_result(
+    old_version: int,
+    old_api_level: int,
+    applied_scripts: list[FileInfo],
+    failed_script: FileInfo | None,
+) -> UpgradeResult:
     try:
         new_version = applied_scripts[-1].version
         new_api_level = applied_scripts[-1].api_level
@@ -39,25 +379,100 @@ def db_upgrade(
 
 
 def create_filter(
-    schema: str, db_url: str, version_info: VersionInfo
+    schema: str, conn: Connection, version_info: VersionInfo
 ) -> tuple[int, int, Filter]:
-    version, api_level = fetch_current_db_versions(db_url, schema)
+    version, api_level = fetch_current_db_versions(conn, schema)
+    filter_ = _version_filter(
+        schema, conn.dialect.name, version, api_level, version_info
+    )
+    return version, api_level, filter_
+
+
+def _version_filter(
+    schema: str,
+    dialect: str,
+    version: int,
+    api_level: int,
+    version_info: VersionInfo,
+) -> Filter:
     logging.info(
         "current version: {version}, current API level: {api_level}".format(
             version=version, api_level=api_level
         )
     )
     matcher = create_version_matcher(version_info, version + 1, api_level)
-    dialect = dialect_from_url(db_url)
-    return version, api_level, Filter(schema, dialect, matcher)
+    return Filter(schema, dialect, matcher)
+
+
+def read_files_to_apply(
+    script_path: str | Traversable,
+    filter_: Filter,
+    options: UpgradeOptions | None = None,
+) -> list[FileInfo]:
+    min_version = filter_.version_matcher.min_version
+    files = read_script_files(script_path, options, min_version)
+    return ScriptCatalog(files).select(filter_)
 
 
-def read_files_to_apply(script_path: str, filter_: Filter) -> list[FileInfo]:
-    files = parse_sql_files(collect_sql_files(script_path))
-    return filter_files(files, filter_)
+def read_script_files(
+    script_path: str | Traversable,
+    options: UpgradeOptions | None = None,
+    min_version: int | None = None,
+) -> list[FileInfo]:
+    """Collect and parse the SQL scripts in script_path.
+
+    script_path is either a directory, a bundle file created by
+    write_bundle(), or a zip file or package as accepted by
+    resolve_script_path(). If options.filename_pattern is set and
+    min_version is given, scripts whose file name indicates a lower version
+    are not read at all.
+    """
+
+    options = options or UpgradeOptions()
+    source = resolve_script_path(script_path)
+    pattern = options.filename_pattern
+    file_infos: list[FileInfo]
+    if not isinstance(source, str):
+        resources = collect_sql_resources(
+            source,
+            pattern,
+            min_version,
+            recursive=options.recursive,
+            include=options.include,
+            exclude=options.exclude,
+        )
+        file_infos = parse_sql_files(
+            resources, max_workers=options.parse_workers
+        )
+    elif is_bundle(source):
+        return list(read_bundle(source))
+    else:
+        files = collect_sql_files(
+            source,
+            pattern,
+            min_version,
+            recursive=options.recursive,
+            include=options.include,
+            exclude=options.exclude,
+        )
+        if options.cache_dir is not None:
+            index_file = index_path(options.cache_dir, source)
+            file_infos = parse_sql_files_indexed(
+                files, index_file, max_workers=options.parse_workers
+            )
+        else:
+            file_infos = parse_sql_files(
+                files, max_workers=options.parse_workers
+            )
+    if pattern is not None:
+        file_infos = check_filename_versions(file_infos, pattern)
+    return file_infos
 
 
 def filter_files(files: Iterable[FileInfo], filter_: Filter) -> list[FileInfo]:
-    matching = [f for f in files if filter_.matches(f)]
-    matching.sort()
-    return matching
+    """Return the files that match filter_, sorted by version.
+
+    To select scripts for several filters, build a ScriptCatalog once and
+    use its select() method instead.
+    """
+    return ScriptCatalog(files).select(filter_)
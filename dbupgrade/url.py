@@ -1,2 +1,10 @@
-def dialect_from_url(url: str) -> str:
-    return url.split(":")[0].split("+")[0]
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import ArgumentError
+
+
+def display_url(url: str) -> str:
+    """Return url with the password hidden, suitable for messages."""
+    try:
+        return make_url(url).render_as_string(hide_password=True)
+    except ArgumentError:
+        return url.split(":")[0] + ":..."
@@ -1,35 +1,99 @@
-from io import StringIO
-from unittest.mock import Mock, call
+from collections.abc import Generator, Iterator
+from functools import partial
+from io import BytesIO
+from pathlib import Path
+from unittest.mock import ANY, Mock, call
 
 import pytest
 from pytest_mock import MockerFixture
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Connection
 from sqlalchemy.exc import SQLAlchemyError
 
-from dbupgrade.apply import apply_file, apply_files
+import dbupgrade.db
+from dbupgrade.apply import (
+    StatementCache,
+    apply_atomic,
+    apply_batch,
+    apply_file,
+    apply_files,
+    apply_group,
+    read_statements,
+)
+from dbupgrade.db import fetch_current_db_versions
 from dbupgrade.files import FileInfo
 
 
+@pytest.fixture
+def sqlite_conn(tmp_path: Path) -> Generator[Connection, None, None]:
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.sqlite'}")
+    with engine.connect() as conn:
+        fetch_current_db_versions(conn, "myschema")
+        yield conn
+    engine.dispose()
+
+
+def _scripts(*statements: str) -> list[FileInfo]:
+    """Return one script per statement, using the statement as file name."""
+    return [
+        FileInfo(stmt, "myschema", "sqlite", version, 0)
+        for version, stmt in enumerate(statements)
+    ]
+
+
+def _load(file_info: FileInfo) -> list[str]:
+    return [file_info.filename]
+
+
+def _failing_load(file_info: FileInfo) -> Iterator[str]:
+    """Like _load(), but fail splitting after statements containing BAD."""
+    yield file_info.filename
+    if "BAD" in file_info.filename:
+        raise ValueError("unexpected placeholder value in SQL string")
+
+
+def _fetch(conn: Connection, query: str) -> list[tuple[int, ...]]:
+    rows = conn.exec_driver_sql(query).fetchall()
+    conn.rollback()
+    return [tuple(row) for row in rows]
+
+
 class TestApplyFiles:
+    @pytest.fixture
+    def conn(self) -> Mock:
+        conn = Mock()
+        conn.dialect.name = "postgresql"
+        return conn
+
     @pytest.fixture(autouse=True)
     def apply(self, mocker: MockerFixture) -> Mock:
         return mocker.patch("dbupgrade.apply.apply_file")
 
-    def test_apply_none(self, apply: Mock) -> None:
-        result = apply_files("", [])
+    def test_apply_none(self, conn: Mock, apply: Mock) -> None:
+        result = apply_files(conn, [])
         assert result == ([], None)
         apply.assert_not_called()
 
-    def test_apply_multiple_success(self, apply: Mock) -> None:
+    def test_apply_multiple_success(self, conn: Mock, apply: Mock) -> None:
         f1 = FileInfo("foo.sql", "schema", "dialect", 123, 14)
         f2 = FileInfo("bar.sql", "schema", "dialect", 124, 15)
-        result = apply_files("invalid:///", [f1, f2])
+        result = apply_files(conn, [f1, f2])
         assert result == ([f1, f2], None)
         apply.assert_has_calls(
-            [call("invalid:///", f1), call("invalid:///", f2)]
+            [
+                call(conn, f1, None, execution="text", bulk_inserts=False),
+                call(conn, f2, None, execution="text", bulk_inserts=False),
+            ]
         )
 
-    def test_apply_multiple_fail(self, apply: Mock) -> None:
-        def apply_impl(url: str, file_info: FileInfo) -> None:
+    def test_apply_multiple_fail(self, conn: Mock, apply: Mock) -> None:
+        def apply_impl(
+            conn: Mock,
+            file_info: FileInfo,
+            load: None,
+            execution: str,
+            bulk_inserts: bool,
+        ) -> None:
             if file_info == f2:
                 raise SQLAlchemyError
 
@@ -37,17 +101,375 @@ class TestApplyFiles:
         f1 = FileInfo("foo.sql", "schema", "dialect", 123, 14)
         f2 = FileInfo("bar.sql", "schema", "dialect", 124, 15)
         f3 = FileInfo("not-called.sql", "schema", "dialect", 125, 15)
-        result = apply_files("invalid:///", [f1, f2, f3])
+        result = apply_files(conn, [f1, f2, f3])
         assert result == ([f1], f2)
         apply.assert_has_calls(
-            [call("invalid:///", f1), call("invalid:///", f2)]
+            [
+                call(conn, f1, None, execution="text", bulk_inserts=False),
+                call(conn, f2, None, execution="text", bulk_inserts=False),
+            ]
+        )
+
+    def test_apply_split_error(
+        self, mocker: MockerFixture, conn: Mock, apply: Mock
+    ) -> None:
+        logging = mocker.patch("dbupgrade.apply.logging")
+        error = UnicodeDecodeError("utf-8", b"\xff", 0, 1, "invalid byte")
+        apply.side_effect = [None, error]
+        f1 = FileInfo("foo.sql", "schema", "dialect", 123, 14)
+        f2 = FileInfo("bar.sql", "schema", "dialect", 124, 15)
+        f3 = FileInfo("not-called.sql", "schema", "dialect", 125, 15)
+        assert apply_files(conn, [f1, f2, f3]) == ([f1], f2)
+        logging.error.assert_called_once_with("bar.sql: " + str(error))
+
+    def test_pass_loader(self, conn: Mock, apply: Mock) -> None:
+        load = Mock()
+        f1 = FileInfo("foo.sql", "schema", "dialect", 123, 14)
+        apply_files(conn, [f1], load)
+        apply.assert_called_once_with(
+            conn, f1, load, execution="text", bulk_inserts=False
+        )
+
+    def test_group_size(
+        self, mocker: MockerFixture, conn: Mock, apply: Mock
+    ) -> None:
+        apply_group = mocker.patch(
+            "dbupgrade.apply.apply_group", return_value=([], None)
+        )
+        f1 = FileInfo("1.sql", "schema", "dialect", 1, 0)
+        f2 = FileInfo("2.sql", "schema", "dialect", 2, 0)
+        f3 = FileInfo("3.sql", "schema", "dialect", 3, 0)
+        f3.transaction = False
+        f4 = FileInfo("4.sql", "schema", "dialect", 4, 0)
+        f5 = FileInfo("5.sql", "schema", "dialect", 5, 0)
+        f6 = FileInfo("6.sql", "schema", "dialect", 6, 0)
+        f7 = FileInfo("7.sql", "schema", "dialect", 7, 0)
+        apply_files(conn, [f1, f2, f3, f4, f5, f6, f7], group_size=3)
+        assert apply_group.call_args_list == [
+            call(conn, [f1, f2], None, execution="text", bulk_inserts=False),
+            call(
+                conn, [f4, f5, f6], None, execution="text", bulk_inserts=False
+            ),
+        ]
+        assert [c.args[1] for c in apply.call_args_list] == [f3, f7]
+
+    @pytest.mark.parametrize("dialect", ["mysql", "mariadb", "oracle"])
+    def test_group_size__no_transactional_ddl(
+        self, mocker: MockerFixture, conn: Mock, apply: Mock, dialect: str
+    ) -> None:
+        logging = mocker.patch("dbupgrade.apply.logging")
+        apply_group = mocker.patch("dbupgrade.apply.apply_group")
+        conn.dialect.name = dialect
+        files = [
+            FileInfo(f"{i}.sql", "schema", "dialect", i, 0) for i in range(3)
+        ]
+        assert apply_files(conn, files, group_size=3) == (files, None)
+        apply_group.assert_not_called()
+        assert [c.args[1] for c in apply.call_args_list] == files
+        logging.warning.assert_called_once()
+
+    def test_version_batch_size(
+        self, mocker: MockerFixture, conn: Mock, apply: Mock
+    ) -> None:
+        apply_group = mocker.patch(
+            "dbupgrade.apply.apply_group", return_value=([], None)
+        )
+        apply_batch = mocker.patch(
+            "dbupgrade.apply.apply_batch", return_value=([], None)
+        )
+        files = [
+            FileInfo(f"{i}.sql", "schema", "dialect", i, 0) for i in range(6)
+        ]
+        for file_info in files[:2] + files[4:]:
+            file_info.transaction = False
+        apply_files(conn, files, group_size=2, version_batch_size=3)
+        assert apply_batch.call_args_list == [
+            call(conn, files[:2], None, execution="text", bulk_inserts=False),
+            call(conn, files[4:], None, execution="text", bulk_inserts=False),
+        ]
+        assert apply_group.call_args_list == [
+            call(conn, files[2:4], None, execution="text", bulk_inserts=False)
+        ]
+        apply.assert_not_called()
+
+    def test_group_failed(
+        self, mocker: MockerFixture, conn: Mock, apply: Mock
+    ) -> None:
+        f1 = FileInfo("1.sql", "schema", "dialect", 1, 0)
+        f2 = FileInfo("2.sql", "schema", "dialect", 2, 0)
+        f3 = FileInfo("3.sql", "schema", "dialect", 3, 0)
+        mocker.patch("dbupgrade.apply.apply_group", return_value=([f1], f2))
+        assert apply_files(conn, [f1, f2, f3], group_size=2) == ([f1], f2)
+        apply.assert_not_called()
+
+    def test_atomic(
+        self, mocker: MockerFixture, conn: Mock, apply: Mock
+    ) -> None:
+        f1 = FileInfo("1.sql", "schema", "dialect", 1, 0)
+        apply_atomic = mocker.patch(
+            "dbupgrade.apply.apply_atomic", return_value=([f1], None)
+        )
+        assert apply_files(conn, [f1], atomic=True) == ([f1], None)
+        apply_atomic.assert_called_once_with(
+            conn, [f1], None, execution="text", bulk_inserts=False
+        )
+        apply.assert_not_called()
+
+
+class TestApplyGroup:
+    @pytest.fixture(autouse=True)
+    def logging(self, mocker: MockerFixture) -> Mock:
+        return mocker.patch("dbupgrade.apply.logging")
+
+    def test_success(self, sqlite_conn: Connection) -> None:
+        files = _scripts(
+            "CREATE TABLE foo(x INT)",
+            "INSERT INTO foo VALUES(1)",
+            "INSERT INTO foo VALUES(2)",
+        )
+        assert apply_group(sqlite_conn, files, _load) == (files, None)
+        assert _fetch(sqlite_conn, "SELECT x FROM foo") == [(1,), (2,)]
+        assert _fetch(sqlite_conn, "SELECT version FROM db_config") == [(2,)]
+
+    def test_failure(self, sqlite_conn: Connection, logging: Mock) -> None:
+        files = _scripts(
+            "CREATE TABLE foo(x INT)",
+            "INSERT INTO foo VALUES(1)",
+            "INSERT INTO bar VALUES(2)",
+            "INSERT INTO foo VALUES(3)",
+        )
+        assert apply_group(sqlite_conn, files, _load) == (files[:2], files[2])
+        logging.error.assert_called_once()
+        assert _fetch(sqlite_conn, "SELECT x FROM foo") == [(1,)]
+        assert _fetch(sqlite_conn, "SELECT version FROM db_config") == [(1,)]
+
+    def test_split_error(self, sqlite_conn: Connection, logging: Mock) -> None:
+        files = _scripts(
+            "CREATE TABLE foo(x INT)",
+            "INSERT INTO foo VALUES(1) -- BAD",
+            "INSERT INTO foo VALUES(2)",
+        )
+        assert apply_group(sqlite_conn, files, _failing_load) == (
+            files[:1],
+            files[1],
+        )
+        logging.error.assert_called_once_with(
+            "INSERT INTO foo VALUES(1) -- BAD: "
+            "unexpected placeholder value in SQL string"
+        )
+        assert _fetch(sqlite_conn, "SELECT x FROM foo") == []
+        assert _fetch(sqlite_conn, "SELECT version FROM db_config") == [(0,)]
+
+    def test_no_transactional_ddl(self, logging: Mock) -> None:
+        conn = Mock()
+        conn.dialect.name = "mysql"
+        files = _scripts("CREATE TABLE foo(x INT)", "SELECT 1")
+        assert apply_group(conn, files, _load) == ([], files[0])
+        logging.error.assert_called_once()
+        conn.begin.assert_not_called()
+        conn.execute.assert_not_called()
+
+    def test_first_script_fails(self, sqlite_conn: Connection) -> None:
+        files = _scripts("INSERT INTO bar VALUES(1)", "SELECT 1")
+        assert apply_group(sqlite_conn, files, _load) == ([], files[0])
+        assert _fetch(sqlite_conn, "SELECT version FROM db_config") == [(-1,)]
+
+    def test_commit_fails(
+        self, mocker: MockerFixture, sqlite_conn: Connection
+    ) -> None:
+        files = _scripts("CREATE TABLE foo(x INT)", "SELECT 1")
+        mocker.patch(
+            "dbupgrade.apply.update_versions", side_effect=SQLAlchemyError()
+        )
+        assert apply_group(sqlite_conn, files, _load) == ([], files[0])
+        assert (
+            _fetch(
+                sqlite_conn,
+                "SELECT name FROM sqlite_master WHERE name = 'foo'",
+            )
+            == []
+        )
+
+
+class TestApplyBatch:
+    @pytest.fixture(autouse=True)
+    def logging(self, mocker: MockerFixture) -> Mock:
+        return mocker.patch("dbupgrade.apply.logging")
+
+    def _scripts(self, *statements: str) -> list[FileInfo]:
+        files = _scripts(*statements)
+        for file_info in files:
+            file_info.transaction = False
+        return files
+
+    def test_success(
+        self, mocker: MockerFixture, sqlite_conn: Connection
+    ) -> None:
+        # Only catches updates by update_sql(), not by apply_batch() itself.
+        update_versions = mocker.spy(dbupgrade.db, "update_versions")
+        files = self._scripts(
+            "CREATE TABLE foo(x INT)",
+            "INSERT INTO foo VALUES(1)",
+            "INSERT INTO foo VALUES(2)",
+        )
+        assert apply_batch(sqlite_conn, files, _load) == (files, None)
+        assert _fetch(sqlite_conn, "SELECT x FROM foo") == [(1,), (2,)]
+        assert _fetch(sqlite_conn, "SELECT version FROM db_config") == [(2,)]
+        update_versions.assert_not_called()
+
+    def test_failure(self, sqlite_conn: Connection, logging: Mock) -> None:
+        files = self._scripts(
+            "CREATE TABLE foo(x INT)",
+            "INSERT INTO foo VALUES(1)",
+            "INSERT INTO bar VALUES(2)",
+            "INSERT INTO foo VALUES(3)",
+        )
+        assert apply_batch(sqlite_conn, files, _load) == (files[:2], files[2])
+        logging.error.assert_called_once()
+        assert _fetch(sqlite_conn, "SELECT x FROM foo") == [(1,)]
+        assert _fetch(sqlite_conn, "SELECT version FROM db_config") == [(1,)]
+
+    def test_split_error(self, sqlite_conn: Connection, logging: Mock) -> None:
+        files = self._scripts(
+            "CREATE TABLE foo(x INT)",
+            "INSERT INTO foo VALUES(1) -- BAD",
+            "INSERT INTO foo VALUES(2)",
+        )
+        assert apply_batch(sqlite_conn, files, _failing_load) == (
+            files[:1],
+            files[1],
+        )
+        logging.error.assert_called_once()
+        assert _fetch(sqlite_conn, "SELECT x FROM foo") == [(1,)]
+        assert _fetch(sqlite_conn, "SELECT version FROM db_config") == [(0,)]
+
+    def test_exception(self, sqlite_conn: Connection) -> None:
+        files = self._scripts("CREATE TABLE foo(x INT)", "SELECT 1")
+
+        def load(file_info: FileInfo) -> list[str]:
+            if file_info is files[1]:
+                raise OSError()
+            return _load(file_info)
+
+        with pytest.raises(OSError):
+            apply_batch(sqlite_conn, files, load)
+        assert _fetch(sqlite_conn, "SELECT version FROM db_config") == [(0,)]
+
+    def test_record_fails(
+        self, mocker: MockerFixture, sqlite_conn: Connection, logging: Mock
+    ) -> None:
+        mocker.patch(
+            "dbupgrade.apply.update_versions", side_effect=SQLAlchemyError()
+        )
+        files = self._scripts("CREATE TABLE foo(x INT)", "SELECT 1")
+        assert apply_batch(sqlite_conn, files, _load) == (files, None)
+        assert _fetch(sqlite_conn, "SELECT count(*) FROM foo") == [(0,)]
+        assert _fetch(sqlite_conn, "SELECT version FROM db_config") == [(-1,)]
+        assert logging.error.call_args_list[-1] == call(
+            "myschema: version 1 was applied, but could not be recorded in "
+            "db_config, the recorded version is stale"
+        )
+
+    def test_record_fails_after_failure(
+        self, mocker: MockerFixture, sqlite_conn: Connection
+    ) -> None:
+        mocker.patch(
+            "dbupgrade.apply.update_versions", side_effect=SQLAlchemyError()
+        )
+        files = self._scripts(
+            "CREATE TABLE foo(x INT)",
+            "INSERT INTO bar VALUES(1)",
+            "SELECT 1",
+        )
+        assert apply_batch(sqlite_conn, files, _load) == (files[:1], files[1])
+
+
+class TestApplyAtomic:
+    @pytest.fixture(autouse=True)
+    def logging(self, mocker: MockerFixture) -> Mock:
+        return mocker.patch("dbupgrade.apply.logging")
+
+    def test_success(self, sqlite_conn: Connection) -> None:
+        files = _scripts(
+            "CREATE TABLE foo(x INT)",
+            "INSERT INTO foo VALUES(1)",
+            "INSERT INTO foo VALUES(2)",
+        )
+        assert apply_atomic(sqlite_conn, files, _load) == (files, None)
+        assert _fetch(sqlite_conn, "SELECT x FROM foo") == [(1,), (2,)]
+        assert _fetch(sqlite_conn, "SELECT version FROM db_config") == [(2,)]
+
+    def test_failure(self, sqlite_conn: Connection, logging: Mock) -> None:
+        files = _scripts(
+            "CREATE TABLE foo(x INT)",
+            "INSERT INTO foo VALUES(1)",
+            "INSERT INTO bar VALUES(2)",
+            "INSERT INTO foo VALUES(3)",
+        )
+        assert apply_atomic(sqlite_conn, files, _load) == ([], files[2])
+        logging.error.assert_called_once()
+        assert (
+            _fetch(
+                sqlite_conn,
+                "SELECT name FROM sqlite_master WHERE name = 'foo'",
+            )
+            == []
+        )
+        assert _fetch(sqlite_conn, "SELECT version FROM db_config") == [(-1,)]
+
+    def test_split_error(self, sqlite_conn: Connection, logging: Mock) -> None:
+        files = _scripts(
+            "CREATE TABLE foo(x INT)",
+            "INSERT INTO foo VALUES(1) -- BAD",
+            "INSERT INTO foo VALUES(2)",
+        )
+        assert apply_atomic(sqlite_conn, files, _failing_load) == (
+            [],
+            files[1],
+        )
+        logging.error.assert_called_once()
+        assert (
+            _fetch(
+                sqlite_conn,
+                "SELECT name FROM sqlite_master WHERE name = 'foo'",
+            )
+            == []
+        )
+
+    def test_no_files(self, sqlite_conn: Connection) -> None:
+        assert apply_atomic(sqlite_conn, [], _load) == ([], None)
+
+    def test_without_transaction(
+        self, sqlite_conn: Connection, logging: Mock
+    ) -> None:
+        files = _scripts("CREATE TABLE foo(x INT)", "SELECT 1")
+        files[1].transaction = False
+        load = Mock()
+        assert apply_atomic(sqlite_conn, files, load) == ([], files[1])
+        logging.error.assert_called_once_with(
+            "SELECT 1: atomic upgrades require transactions"
         )
+        load.assert_not_called()
+
+    def test_non_transactional_ddl(self, logging: Mock) -> None:
+        conn = Mock()
+        conn.dialect.name = "mysql"
+        files = _scripts("CREATE TABLE foo(x INT)")
+        assert apply_atomic(conn, files, _load) == ([], files[0])
+        logging.error.assert_called_once_with(
+            "atomic upgrades are not supported with mysql"
+        )
+        conn.begin.assert_not_called()
 
 
 class TestApplyFile:
+    @pytest.fixture
+    def conn(self) -> Mock:
+        return Mock()
+
     @pytest.fixture(autouse=True)
     def open(self, mocker: MockerFixture) -> Mock:
-        return mocker.patch("dbupgrade.apply.open")
+        return mocker.patch("dbupgrade.files.open")
 
     @pytest.fixture(autouse=True)
     def logging(self, mocker: MockerFixture) -> Mock:
@@ -57,31 +479,179 @@ class TestApplyFile:
     def update_sql(self, mocker: MockerFixture) -> Mock:
         return mocker.patch("dbupgrade.apply.update_sql")
 
-    def test_log(self, logging: Mock) -> None:
+    def test_log(self, conn: Mock, logging: Mock) -> None:
         info = FileInfo("/foo/bar", "myschema", "sqlite", 45, 3)
-        apply_file("sqlite:///", info)
+        apply_file(conn, info)
         logging.info.assert_called_once_with("applying #45 (API level 3)")
 
     def test_execute__with_transaction(
-        self, open: Mock, update_sql: Mock
+        self, conn: Mock, open: Mock, update_sql: Mock
     ) -> None:
-        open.return_value = StringIO("")
+        open.return_value = BytesIO(b"")
         info = FileInfo("/foo/bar", "myschema", "sqlite", 45, 3)
         info.transaction = True
-        apply_file("sqlite:///", info)
-        open.assert_called_once_with("/foo/bar", "r")
+        apply_file(conn, info)
         update_sql.assert_called_once_with(
-            "sqlite:///", "", "myschema", 45, 3, transaction=True
+            conn,
+            ANY,
+            "myschema",
+            45,
+            3,
+            transaction=True,
+            execution="text",
+            bulk_inserts=False,
+            bulk_data=None,
+            record_version=True,
         )
+        assert list(update_sql.call_args.args[1]) == []
+        open.assert_called_once_with("/foo/bar", "rb")
 
     def test_execute__without_transaction(
-        self, open: Mock, update_sql: Mock
+        self, conn: Mock, open: Mock, update_sql: Mock
     ) -> None:
-        open.return_value = StringIO("")
+        open.return_value = BytesIO(b"")
         info = FileInfo("/foo/bar", "myschema", "sqlite", 45, 3)
         info.transaction = False
-        apply_file("sqlite:///", info)
-        open.assert_called_once_with("/foo/bar", "r")
+        apply_file(conn, info)
         update_sql.assert_called_once_with(
-            "sqlite:///", "", "myschema", 45, 3, transaction=False
+            conn,
+            ANY,
+            "myschema",
+            45,
+            3,
+            transaction=False,
+            execution="text",
+            bulk_inserts=False,
+            bulk_data=None,
+            record_version=True,
         )
+        assert list(update_sql.call_args.args[1]) == []
+        open.assert_called_once_with("/foo/bar", "rb")
+
+    def test_execute__split(
+        self, conn: Mock, open: Mock, update_sql: Mock
+    ) -> None:
+        open.return_value = BytesIO(b"SELECT 1; SELECT 2;")
+        info = FileInfo("/foo/bar", "myschema", "sqlite", 45, 3)
+        apply_file(conn, info)
+        update_sql.assert_called_once_with(
+            conn,
+            ANY,
+            "myschema",
+            45,
+            3,
+            transaction=True,
+            execution="text",
+            bulk_inserts=False,
+            bulk_data=None,
+            record_version=True,
+        )
+        statements = update_sql.call_args.args[1]
+        assert list(statements) == ["SELECT 1", "SELECT 2"]
+
+    def test_execute__body_offset(
+        self, conn: Mock, open: Mock, update_sql: Mock
+    ) -> None:
+        open.return_value = BytesIO(b"-- Schema: myschema\nSELECT 1;")
+        info = FileInfo("/foo/bar", "myschema", "sqlite", 45, 3)
+        info.body_offset = 20
+        apply_file(conn, info)
+        statements = update_sql.call_args.args[1]
+        assert list(statements) == ["SELECT 1"]
+
+    def test_execute__splitter(
+        self, mocker: MockerFixture, conn: Mock, open: Mock, update_sql: Mock
+    ) -> None:
+        iter_sql = mocker.patch("dbupgrade.apply.iter_sql", return_value=[])
+        open.return_value = BytesIO(b"SELECT 1;")
+        info = FileInfo("/foo/bar", "myschema", "sqlite", 45, 3)
+        apply_file(conn, info, partial(read_statements, splitter="sqlparse"))
+        list(update_sql.call_args.args[1])
+        iter_sql.assert_called_once_with(ANY, splitter="sqlparse")
+
+    def test_execute__loader(
+        self, conn: Mock, open: Mock, update_sql: Mock
+    ) -> None:
+        load = Mock(return_value=["SELECT 1"])
+        info = FileInfo("/foo/bar", "myschema", "sqlite", 45, 3)
+        apply_file(conn, info, load)
+        open.assert_not_called()
+        load.assert_called_once_with(info)
+        update_sql.assert_called_once_with(
+            conn,
+            ["SELECT 1"],
+            "myschema",
+            45,
+            3,
+            transaction=True,
+            execution="text",
+            bulk_inserts=False,
+            bulk_data=None,
+            record_version=True,
+        )
+
+    def test_execute__execution(self, conn: Mock, update_sql: Mock) -> None:
+        load = Mock(return_value=[])
+        info = FileInfo("/foo/bar", "myschema", "sqlite", 45, 3)
+        apply_file(conn, info, load, execution="driver")
+        assert update_sql.call_args.kwargs["execution"] == "driver"
+
+    def test_execute__execution_header(
+        self, conn: Mock, update_sql: Mock
+    ) -> None:
+        load = Mock(return_value=[])
+        info = FileInfo("/foo/bar", "myschema", "sqlite", 45, 3)
+        info.execution = "text"
+        apply_file(conn, info, load, execution="driver")
+        assert update_sql.call_args.kwargs["execution"] == "text"
+
+    def test_execute__bulk_inserts(self, conn: Mock, update_sql: Mock) -> None:
+        load = Mock(return_value=[])
+        info = FileInfo("/foo/bar", "myschema", "sqlite", 45, 3)
+        apply_file(conn, info, load, bulk_inserts=True)
+        assert update_sql.call_args.kwargs["bulk_inserts"] is True
+
+    def test_execute__bulk_load(
+        self, conn: Mock, open: Mock, update_sql: Mock
+    ) -> None:
+        load = Mock(return_value=[])
+        info = FileInfo("/foo/bar.sql", "myschema", "postgresql", 45, 3)
+        info.bulk_load = "copy"
+        apply_file(conn, info, load)
+        bulk_data = update_sql.call_args.kwargs["bulk_data"]
+        bulk_data()
+        open.assert_called_once_with("/foo/bar.csv", "rb")
+
+
+class TestStatementCache:
+    def test_load_once(self) -> None:
+        load = Mock(return_value=iter(["SELECT 1"]))
+        cache = StatementCache(load)
+        info = FileInfo("/foo/bar", "myschema", "sqlite", 45, 3)
+        assert cache(info) == ["SELECT 1"]
+        assert cache(info) == ["SELECT 1"]
+        load.assert_called_once_with(info)
+
+    def test_key_by_filename(self) -> None:
+        load = Mock(side_effect=lambda fi: [fi.filename])
+        cache = StatementCache(load)
+        f1 = FileInfo("/foo/bar", "myschema", "sqlite", 45, 3)
+        f2 = FileInfo("/foo/baz", "myschema", "sqlite", 46, 3)
+        assert cache(f1) == ["/foo/bar"]
+        assert cache(f2) == ["/foo/baz"]
+
+    def test_max_scripts(self) -> None:
+        load = Mock(side_effect=lambda fi: [fi.filename])
+        cache = StatementCache(load, max_scripts=2)
+        f1 = FileInfo("/foo/1", "myschema", "sqlite", 1, 3)
+        f2 = FileInfo("/foo/2", "myschema", "sqlite", 2, 3)
+        f3 = FileInfo("/foo/3", "myschema", "sqlite", 3, 3)
+        cache(f1)
+        cache(f2)
+        cache(f1)
+        cache(f3)
+        assert load.call_count == 3
+        cache(f1)
+        assert load.call_count == 3
+        assert cache(f2) == ["/foo/2"]
+        assert load.call_count == 4
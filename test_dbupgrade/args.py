@@ -3,7 +3,8 @@ from io import StringIO
 
 import pytest
 
-from dbupgrade.args import parse_args
+from dbupgrade.args import parse_args, parse_bundle_args
+from dbupgrade.files import DEFAULT_FILENAME_PATTERN
 
 _DEFAULT_ARGS = ["script", "schema", "url", "dir"]
 
@@ -18,7 +19,8 @@ class TestParseArgs:
 
     def test_no_options(self) -> None:
         args = parse_args(_DEFAULT_ARGS)
-        assert args.schema == "schema"
+        assert args.schemas == ["schema"]
+        assert not args.all_schemas
         assert args.db_url == "url"
         assert args.script_path == "dir"
         assert args.api_level is None
@@ -26,12 +28,67 @@ class TestParseArgs:
         assert not args.ignore_api_level
         assert not args.quiet
         assert not args.json
+        assert not args.lock
+        assert args.cache_dir is None
+        assert args.parse_jobs == 1
+        assert args.filename_versions is None
+        assert args.splitter == "native"
+
+    def test_schema_named_bundle(self) -> None:
+        args = parse_args(["script", "bundle", "url", "dir"])
+        assert args.schemas == ["bundle"]
+        assert args.db_url == "url"
+        assert args.script_path == "dir"
 
     def test_simple_options(self) -> None:
         args = parse_args(_DEFAULT_ARGS + ["-q", "--json"])
         assert args.quiet
         assert args.json
 
+    def test_lock(self) -> None:
+        args = parse_args(_DEFAULT_ARGS + ["--lock"])
+        assert args.lock
+
+    def test_cache_dir(self) -> None:
+        args = parse_args(_DEFAULT_ARGS + ["--cache-dir", "/var/cache"])
+        assert args.cache_dir == "/var/cache"
+
+    def test_parse_jobs(self) -> None:
+        args = parse_args(_DEFAULT_ARGS + ["--parse-jobs", "8"])
+        assert args.parse_jobs == 8
+
+    def test_parse_jobs__invalid(self) -> None:
+        with pytest.raises(SystemExit):
+            with redirect_stderr(StringIO()):
+                parse_args(_DEFAULT_ARGS + ["--parse-jobs", "0"])
+
+    def test_filename_versions(self) -> None:
+        args = parse_args(_DEFAULT_ARGS + ["--filename-versions"])
+        assert args.filename_versions == DEFAULT_FILENAME_PATTERN
+
+    def test_filename_versions__pattern(self) -> None:
+        args = parse_args(_DEFAULT_ARGS + [r"--filename-versions=v(\d+)_"])
+        assert args.filename_versions == r"v(\d+)_"
+
+    def test_filename_versions__invalid(self) -> None:
+        with pytest.raises(SystemExit):
+            with redirect_stderr(StringIO()):
+                parse_args(_DEFAULT_ARGS + ["--filename-versions=("])
+
+    def test_filename_versions__no_group(self) -> None:
+        with pytest.raises(SystemExit):
+            with redirect_stderr(StringIO()):
+                parse_args(_DEFAULT_ARGS + [r"--filename-versions=\d+"])
+
+    def test_splitter(self) -> None:
+        args = parse_args(_DEFAULT_ARGS + ["--splitter", "sqlparse"])
+        assert args.splitter == "sqlparse"
+
+    def test_splitter__invalid(self) -> None:
+        with pytest.raises(SystemExit):
+            with redirect_stderr(StringIO()):
+                parse_args(_DEFAULT_ARGS + ["--splitter", "foo"])
+
     def test_small_l_option(self) -> None:
         args = parse_args(["script", "-l", "44", "schema", "url", "dir"])
         assert not args.ignore_api_level
@@ -67,3 +124,172 @@ class TestParseArgs:
         with pytest.raises(SystemExit):
             with redirect_stderr(StringIO()):
                 parse_args(["script", "-m", "INVALID", "schema", "url", "dir"])
+
+    def test_url_file(self) -> None:
+        args = parse_args(["script", "--url-file", "schema", "urls", "dir"])
+        assert args.url_file
+        assert args.db_url == "urls"
+        assert args.jobs == 4
+
+    def test_jobs(self) -> None:
+        args = parse_args(["script", "-j", "16", "schema", "url", "dir"])
+        assert args.jobs == 16
+
+    def test_jobs__invalid(self) -> None:
+        with pytest.raises(SystemExit):
+            with redirect_stderr(StringIO()):
+                parse_args(["script", "-j", "0", "schema", "url", "dir"])
+
+    def test_multiple_schemas(self) -> None:
+        args = parse_args(["script", "schema1", "schema2", "url", "dir"])
+        assert args.schemas == ["schema1", "schema2"]
+        assert args.db_url == "url"
+        assert args.script_path == "dir"
+
+    def test_all_schemas(self) -> None:
+        args = parse_args(["script", "-A", "url", "dir"])
+        assert args.schemas == []
+        assert args.all_schemas
+        assert args.db_url == "url"
+        assert args.script_path == "dir"
+
+    def test_all_schemas__with_schema(self) -> None:
+        with pytest.raises(SystemExit):
+            with redirect_stderr(StringIO()):
+                parse_args(["script", "-A", "schema", "url", "dir"])
+
+    def test_no_schema(self) -> None:
+        with pytest.raises(SystemExit):
+            with redirect_stderr(StringIO()):
+                parse_args(["script", "url", "dir"])
+
+    def test_url_file__multiple_schemas(self) -> None:
+        with pytest.raises(SystemExit):
+            with redirect_stderr(StringIO()):
+                parse_args(["script", "--url-file", "s1", "s2", "url", "dir"])
+
+    def test_discovery_defaults(self) -> None:
+        args = parse_args(_DEFAULT_ARGS)
+        assert not args.recursive
+        assert args.include == ()
+        assert args.exclude == ()
+
+    def test_discovery(self) -> None:
+        args = parse_args(
+            [
+                "script",
+                "-r",
+                "--include",
+                "users/*",
+                "--include",
+                "orders/*",
+                "--exclude",
+                "*.tmp.sql",
+                "schema",
+                "url",
+                "dir",
+            ]
+        )
+        assert args.recursive
+        assert args.include == ("users/*", "orders/*")
+        assert args.exclude == ("*.tmp.sql",)
+
+    def test_execution(self) -> None:
+        assert parse_args(_DEFAULT_ARGS).execution == "text"
+        args = parse_args(
+            ["script", "--execution", "driver", "schema", "url", "dir"]
+        )
+        assert args.execution == "driver"
+
+    def test_execution__invalid(self) -> None:
+        with pytest.raises(SystemExit):
+            with redirect_stderr(StringIO()):
+                parse_args(
+                    ["script", "--execution", "raw", "schema", "url", "dir"]
+                )
+
+    def test_bulk_inserts(self) -> None:
+        assert not parse_args(_DEFAULT_ARGS).bulk_inserts
+        args = parse_args(["script", "--bulk-inserts", "schema", "url", "dir"])
+        assert args.bulk_inserts
+
+    def test_group_size(self) -> None:
+        assert parse_args(_DEFAULT_ARGS).group_size == 1
+        args = parse_args(
+            ["script", "--group-size", "50", "schema", "url", "dir"]
+        )
+        assert args.group_size == 50
+
+    def test_group_size__invalid(self) -> None:
+        with pytest.raises(SystemExit):
+            with redirect_stderr(StringIO()):
+                parse_args(
+                    ["script", "--group-size", "0", "schema", "url", "dir"]
+                )
+
+    def test_version_batch_size(self) -> None:
+        assert parse_args(_DEFAULT_ARGS).version_batch_size == 1
+        args = parse_args(
+            ["script", "--version-batch-size", "10", "schema", "url", "dir"]
+        )
+        assert args.version_batch_size == 10
+
+    def test_atomic(self) -> None:
+        assert not parse_args(_DEFAULT_ARGS).atomic
+        args = parse_args(["script", "--atomic", "schema", "url", "dir"])
+        assert args.atomic
+
+    def test_atomic__group_size(self) -> None:
+        with pytest.raises(SystemExit):
+            with redirect_stderr(StringIO()):
+                parse_args(
+                    [
+                        "script",
+                        "--atomic",
+                        "--group-size",
+                        "2",
+                        "schema",
+                        "url",
+                        "dir",
+                    ]
+                )
+
+
+class TestParseBundleArgs:
+    def test_no_options(self) -> None:
+        args = parse_bundle_args(["script", "dir", "out"])
+        assert args.script_path == "dir"
+        assert args.bundle_file == "out"
+        assert not args.quiet
+        assert args.parse_jobs == 1
+        assert args.splitter == "native"
+
+    def test_options(self) -> None:
+        args = parse_bundle_args(
+            [
+                "script",
+                "-q",
+                "--parse-jobs",
+                "4",
+                "--splitter",
+                "sqlparse",
+                "dir",
+                "out",
+            ]
+        )
+        assert args.quiet
+        assert args.parse_jobs == 4
+        assert args.splitter == "sqlparse"
+
+    def test_discovery(self) -> None:
+        args = parse_bundle_args(
+            ["script", "-r", "--exclude", "old", "dir", "out"]
+        )
+        assert args.recursive
+        assert args.include == ()
+        assert args.exclude == ("old",)
+
+    def test_missing_bundle_file(self) -> None:
+        with pytest.raises(SystemExit):
+            with redirect_stderr(StringIO()):
+                parse_bundle_args(["script", "dir"])
@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+from io import BytesIO
+from unittest.mock import MagicMock, Mock, call
+
+import pytest
+from sqlalchemy.exc import DBAPIError, InvalidRequestError
+
+from dbupgrade.bulk import (
+    InsertRun,
+    copy_from_stdin,
+    execute_insert_run,
+    group_inserts,
+    is_copy_from_stdin,
+    parse_insert,
+)
+
+
+class TestParseInsert:
+    def test_values(self) -> None:
+        assert parse_insert(
+            "INSERT INTO foo (a, b, c, d) VALUES (1, 'x''y', NULL, true)"
+        ) == ("INSERT INTO foo (a, b, c, d) VALUES", (1, "x'y", None, True))
+
+    def test_without_columns(self) -> None:
+        assert parse_insert("insert into foo values(-1,'a')") == (
+            "insert into foo values",
+            (-1, "a"),
+        )
+
+    def test_normalize_whitespace(self) -> None:
+        assert parse_insert("INSERT  INTO\n  foo\n  VALUES (1)") == (
+            "INSERT INTO foo VALUES",
+            (1,),
+        )
+
+    def test_quoted_identifiers(self) -> None:
+        assert parse_insert('INSERT INTO "my schema"."foo" ("a") VALUES (1)')
+        assert parse_insert("INSERT INTO `foo` (`a`) VALUES (1)")
+
+    @pytest.mark.parametrize(
+        "statement",
+        [
+            "SELECT 1",
+            "INSERT INTO foo VALUES (1), (2)",
+            "INSERT INTO foo VALUES (1.5)",
+            "INSERT INTO foo VALUES (1e3)",
+            "INSERT INTO foo VALUES (99999999999999999999)",
+            "INSERT INTO foo VALUES ('a\\'b')",
+            "INSERT INTO foo VALUES (now())",
+            "INSERT INTO foo VALUES ('1'::int)",
+            "INSERT INTO foo VALUES (1,)",
+            "INSERT INTO foo VALUES ()",
+            "INSERT INTO foo SELECT * FROM bar",
+            "INSERT INTO foo VALUES (1) RETURNING id",
+            "INSERT INTO foo VALUES (1) ON CONFLICT DO NOTHING",
+        ],
+    )
+    def test_not_supported(self, statement: str) -> None:
+        assert parse_insert(statement) is None
+
+
+class TestGroupInserts:
+    def test_group(self) -> None:
+        items = list(
+            group_inserts(
+                [
+                    "CREATE TABLE foo (a INT)",
+                    "INSERT INTO foo VALUES (1)",
+                    "INSERT INTO foo VALUES (2)",
+                    "INSERT INTO bar VALUES (3)",
+                    "INSERT INTO bar VALUES (4)",
+                    "SELECT 1",
+                ]
+            )
+        )
+        assert items == [
+            "CREATE TABLE foo (a INT)",
+            InsertRun("INSERT INTO foo VALUES", [(1,), (2,)]),
+            InsertRun("INSERT INTO bar VALUES", [(3,), (4,)]),
+            "SELECT 1",
+        ]
+
+    def test_single_insert_unchanged(self) -> None:
+        statements = [
+            "INSERT INTO foo VALUES (1)",
+            "INSERT INTO bar VALUES (2)",
+            "INSERT INTO foo VALUES (1, 2)",
+        ]
+        assert list(group_inserts(statements)) == statements
+
+    def test_max_rows(self) -> None:
+        statements = [f"INSERT INTO foo VALUES ({i})" for i in range(5)]
+        assert list(group_inserts(statements, max_rows=2)) == [
+            InsertRun("INSERT INTO foo VALUES", [(0,), (1,)]),
+            InsertRun("INSERT INTO foo VALUES", [(2,), (3,)]),
+            "INSERT INTO foo VALUES (4)",
+        ]
+
+
+class TestExecuteInsertRun:
+    @pytest.mark.parametrize(
+        "paramstyle, sql",
+        [
+            ("qmark", "INSERT INTO foo VALUES (?, ?)"),
+            ("format", "INSERT INTO foo VALUES (%s, %s)"),
+            ("pyformat", "INSERT INTO foo VALUES (%s, %s)"),
+            ("numeric", "INSERT INTO foo VALUES (:1, :2)"),
+            ("numeric_dollar", "INSERT INTO foo VALUES ($1, $2)"),
+        ],
+    )
+    def test_positional(self, paramstyle: str, sql: str) -> None:
+        conn = Mock()
+        conn.dialect.paramstyle = paramstyle
+        run = InsertRun("INSERT INTO foo VALUES", [(1, "a"), (2, "b")])
+        execute_insert_run(conn, run)
+        conn.exec_driver_sql.assert_called_once_with(sql, [(1, "a"), (2, "b")])
+
+    def test_named(self) -> None:
+        conn = Mock()
+        conn.dialect.paramstyle = "named"
+        run = InsertRun("INSERT INTO foo VALUES", [(1, "a"), (2, "b")])
+        execute_insert_run(conn, run)
+        conn.exec_driver_sql.assert_called_once_with(
+            "INSERT INTO foo VALUES (:p1, :p2)",
+            [{"p1": 1, "p2": "a"}, {"p1": 2, "p2": "b"}],
+        )
+
+    def test_escape_percent(self) -> None:
+        conn = Mock()
+        conn.dialect.paramstyle = "pyformat"
+        run = InsertRun('INSERT INTO "100%" VALUES', [(1,), (2,)])
+        execute_insert_run(conn, run)
+        assert conn.exec_driver_sql.call_args.args[0] == (
+            'INSERT INTO "100%%" VALUES (%s)'
+        )
+
+
+class TestIsCopyFromStdin:
+    def test_copy(self) -> None:
+        assert is_copy_from_stdin("COPY foo (a, b) FROM STDIN WITH CSV")
+        assert is_copy_from_stdin("-- load\ncopy foo from stdin")
+
+    def test_not_copy(self) -> None:
+        assert not is_copy_from_stdin("COPY foo FROM '/tmp/foo.csv'")
+        assert not is_copy_from_stdin("COPY foo TO STDOUT")
+        assert not is_copy_from_stdin("SELECT 'COPY foo FROM STDIN'")
+
+
+class TestCopyFromStdin:
+    @pytest.fixture
+    def conn(self) -> Mock:
+        conn = MagicMock()
+        conn.dialect.name = "postgresql"
+        conn.dialect.driver = "psycopg2"
+        return conn
+
+    def test_psycopg2(self, conn: Mock) -> None:
+        data = BytesIO(b"1,a\n")
+        copy_from_stdin(conn, "COPY foo FROM STDIN", data)
+        cursor = conn.connection.cursor.return_value
+        cursor.copy_expert.assert_called_once_with(
+            "COPY foo FROM STDIN", data, size=64 * 1024
+        )
+        cursor.close.assert_called_once_with()
+
+    def test_psycopg(self, conn: Mock) -> None:
+        conn.dialect.driver = "psycopg"
+        copy_from_stdin(conn, "COPY foo FROM STDIN", BytesIO(b"1,a\n"))
+        cursor = conn.connection.cursor.return_value
+        cursor.copy.assert_called_once_with("COPY foo FROM STDIN")
+        copy = cursor.copy.return_value.__enter__.return_value
+        assert copy.write.call_args_list == [call(b"1,a\n")]
+
+    def test_pg8000(self, conn: Mock) -> None:
+        conn.dialect.driver = "pg8000"
+        data = BytesIO(b"1,a\n")
+        copy_from_stdin(conn, "COPY foo FROM STDIN", data)
+        cursor = conn.connection.cursor.return_value
+        cursor.execute.assert_called_once_with(
+            "COPY foo FROM STDIN", stream=data
+        )
+
+    def test_error(self, conn: Mock) -> None:
+        class Error(Exception):
+            pass
+
+        conn.dialect.loaded_dbapi.Error = Error
+        cursor = conn.connection.cursor.return_value
+        cursor.copy_expert.side_effect = Error("invalid input")
+        with pytest.raises(DBAPIError) as exc_info:
+            copy_from_stdin(conn, "COPY foo FROM STDIN", BytesIO())
+        assert exc_info.value.statement == "COPY foo FROM STDIN"
+        cursor.close.assert_called_once_with()
+
+    def test_unsupported_driver(self, conn: Mock) -> None:
+        conn.dialect.driver = "asyncpg"
+        with pytest.raises(InvalidRequestError):
+            copy_from_stdin(conn, "COPY foo FROM STDIN", BytesIO())
+        conn.connection.cursor.assert_not_called()
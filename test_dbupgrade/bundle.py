@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import os
+import stat
+from pathlib import Path
+
+import pytest
+from pytest_mock import MockerFixture
+
+import dbupgrade.bundle
+from dbupgrade.bundle import (
+    BundleError,
+    is_bundle,
+    read_bundle,
+    read_bundled_statements,
+    write_bundle,
+)
+from dbupgrade.files import FileInfo
+
+
+def _write_script(
+    path: Path, schema: str, version: int, sql: str, transaction: str = "yes"
+) -> None:
+    path.write_text(
+        f"-- Schema: {schema}\n"
+        "-- Dialect: sqlite\n"
+        f"-- Version: {version}\n"
+        "-- API-Level: 0\n"
+        f"-- Transaction: {transaction}\n"
+        "\n" + sql
+    )
+
+
+class TestBundle:
+    @pytest.fixture
+    def script_path(self, tmp_path: Path) -> str:
+        scripts = tmp_path / "scripts"
+        scripts.mkdir()
+        _write_script(scripts / "b-1.sql", "b", 1, "SELECT 'b;1';\n")
+        _write_script(scripts / "a-1.sql", "a", 1, "SELECT 1;\nSELECT 2;\n")
+        _write_script(scripts / "a-0.sql", "a", 0, "", transaction="no")
+        (scripts / "invalid.sql").write_text("-- Schema: a\n")
+        return str(scripts)
+
+    @pytest.fixture
+    def bundle_file(self, tmp_path: Path, script_path: str) -> str:
+        bundle_file = str(tmp_path / "scripts.bundle")
+        write_bundle(script_path, bundle_file)
+        return bundle_file
+
+    def test_write(self, tmp_path: Path, script_path: str) -> None:
+        bundle_file = str(tmp_path / "scripts.bundle")
+        files = write_bundle(script_path, bundle_file)
+        assert [(f.schema, f.version) for f in files] == [
+            ("a", 0),
+            ("a", 1),
+            ("b", 1),
+        ]
+        assert sorted(os.listdir(tmp_path)) == ["scripts", "scripts.bundle"]
+
+    def test_write__mode(self, tmp_path: Path, script_path: str) -> None:
+        bundle_file = tmp_path / "scripts.bundle"
+        umask = os.umask(0o027)
+        try:
+            write_bundle(script_path, str(bundle_file))
+        finally:
+            os.umask(umask)
+        assert stat.S_IMODE(bundle_file.stat().st_mode) == 0o640
+
+    def test_write__recursive(self, tmp_path: Path) -> None:
+        scripts = tmp_path / "scripts"
+        for schema in ["a", "b"]:
+            (scripts / schema).mkdir(parents=True)
+            _write_script(scripts / schema / "0001.sql", schema, 1, "")
+        bundle_file = str(tmp_path / "scripts.bundle")
+        write_bundle(str(scripts), bundle_file, recursive=True)
+        assert [f.filename for f in read_bundle(bundle_file)] == [
+            os.path.join(bundle_file, "a/0001.sql"),
+            os.path.join(bundle_file, "b/0001.sql"),
+        ]
+
+    def test_write__error(
+        self, mocker: MockerFixture, tmp_path: Path, script_path: str
+    ) -> None:
+        mocker.patch("dbupgrade.bundle.read_statements", side_effect=OSError())
+        with pytest.raises(OSError):
+            write_bundle(script_path, str(tmp_path / "scripts.bundle"))
+        assert os.listdir(tmp_path) == ["scripts"]
+
+    def test_is_bundle(self, script_path: str, bundle_file: str) -> None:
+        assert is_bundle(bundle_file)
+        assert not is_bundle(script_path)
+        assert not is_bundle(os.path.join(script_path, "a-0.sql"))
+        assert not is_bundle(os.path.join(script_path, "missing"))
+
+    def test_read(self, bundle_file: str) -> None:
+        files = read_bundle(bundle_file)
+        assert [
+            (f.filename, f.schema, f.dialect, f.version, f.transaction)
+            for f in files
+        ] == [
+            (os.path.join(bundle_file, "a-0.sql"), "a", "sqlite", 0, False),
+            (os.path.join(bundle_file, "a-1.sql"), "a", "sqlite", 1, True),
+            (os.path.join(bundle_file, "b-1.sql"), "b", "sqlite", 1, True),
+        ]
+
+    def test_read_statements(self, bundle_file: str) -> None:
+        files = read_bundle(bundle_file)
+        assert [list(read_bundled_statements(f)) for f in files] == [
+            [],
+            ["SELECT 1", "SELECT 2"],
+            ["SELECT 'b;1'"],
+        ]
+
+    def test_mapping_closed(
+        self, mocker: MockerFixture, bundle_file: str
+    ) -> None:
+        map_bundle = mocker.spy(dbupgrade.bundle, "_map_bundle")
+        files = read_bundle(bundle_file)
+        for f in files:
+            list(read_bundled_statements(f))
+        assert map_bundle.call_count == 3
+        assert all(m.closed for m in map_bundle.spy_return_list)
+
+    def test_read_statements__not_bundled(self) -> None:
+        file_info = FileInfo("foo.sql", "a", "sqlite", 0, 0)
+        with pytest.raises(TypeError):
+            list(read_bundled_statements(file_info))
+
+    def test_read_does_not_split(
+        self, mocker: MockerFixture, bundle_file: str
+    ) -> None:
+        read_statements = mocker.spy(dbupgrade.bundle, "read_statements")
+        for f in read_bundle(bundle_file):
+            list(read_bundled_statements(f))
+        read_statements.assert_not_called()
+
+    def test_bulk_data(self, tmp_path: Path) -> None:
+        scripts = tmp_path / "scripts"
+        scripts.mkdir()
+        (scripts / "a-1.sql").write_text(
+            "-- Schema: a\n"
+            "-- Dialect: postgresql\n"
+            "-- Version: 1\n"
+            "-- API-Level: 0\n"
+            "-- Bulk-Load: copy\n"
+            "\n"
+            "COPY foo FROM STDIN WITH (FORMAT csv);\n"
+        )
+        (scripts / "a-1.csv").write_bytes(b"1,a\n2,b\n")
+        bundle_file = str(tmp_path / "scripts.bundle")
+        write_bundle(str(scripts), bundle_file)
+        (info,) = read_bundle(bundle_file)
+        assert info.bulk_load == "copy"
+        assert list(read_bundled_statements(info)) == [
+            "COPY foo FROM STDIN WITH (FORMAT csv)"
+        ]
+        with info.open_bulk_data() as stream:
+            assert stream.read() == b"1,a\n2,b\n"
+
+    def test_read__not_a_bundle(self, tmp_path: Path) -> None:
+        path = tmp_path / "foo"
+        path.write_text("foo")
+        with pytest.raises(BundleError):
+            read_bundle(str(path))
+
+    def test_read__empty(self, tmp_path: Path) -> None:
+        path = tmp_path / "foo"
+        path.write_text("")
+        with pytest.raises(BundleError):
+            read_bundle(str(path))
+
+    def test_read__wrong_version(
+        self, mocker: MockerFixture, bundle_file: str
+    ) -> None:
+        mocker.patch("dbupgrade.bundle.BUNDLE_VERSION", 999)
+        with pytest.raises(BundleError):
+            read_bundle(bundle_file)
@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+from unittest.mock import Mock, call
+
+import pytest
+from pytest_mock import MockerFixture
+
+from dbupgrade.catalog import ScriptCatalog
+from dbupgrade.files import FileInfo
+from dbupgrade.filter import Filter
+from dbupgrade.version import VersionMatcher
+
+
+def _info(
+    version: int,
+    api_level: int = 0,
+    schema: str = "myschema",
+    dialect: str = "postgresql",
+) -> FileInfo:
+    return FileInfo(
+        "{}-{}.sql".format(schema, version),
+        schema,
+        dialect,
+        version,
+        api_level,
+    )
+
+
+class TestScriptCatalog:
+    @pytest.fixture(autouse=True)
+    def logging(self, mocker: MockerFixture) -> Mock:
+        return mocker.patch("dbupgrade.catalog.logging")
+
+    def test_schemas(self) -> None:
+        catalog = ScriptCatalog(
+            [
+                _info(1, schema="schema2"),
+                _info(1, schema="schema1"),
+                _info(2, schema="schema1"),
+                _info(1, schema="schema3", dialect="sqlite"),
+            ]
+        )
+        assert catalog.schemas("postgresql") == ["schema1", "schema2"]
+        assert catalog.schemas("sqlite") == ["schema3"]
+        assert catalog.schemas("mysql") == []
+
+    def test_scripts__sorted(self) -> None:
+        fi3, fi1, fi2 = _info(3), _info(1), _info(2)
+        catalog = ScriptCatalog([fi3, fi1, fi2])
+        assert catalog.scripts("myschema", "postgresql", 0) == [fi1, fi2, fi3]
+
+    def test_scripts__version_range(self) -> None:
+        files = [_info(v) for v in range(1, 8)]
+        catalog = ScriptCatalog(files)
+        assert catalog.scripts("myschema", "postgresql", 3, 5) == files[2:5]
+        assert catalog.scripts("myschema", "postgresql", 8) == []
+        assert catalog.scripts("myschema", "postgresql", 0, 0) == []
+
+    def test_scripts__api_level(self) -> None:
+        fi1, fi2, fi3 = _info(1, 2), _info(2, 4), _info(3, 3)
+        catalog = ScriptCatalog([fi1, fi2, fi3])
+        assert catalog.scripts("myschema", "postgresql", 1, api_level=3) == [
+            fi1,
+            fi3,
+        ]
+
+    def test_scripts__schema_and_dialect(self) -> None:
+        fi = _info(1)
+        catalog = ScriptCatalog(
+            [
+                fi,
+                _info(1, schema="otherschema"),
+                _info(1, dialect="sqlite"),
+            ]
+        )
+        assert catalog.scripts("myschema", "postgresql", 1) == [fi]
+        assert catalog.scripts("unknown", "postgresql", 1) == []
+
+    def test_select(self) -> None:
+        files = [_info(1, 0), _info(2, 1), _info(3, 5), _info(4, 1)]
+        catalog = ScriptCatalog(files)
+        filter_ = Filter("myschema", "postgresql", VersionMatcher(2, 10, 3))
+        assert catalog.select(filter_) == [files[1], files[3]]
+
+    def test_gaps(self) -> None:
+        catalog = ScriptCatalog([_info(v) for v in [1, 2, 4, 8, 9]])
+        assert catalog.gaps("myschema", "postgresql") == [(3, 3), (5, 7)]
+        assert catalog.gaps("unknown", "postgresql") == []
+
+    def test_duplicates(self) -> None:
+        catalog = ScriptCatalog([_info(v) for v in [1, 2, 2, 2, 3, 3]])
+        assert catalog.duplicates("myschema", "postgresql") == [2, 3]
+        assert catalog.duplicates("unknown", "postgresql") == []
+
+    def test_log_gaps(self, logging: Mock) -> None:
+        catalog = ScriptCatalog([_info(v) for v in [1, 3, 4, 8]])
+        catalog.scripts("myschema", "postgresql", 1)
+        assert logging.warning.call_args_list == [
+            call("myschema (postgresql): no scripts for version 2"),
+            call("myschema (postgresql): no scripts for versions 5-7"),
+        ]
+
+    def test_log_duplicates(self, logging: Mock) -> None:
+        catalog = ScriptCatalog([_info(v) for v in [1, 2, 2]])
+        catalog.scripts("myschema", "postgresql", 1)
+        logging.warning.assert_called_once_with(
+            "myschema (postgresql): several scripts for version 2"
+        )
+
+    def test_log_only_selected_range(self, logging: Mock) -> None:
+        catalog = ScriptCatalog([_info(v) for v in [1, 1, 3, 4, 5, 7]])
+        catalog.scripts("myschema", "postgresql", 3, 5)
+        logging.warning.assert_not_called()
@@ -4,16 +4,21 @@ import sqlite3
 from collections.abc import Generator, Iterable
 from tempfile import NamedTemporaryFile
 from typing import Any, cast
-from unittest.mock import MagicMock, Mock, _Call, call
+from unittest.mock import ANY, MagicMock, Mock, _Call, call
 
 import pytest
 from pytest_mock import MockerFixture
+from sqlalchemy import create_engine as sa_create_engine, event
+from sqlalchemy.exc import DBAPIError, InvalidRequestError
 from sqlalchemy.sql.elements import TextClause
 
 from dbupgrade.db import (
+    BATCH_SIZE,
     SQL_CREATE_DB_CONFIG,
     SQL_UPDATE_VERSIONS,
+    connect,
     fetch_current_db_versions,
+    fetch_current_db_versions_many,
     update_sql,
 )
 
@@ -70,32 +75,92 @@ def test_db() -> Generator[DBFixture, None, None]:
         yield DBFixture(f.name)
 
 
-class TestFetchCurrentDBVersions:
+class TestConnect:
     @pytest.fixture
     def create_engine(self, mocker: MockerFixture) -> Mock:
-        engine = MagicMock()
-        engine.dialect.name = "sqlite"
-        return mocker.patch("dbupgrade.db.create_engine", return_value=engine)
+        return mocker.patch("dbupgrade.db.create_engine")
+
+    @pytest.fixture
+    def engine(self, create_engine: Mock) -> Mock:
+        return cast(Mock, create_engine.return_value)
+
+    def test_yield_connection(self, engine: Mock) -> None:
+        with connect("sqlite:///") as conn:
+            assert conn is engine.connect.return_value.__enter__.return_value
+
+    def test_create_engine_once(self, create_engine: Mock) -> None:
+        with connect("sqlite:///"):
+            pass
+        create_engine.assert_called_once_with("sqlite:///", future=True)
+
+    def test_dispose_engine(self, engine: Mock) -> None:
+        with connect("sqlite:///"):
+            engine.dispose.assert_not_called()
+        engine.dispose.assert_called_once_with()
+
+    def test_dispose_engine_on_error(self, engine: Mock) -> None:
+        with pytest.raises(ValueError):
+            with connect("sqlite:///"):
+                raise ValueError()
+        engine.dispose.assert_called_once_with()
+
+    def test_engine(self, create_engine: Mock, test_db: DBFixture) -> None:
+        engine = sa_create_engine(test_db.url)
+        with connect(engine) as conn:
+            assert conn.engine is engine
+        assert conn.closed
+        create_engine.assert_not_called()
+        engine.dispose()
+
+    def test_connection(self, create_engine: Mock, test_db: DBFixture) -> None:
+        engine = sa_create_engine(test_db.url)
+        with engine.connect() as connection:
+            with connect(connection) as conn:
+                assert conn is connection
+            assert not connection.closed
+        create_engine.assert_not_called()
+        engine.dispose()
+
+    def test_connection_in_transaction(self, test_db: DBFixture) -> None:
+        engine = sa_create_engine(test_db.url)
+        with engine.connect() as connection:
+            connection.begin()
+            with pytest.raises(ValueError):
+                with connect(connection):
+                    pass
+        engine.dispose()
+
+
+class TestFetchCurrentDBVersions:
+    @pytest.fixture
+    def connection(self) -> Mock:
+        connection = MagicMock()
+        connection.dialect.name = "sqlite"
+        return connection
 
     def _assert_execute_any_call(
         self,
-        create_engine: Mock,
+        connection: Mock,
         expected_query: str,
     ) -> None:
-        execute = create_engine.return_value.begin.return_value.__enter__.return_value.execute
         assert any(
-            str(c[0][0]) == expected_query for c in execute.call_args_list
+            str(c[0][0]) == expected_query
+            for c in connection.execute.call_args_list
         )
 
+    def _fetch(self, test_db: DBFixture, schema: str) -> tuple[int, int]:
+        with connect(test_db.url) as conn:
+            return fetch_current_db_versions(conn, schema)
+
     def test_table_does_not_exist__return_value(
         self, test_db: DBFixture
     ) -> None:
-        version, api_level = fetch_current_db_versions(test_db.url, "myschema")
+        version, api_level = self._fetch(test_db, "myschema")
         assert version == -1
         assert api_level == 0
 
     def test_table_does_not_exist__created(self, test_db: DBFixture) -> None:
-        fetch_current_db_versions(test_db.url, "myschema")
+        self._fetch(test_db, "myschema")
         rows = test_db.fetch_rows()
         assert rows == [("myschema", -1, 0)]
 
@@ -103,7 +168,7 @@ class TestFetchCurrentDBVersions:
         self, test_db: DBFixture
     ) -> None:
         test_db.create_table()
-        version, api_level = fetch_current_db_versions(test_db.url, "myschema")
+        version, api_level = self._fetch(test_db, "myschema")
         assert version == -1
         assert api_level == 0
 
@@ -111,44 +176,125 @@ class TestFetchCurrentDBVersions:
         self, test_db: DBFixture
     ) -> None:
         test_db.create_table()
-        fetch_current_db_versions(test_db.url, "myschema")
+        self._fetch(test_db, "myschema")
         rows = test_db.fetch_rows()
         assert rows == [("myschema", -1, 0)]
 
     def test_table_has_row__return_value(self, test_db: DBFixture) -> None:
         test_db.create_table()
         test_db.insert_row("myschema", 123, 34)
-        version, api_level = fetch_current_db_versions(test_db.url, "myschema")
+        version, api_level = self._fetch(test_db, "myschema")
         assert version == 123
         assert api_level == 34
 
-    def test_mysql_quote_char(self, create_engine: Mock) -> None:
-        create_engine.return_value.dialect.name = "mysql+foo"
-        fetch_current_db_versions("mysql:///", "myschema")
-        expected_query = SQL_CREATE_DB_CONFIG.format(quote="`")
-        self._assert_execute_any_call(create_engine, expected_query)
+    def test_many(self, test_db: DBFixture) -> None:
+        test_db.create_table()
+        test_db.insert_row("schema1", 12, 3)
+        test_db.insert_row("schema3", 45, 6)
+        with connect(test_db.url) as conn:
+            versions = fetch_current_db_versions_many(
+                conn, ["schema1", "schema2", "schema3"]
+            )
+        assert versions == {
+            "schema1": (12, 3),
+            "schema2": (-1, 0),
+            "schema3": (45, 6),
+        }
+        assert sorted(test_db.fetch_rows()) == [
+            ("schema1", 12, 3),
+            ("schema2", -1, 0),
+            ("schema3", 45, 6),
+        ]
+
+    def test_many__single_query(self, connection: Mock) -> None:
+        fetch_current_db_versions_many(connection, ["schema1", "schema2"])
+        selects = [
+            c
+            for c in connection.execute.call_args_list
+            if "SELECT" in str(c[0][0])
+        ]
+        assert len(selects) == 1
+        assert selects[0][0][1] == {"schemas": ["schema1", "schema2"]}
+
+    def test_mysql_quote_char(self, connection: Mock) -> None:
+        connection.dialect.name = "mysql+foo"
+        error = DBAPIError("SELECT", None, Exception())
+        result = connection.execute.return_value
+        connection.execute.side_effect = [error, result, result, result]
+        fetch_current_db_versions(connection, "myschema")
+        expected_query = SQL_CREATE_DB_CONFIG.format(quote="`").replace(
+            "CREATE TABLE", "CREATE TABLE IF NOT EXISTS"
+        )
+        self._assert_execute_any_call(connection, expected_query)
+
+    def test_create_without_if_not_exists(self, connection: Mock) -> None:
+        connection.dialect.name = "mssql"
+        error = DBAPIError("SELECT", None, Exception())
+        result = connection.execute.return_value
+        connection.execute.side_effect = [error, result, result, result]
+        fetch_current_db_versions(connection, "myschema")
+        expected_query = SQL_CREATE_DB_CONFIG.format(quote='"')
+        self._assert_execute_any_call(connection, expected_query)
+
+    @pytest.mark.parametrize(
+        "dialect, prefix, suffix",
+        [
+            ("sqlite", "INSERT INTO", "ON CONFLICT DO NOTHING"),
+            ("postgresql", "INSERT INTO", "ON CONFLICT DO NOTHING"),
+            ("mysql", "INSERT IGNORE INTO", ")"),
+            ("mysql+foo", "INSERT IGNORE INTO", ")"),
+            ("mssql", "INSERT INTO", ")"),
+        ],
+    )
+    def test_insert_default_versions(
+        self, connection: Mock, dialect: str, prefix: str, suffix: str
+    ) -> None:
+        connection.dialect.name = dialect
+        connection.execute.return_value.fetchall.return_value = []
+        fetch_current_db_versions(connection, "myschema")
+        query = str(connection.execute.call_args_list[-1][0][0]).strip()
+        assert query.startswith(prefix)
+        assert query.endswith(suffix)
+
+    @pytest.mark.parametrize(
+        "create_table, insert_row, expected",
+        [(True, True, 1), (True, False, 2), (False, False, 4)],
+    )
+    def test_statement_count(
+        self,
+        test_db: DBFixture,
+        create_table: bool,
+        insert_row: bool,
+        expected: int,
+    ) -> None:
+        if create_table:
+            test_db.create_table()
+        if insert_row:
+            test_db.insert_row("myschema", 1, 0)
+        statements: list[str] = []
+        engine = sa_create_engine(test_db.url)
+        event.listen(
+            engine,
+            "before_cursor_execute",
+            lambda conn, cursor, statement, *args: statements.append(
+                statement
+            ),
+        )
+        with connect(engine) as conn:
+            fetch_current_db_versions(conn, "myschema")
+        engine.dispose()
+        assert len(statements) == expected
 
 
 class TestUpdateSQL:
     @pytest.fixture
-    def create_engine(self, mocker: MockerFixture) -> Mock:
-        engine = MagicMock()
-        engine.dialect.name = "sqlite"
-        engine.dialect.paramstyle = "pyformat"
-        return mocker.patch("dbupgrade.db.create_engine", return_value=engine)
-
-    @pytest.fixture
-    def engine(self, create_engine: Mock) -> Mock:
-        return cast(Mock, create_engine.return_value)
-
-    @pytest.fixture
-    def connection(self, engine: Mock) -> Mock:
-        connection = engine.begin.return_value.__enter__.return_value
-        connection.engine = engine
-        return cast(Mock, connection)
-
-    def _set_paramstyle(self, create_engine: Mock, paramstyle: str) -> None:
-        create_engine.return_value.dialect.paramstyle = paramstyle
+    def connection(self) -> Mock:
+        connection = MagicMock()
+        connection.dialect.name = "sqlite"
+        connection.dialect.paramstyle = "pyformat"
+        connection.default_isolation_level = "SERIALIZABLE"
+        connection.get_execution_options.return_value = {}
+        return connection
 
     def _assert_execute_has_calls(
         self, execute_mock: Mock, expected_queries: Iterable[_Call]
@@ -161,33 +307,21 @@ class TestUpdateSQL:
             true_call2 = call(query, *true_call[0][1:], **true_call[1])
             assert true_call2 == expected_call
 
-    def test_create_engine_called(
-        self, create_engine: Mock, engine: Mock
-    ) -> None:
-        update_sql("sqlite:///", "SELECT * FROM foo", "myschema", 0, 0)
-        create_engine.assert_called_once_with("sqlite:///", future=True)
-        engine.dispose.assert_called_once_with()
+    def test_begin_transaction(self, connection: Mock) -> None:
+        update_sql(connection, ["SELECT * FROM foo"], "myschema", 0, 0)
+        connection.begin.assert_called_once_with()
+        connection.begin.return_value.__exit__.assert_called_once()
 
-    def test_dispose_engine_on_error(
-        self, engine: Mock, connection: Mock
-    ) -> None:
-        connection.execute.side_effect = ValueError()
-        with pytest.raises(ValueError):
-            update_sql("sqlite:///", "SELECT * FROM foo", "myschema", 44, 13)
-        engine.dispose.assert_called_once_with()
-
-    def test_execute_with_transaction(
-        self, create_engine: Mock, connection: Mock
-    ) -> None:
+    def test_execute_with_transaction(self, connection: Mock) -> None:
         update_sql(
-            "sqlite:///",
-            "SELECT * FROM foo; SELECT * FROM bar;",
+            connection,
+            ["SELECT * FROM foo", "SELECT * FROM bar"],
             "myschema",
             44,
             13,
             transaction=True,
         )
-        create_engine.assert_called_once_with("sqlite:///", future=True)
+        connection.execution_options.assert_not_called()
         self._assert_execute_has_calls(
             connection.execute,
             [
@@ -203,26 +337,40 @@ class TestUpdateSQL:
             connection.execute.call_args_list[2][0][0], TextClause
         )
 
-    def test_execute_without_transaction(self, create_engine: Mock) -> None:
+    def test_execute_without_transaction(self, connection: Mock) -> None:
         update_sql(
-            "sqlite:///",
-            "SELECT * FROM foo; SELECT * FROM bar;",
+            connection,
+            ["SELECT * FROM foo", "SELECT * FROM bar"],
             "myschema",
             44,
             13,
             transaction=False,
         )
-        create_engine.assert_called_once_with(
-            "sqlite:///", future=True, isolation_level="AUTOCOMMIT"
+        assert connection.execution_options.call_args_list == [
+            call(isolation_level="AUTOCOMMIT"),
+            call(isolation_level="SERIALIZABLE"),
+        ]
+
+    def test_restore_isolation_level_on_error(self, connection: Mock) -> None:
+        connection.get_execution_options.return_value = {
+            "isolation_level": "READ COMMITTED"
+        }
+        connection.execute.side_effect = ValueError()
+        with pytest.raises(ValueError):
+            update_sql(
+                connection,
+                ["SELECT * FROM foo"],
+                "myschema",
+                44,
+                13,
+                transaction=False,
+            )
+        connection.execution_options.assert_called_with(
+            isolation_level="READ COMMITTED"
         )
 
-    def test_colon(
-        self,
-        create_engine: Mock,
-        connection: Mock,
-    ) -> None:
-        self._set_paramstyle(create_engine, "pyformat")
-        update_sql("sqlite:///", "SELECT ':foo'", "myschema", 44, 13)
+    def test_colon(self, connection: Mock) -> None:
+        update_sql(connection, ["SELECT ':foo'"], "myschema", 44, 13)
         self._assert_execute_has_calls(
             connection.execute,
             [
@@ -233,3 +381,336 @@ class TestUpdateSQL:
                 ),
             ],
         )
+
+    def test_execute_driver(self, connection: Mock) -> None:
+        update_sql(
+            connection,
+            ["SELECT ':foo'", "SELECT '100%'"],
+            "myschema",
+            44,
+            13,
+            execution="driver",
+        )
+        assert connection.exec_driver_sql.call_args_list == [
+            call("SELECT ':foo'", execution_options={"no_parameters": True}),
+            call("SELECT '100%'", execution_options={"no_parameters": True}),
+        ]
+        self._assert_execute_has_calls(
+            connection.execute,
+            [
+                call(
+                    SQL_UPDATE_VERSIONS.format(quote='"'),
+                    {"schema": "myschema", "version": 44, "api_level": 13},
+                ),
+            ],
+        )
+
+    def test_execute_driver__literal_colon(self, test_db: DBFixture) -> None:
+        with connect(test_db.url) as conn:
+            fetch_current_db_versions(conn, "myschema")
+            update_sql(
+                conn,
+                [
+                    "CREATE TABLE foo(x VARCHAR)",
+                    "INSERT INTO foo VALUES('a :b')",
+                ],
+                "myschema",
+                0,
+                0,
+                execution="driver",
+            )
+        with test_db.connect() as cursor:
+            cursor.execute("SELECT x FROM foo")
+            assert cursor.fetchall() == [("a :b",)]
+
+    def test_without_record_version(self, test_db: DBFixture) -> None:
+        with connect(test_db.url) as conn:
+            fetch_current_db_versions(conn, "myschema")
+            update_sql(
+                conn,
+                ["CREATE TABLE foo(x INT)"],
+                "myschema",
+                5,
+                0,
+                transaction=False,
+                record_version=False,
+            )
+        assert test_db.fetch_rows() == [("myschema", -1, 0)]
+
+    def test_reuse_connection(self, test_db: DBFixture) -> None:
+        with connect(test_db.url) as conn:
+            fetch_current_db_versions(conn, "myschema")
+            update_sql(conn, ["CREATE TABLE foo(x INT)"], "myschema", 0, 0)
+            update_sql(
+                conn,
+                ["CREATE TABLE bar(x INT)"],
+                "myschema",
+                1,
+                0,
+                transaction=False,
+            )
+            update_sql(conn, ["INSERT INTO foo VALUES(1)"], "myschema", 2, 0)
+        assert test_db.fetch_rows() == [("myschema", 2, 0)]
+
+
+class TestBatchExecution:
+    @pytest.fixture
+    def connection(self) -> Mock:
+        connection = MagicMock()
+        connection.dialect.name = "postgresql"
+        connection.dialect.driver = "psycopg2"
+        connection.default_isolation_level = "SERIALIZABLE"
+        connection.get_execution_options.return_value = {}
+        return connection
+
+    def _statements(self, count: int) -> list[str]:
+        return [f"SELECT {i}" for i in range(count)]
+
+    def test_postgresql(self, connection: Mock) -> None:
+        statements = self._statements(BATCH_SIZE + 1)
+        update_sql(connection, statements, "myschema", 1, 0, execution="batch")
+        assert connection.exec_driver_sql.call_args_list == [
+            call(
+                "\n;\n".join(statements[:BATCH_SIZE]),
+                execution_options={"no_parameters": True},
+            ),
+            call(
+                statements[BATCH_SIZE],
+                execution_options={"no_parameters": True},
+            ),
+        ]
+        connection.begin_nested.assert_called_once_with()
+        connection.begin_nested.return_value.commit.assert_called_once_with()
+
+    def test_postgresql__error(self, connection: Mock) -> None:
+        error = DBAPIError("SELECT 0;\nSELECT 1;\nSELECT 2", None, Exception())
+        replay_error = DBAPIError("SELECT 1", None, Exception())
+        connection.exec_driver_sql.side_effect = [error, None, replay_error]
+        with pytest.raises(DBAPIError) as exc_info:
+            update_sql(
+                connection,
+                self._statements(3),
+                "myschema",
+                1,
+                0,
+                execution="batch",
+            )
+        assert exc_info.value is replay_error
+        savepoint = connection.begin_nested.return_value
+        savepoint.rollback.assert_called_once_with()
+        savepoint.commit.assert_not_called()
+
+    def test_without_transaction(self, connection: Mock) -> None:
+        statements = self._statements(3)
+        update_sql(
+            connection,
+            statements,
+            "myschema",
+            1,
+            0,
+            transaction=False,
+            execution="batch",
+        )
+        assert connection.exec_driver_sql.call_args_list == [
+            call(query, execution_options={"no_parameters": True})
+            for query in statements
+        ]
+
+    def test_mysql(self, connection: Mock) -> None:
+        connection.dialect.name = "mysql"
+        connection.dialect.driver = "pymysql"
+        connection.connection.dbapi_connection.client_flag = 1 << 16
+        cursor = connection.connection.cursor.return_value
+        cursor.nextset.side_effect = [True, None]
+        update_sql(
+            connection,
+            self._statements(3),
+            "myschema",
+            1,
+            0,
+            execution="batch",
+        )
+        cursor.execute.assert_called_once_with(
+            "SELECT 0\n;\nSELECT 1\n;\nSELECT 2"
+        )
+        cursor.close.assert_called_once_with()
+        connection.exec_driver_sql.assert_not_called()
+
+    def test_mysql__error(self, connection: Mock) -> None:
+        class Error(Exception):
+            pass
+
+        connection.dialect.name = "mysql"
+        connection.dialect.driver = "pymysql"
+        connection.dialect.loaded_dbapi.Error = Error
+        connection.connection.dbapi_connection.client_flag = 1 << 16
+        cursor = connection.connection.cursor.return_value
+        cursor.nextset.side_effect = [True, Error("failed")]
+        with pytest.raises(DBAPIError) as exc_info:
+            update_sql(
+                connection,
+                self._statements(4),
+                "myschema",
+                1,
+                0,
+                execution="batch",
+            )
+        assert exc_info.value.statement == "SELECT 2"
+        cursor.close.assert_called_once_with()
+
+    def test_mysql__no_multi_statements(self, connection: Mock) -> None:
+        connection.dialect.name = "mysql"
+        connection.dialect.driver = "pymysql"
+        connection.connection.dbapi_connection.client_flag = 0
+        update_sql(
+            connection,
+            self._statements(2),
+            "myschema",
+            1,
+            0,
+            execution="batch",
+        )
+        assert connection.exec_driver_sql.call_count == 2
+        connection.connection.cursor.assert_not_called()
+
+    def test_sqlite(self, test_db: DBFixture) -> None:
+        with connect(test_db.url) as conn:
+            fetch_current_db_versions(conn, "myschema")
+            update_sql(
+                conn,
+                ["CREATE TABLE foo(x INT)", "INSERT INTO foo VALUES(1)"],
+                "myschema",
+                0,
+                0,
+                execution="batch",
+            )
+        assert test_db.fetch_rows() == [("myschema", 0, 0)]
+
+
+class TestBulkExecution:
+    @pytest.fixture
+    def connection(self) -> Mock:
+        connection = MagicMock()
+        connection.dialect.name = "postgresql"
+        connection.dialect.driver = "psycopg2"
+        connection.dialect.paramstyle = "pyformat"
+        connection.default_isolation_level = "SERIALIZABLE"
+        connection.get_execution_options.return_value = {}
+        return connection
+
+    def test_bulk_inserts(self, test_db: DBFixture) -> None:
+        with connect(test_db.url) as conn:
+            fetch_current_db_versions(conn, "myschema")
+            update_sql(
+                conn,
+                ["CREATE TABLE foo(x INT, y VARCHAR)"]
+                + [f"INSERT INTO foo VALUES({i}, 'v{i}')" for i in range(3)],
+                "myschema",
+                0,
+                0,
+                bulk_inserts=True,
+            )
+        with test_db.connect() as cursor:
+            cursor.execute("SELECT x, y FROM foo")
+            assert cursor.fetchall() == [(0, "v0"), (1, "v1"), (2, "v2")]
+
+    def test_bulk_inserts__executemany(self, connection: Mock) -> None:
+        update_sql(
+            connection,
+            [
+                "INSERT INTO foo VALUES(1)",
+                "INSERT INTO foo VALUES(2)",
+                "SELECT 1",
+            ],
+            "myschema",
+            0,
+            0,
+            execution="driver",
+            bulk_inserts=True,
+        )
+        assert connection.exec_driver_sql.call_args_list == [
+            call("INSERT INTO foo VALUES (%s)", [(1,), (2,)]),
+            call("SELECT 1", execution_options={"no_parameters": True}),
+        ]
+
+    def test_bulk_inserts__batch(self, connection: Mock) -> None:
+        update_sql(
+            connection,
+            [
+                "SELECT 1",
+                "SELECT 2",
+                "INSERT INTO foo VALUES(1)",
+                "INSERT INTO foo VALUES(2)",
+                "SELECT 3",
+            ],
+            "myschema",
+            0,
+            0,
+            execution="batch",
+            bulk_inserts=True,
+        )
+        assert connection.exec_driver_sql.call_args_list == [
+            call(
+                "SELECT 1\n;\nSELECT 2",
+                execution_options={"no_parameters": True},
+            ),
+            call("INSERT INTO foo VALUES (%s)", [(1,), (2,)]),
+            call("SELECT 3", execution_options={"no_parameters": True}),
+        ]
+
+    def test_bulk_data(self, connection: Mock) -> None:
+        data = MagicMock()
+        bulk_data = Mock(return_value=data)
+        update_sql(
+            connection,
+            ["CREATE TABLE foo(x INT)", "COPY foo FROM STDIN"],
+            "myschema",
+            0,
+            0,
+            execution="driver",
+            bulk_data=bulk_data,
+        )
+        cursor = connection.connection.cursor.return_value
+        cursor.copy_expert.assert_called_once_with(
+            "COPY foo FROM STDIN", data.__enter__.return_value, size=ANY
+        )
+        data.__exit__.assert_called_once()
+        connection.exec_driver_sql.assert_called_once_with(
+            "CREATE TABLE foo(x INT)",
+            execution_options={"no_parameters": True},
+        )
+
+    def test_bulk_data__second_copy(self, connection: Mock) -> None:
+        bulk_data = Mock(return_value=MagicMock())
+        with pytest.raises(InvalidRequestError):
+            update_sql(
+                connection,
+                ["COPY foo FROM STDIN", "COPY bar FROM STDIN"],
+                "myschema",
+                0,
+                0,
+                execution="driver",
+                bulk_data=bulk_data,
+            )
+        bulk_data.assert_called_once_with()
+        cursor = connection.connection.cursor.return_value
+        cursor.copy_expert.assert_called_once_with(
+            "COPY foo FROM STDIN", ANY, size=ANY
+        )
+
+    def test_bulk_data__batch(self, connection: Mock) -> None:
+        bulk_data = Mock(return_value=MagicMock())
+        update_sql(
+            connection,
+            ["SELECT 1", "COPY foo FROM STDIN", "SELECT 2"],
+            "myschema",
+            0,
+            0,
+            execution="batch",
+            bulk_data=bulk_data,
+        )
+        assert connection.exec_driver_sql.call_args_list == [
+            call("SELECT 1", execution_options={"no_parameters": True}),
+            call("SELECT 2", execution_options={"no_parameters": True}),
+        ]
+        bulk_data.assert_called_once_with()
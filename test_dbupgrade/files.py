@@ -1,9 +1,19 @@
 import os.path
+import zipfile
+from pathlib import Path
 from unittest.mock import patch
 
 import pytest
 
-from dbupgrade.files import FileInfo, collect_sql_files
+from dbupgrade.files import (
+    DEFAULT_FILENAME_PATTERN,
+    DIRECTORY_INDEX,
+    FileInfo,
+    collect_sql_files,
+    collect_sql_resources,
+    filename_version,
+    open_sql_file,
+)
 
 
 class TestFileInfo:
@@ -25,6 +35,22 @@ class TestFileInfo:
         with pytest.raises(TypeError):
             fi1 < fi2  # noqa: B015
 
+    def test_sort_key(self) -> None:
+        fi = FileInfo("", "schema", "postgres", 4, 0)
+        assert fi.sort_key == ("schema", "postgres", 4)
+
+    def test_interned_names(self) -> None:
+        fi1 = FileInfo("", "".join(["my", "schema"]), "postgres", 4, 0)
+        fi2 = FileInfo("", "".join(["mysch", "ema"]), "postgres", 5, 0)
+        assert fi1.schema is fi2.schema
+        assert fi1.dialect is fi2.dialect
+
+    def test_slots(self) -> None:
+        fi = FileInfo("", "schema", "postgres", 4, 0)
+        assert not hasattr(fi, "__dict__")
+        with pytest.raises(AttributeError):
+            fi.foo = 1  # type: ignore[attr-defined]
+
     def test_repr(self) -> None:
         fi = FileInfo("/foo/bar", "myschema", "postgres", 123, 13)
         assert (
@@ -33,13 +59,233 @@ class TestFileInfo:
 
 
 class TestCollectSQLFiles:
-    def test_filter_sql_files(self) -> None:
-        with patch("dbupgrade.files.listdir") as listdir:
-            listdir.return_value = ["foo", "bar.sql", "baz.sql"]
-            files = collect_sql_files("tmp")
-            listdir.assert_called_with("tmp")
-        expected_files = [
-            os.path.join("tmp", "bar.sql"),
-            os.path.join("tmp", "baz.sql"),
-        ]
-        assert files == expected_files
+    @pytest.fixture
+    def directory(self, tmp_path: Path) -> Path:
+        for path in [
+            "0012-foo.sql",
+            "0013-bar.sql",
+            "baz.sql",
+            "README",
+            "users/2023/0001-a.sql",
+            "users/2024/0002-b.sql",
+            "users/2024/0003-c.sql",
+            "users/2024/notes.txt",
+            "orders/0001-x.sql",
+            "dir.sql/0099-y.sql",
+        ]:
+            (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+            (tmp_path / path).write_text("")
+        return tmp_path
+
+    def _relative(self, directory: Path, files: list[str]) -> list[str]:
+        return sorted(Path(f).relative_to(directory).as_posix() for f in files)
+
+    def test_filter_sql_files(self, directory: Path) -> None:
+        files = collect_sql_files(str(directory))
+        assert sorted(files) == [
+            os.path.join(str(directory), "0012-foo.sql"),
+            os.path.join(str(directory), "0013-bar.sql"),
+            os.path.join(str(directory), "baz.sql"),
+        ]
+
+    def test_skip_by_filename_version(self, directory: Path) -> None:
+        files = collect_sql_files(str(directory), DEFAULT_FILENAME_PATTERN, 13)
+        assert self._relative(directory, files) == [
+            "0013-bar.sql",
+            "baz.sql",
+        ]
+
+    def test_no_min_version(self, directory: Path) -> None:
+        files = collect_sql_files(str(directory), DEFAULT_FILENAME_PATTERN)
+        assert len(files) == 3
+
+    def test_recursive(self, directory: Path) -> None:
+        files = collect_sql_files(str(directory), recursive=True)
+        assert self._relative(directory, files) == [
+            "0012-foo.sql",
+            "0013-bar.sql",
+            "baz.sql",
+            "dir.sql/0099-y.sql",
+            "orders/0001-x.sql",
+            "users/2023/0001-a.sql",
+            "users/2024/0002-b.sql",
+            "users/2024/0003-c.sql",
+        ]
+
+    def test_include(self, directory: Path) -> None:
+        files = collect_sql_files(
+            str(directory), recursive=True, include=["users/*", "baz.sql"]
+        )
+        assert self._relative(directory, files) == [
+            "baz.sql",
+            "users/2023/0001-a.sql",
+            "users/2024/0002-b.sql",
+            "users/2024/0003-c.sql",
+        ]
+
+    def test_include_name(self, directory: Path) -> None:
+        files = collect_sql_files(
+            str(directory), recursive=True, include=["0001-*"]
+        )
+        assert self._relative(directory, files) == [
+            "orders/0001-x.sql",
+            "users/2023/0001-a.sql",
+        ]
+
+    def test_exclude(self, directory: Path) -> None:
+        files = collect_sql_files(
+            str(directory),
+            recursive=True,
+            exclude=["2023", "orders/*", "0002-*", "*.sql/*"],
+        )
+        assert self._relative(directory, files) == [
+            "0012-foo.sql",
+            "0013-bar.sql",
+            "baz.sql",
+            "users/2024/0003-c.sql",
+        ]
+
+    def test_prune_applied_directories(self, directory: Path) -> None:
+        (directory / "users" / "2023" / DIRECTORY_INDEX).write_text(
+            '{"maxVersion": 1}'
+        )
+        (directory / "users" / "2024" / DIRECTORY_INDEX).write_text(
+            '{"maxVersion": 3}'
+        )
+        files = collect_sql_files(
+            str(directory), recursive=True, include=["users/*"]
+        )
+        assert len(files) == 3
+        with patch("dbupgrade.files.os.scandir", wraps=os.scandir) as scandir:
+            files = collect_sql_files(
+                str(directory),
+                min_version=2,
+                recursive=True,
+                include=["users/*"],
+            )
+        assert self._relative(directory, files) == [
+            "users/2024/0002-b.sql",
+            "users/2024/0003-c.sql",
+        ]
+        scanned = [c.args[0] for c in scandir.call_args_list]
+        assert str(directory / "users" / "2023") not in scanned
+
+    def test_invalid_directory_index(self, directory: Path) -> None:
+        (directory / "users" / "2023" / DIRECTORY_INDEX).write_text("{")
+        with patch("dbupgrade.files.logging") as logging:
+            files = collect_sql_files(
+                str(directory), min_version=5, recursive=True
+            )
+        logging.warning.assert_called_once()
+        assert len(files) == 8
+
+
+class TestCollectSQLResources:
+    @pytest.fixture
+    def archive(self, tmp_path: Path) -> zipfile.Path:
+        archive = tmp_path / "scripts.zip"
+        with zipfile.ZipFile(archive, "w") as zf:
+            zf.writestr("sql/0012-foo.sql", "")
+            zf.writestr("sql/0013-bar.sql", "")
+            zf.writestr("sql/baz.sql", "")
+            zf.writestr("sql/README", "")
+            zf.writestr("sql/sub.sql/0014-x.sql", "")
+            zf.writestr("sql/sub.sql/" + DIRECTORY_INDEX, '{"maxVersion": 14}')
+        return zipfile.Path(archive, "sql/")
+
+    def test_filter_sql_files(self, archive: zipfile.Path) -> None:
+        files = collect_sql_resources(archive)
+        assert sorted(f.name for f in files) == [
+            "0012-foo.sql",
+            "0013-bar.sql",
+            "baz.sql",
+        ]
+
+    def test_skip_by_filename_version(self, archive: zipfile.Path) -> None:
+        files = collect_sql_resources(archive, DEFAULT_FILENAME_PATTERN, 13)
+        assert sorted(f.name for f in files) == ["0013-bar.sql", "baz.sql"]
+
+    def test_recursive(self, archive: zipfile.Path) -> None:
+        files = collect_sql_resources(
+            archive, recursive=True, exclude=["0012-*"]
+        )
+        assert sorted(f.name for f in files) == [
+            "0013-bar.sql",
+            "0014-x.sql",
+            "baz.sql",
+        ]
+
+    def test_prune_applied_directories(self, archive: zipfile.Path) -> None:
+        files = collect_sql_resources(archive, min_version=15, recursive=True)
+        assert sorted(f.name for f in files) == [
+            "0012-foo.sql",
+            "0013-bar.sql",
+            "baz.sql",
+        ]
+
+
+class TestOpenSQLFile:
+    def test_file(self, tmp_path: Path) -> None:
+        path = tmp_path / "foo.sql"
+        path.write_text("SELECT 1;")
+        fi = FileInfo(str(path), "myschema", "sqlite", 1, 0)
+        with open_sql_file(fi) as stream:
+            assert stream.read() == "SELECT 1;"
+        with open_sql_file(fi, "rb") as bstream:
+            assert bstream.read() == b"SELECT 1;"
+
+    def test_resource(self, tmp_path: Path) -> None:
+        archive = tmp_path / "scripts.zip"
+        with zipfile.ZipFile(archive, "w") as zf:
+            zf.writestr("foo.sql", "SELECT 1;")
+        fi = FileInfo("foo.sql", "myschema", "sqlite", 1, 0)
+        fi.resource = zipfile.Path(archive, "foo.sql")
+        with open_sql_file(fi) as stream:
+            assert stream.read() == "SELECT 1;"
+        with open_sql_file(fi, "rb") as bstream:
+            assert bstream.read() == b"SELECT 1;"
+
+
+class TestOpenBulkData:
+    def test_file(self, tmp_path: Path) -> None:
+        (tmp_path / "foo.csv").write_bytes(b"1,a\n")
+        fi = FileInfo(
+            str(tmp_path / "foo.sql"), "myschema", "postgresql", 1, 0
+        )
+        with fi.open_bulk_data() as stream:
+            assert stream.read() == b"1,a\n"
+
+    def test_resource(self, tmp_path: Path) -> None:
+        archive = tmp_path / "scripts.zip"
+        with zipfile.ZipFile(archive, "w") as zf:
+            zf.writestr("sql/foo.sql", "COPY foo FROM STDIN;")
+            zf.writestr("sql/foo.csv", "1,a\n")
+        fi = FileInfo("sql/foo.sql", "myschema", "postgresql", 1, 0)
+        fi.resource = zipfile.Path(archive, "sql/foo.sql")
+        with fi.open_bulk_data() as stream:
+            assert stream.read() == b"1,a\n"
+
+    def test_missing(self, tmp_path: Path) -> None:
+        fi = FileInfo(
+            str(tmp_path / "foo.sql"), "myschema", "postgresql", 1, 0
+        )
+        with pytest.raises(FileNotFoundError):
+            fi.open_bulk_data()
+
+
+class TestFilenameVersion:
+    def test_default_pattern(self) -> None:
+        version = filename_version(
+            "/tmp/0042-foo.sql", DEFAULT_FILENAME_PATTERN
+        )
+        assert version == 42
+
+    def test_no_match(self) -> None:
+        assert filename_version("foo-42.sql", DEFAULT_FILENAME_PATTERN) is None
+
+    def test_unnamed_group(self) -> None:
+        assert filename_version("v7_foo.sql", r"v(\d+)_") == 7
+
+    def test_named_group(self) -> None:
+        pattern = r"(\w+)-(?P<version>\d+)\."
+        assert filename_version("foo-7.sql", pattern) == 7
@@ -0,0 +1,241 @@
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+from unittest.mock import Mock
+
+import pytest
+from pytest_mock import MockerFixture
+
+import dbupgrade.index
+from dbupgrade.files import FileInfo
+from dbupgrade.index import index_path, parse_sql_files_indexed
+
+
+def _write_script(path: Path, version: int, transaction: str = "yes") -> str:
+    path.write_text(
+        "-- Schema: myschema\n"
+        "-- Dialect: sqlite\n"
+        f"-- Version: {version}\n"
+        "-- API-Level: 3\n"
+        f"-- Transaction: {transaction}\n"
+        "\n"
+        "SELECT 1;\n"
+    )
+    return str(path)
+
+
+def _describe(infos: list[FileInfo]) -> list[tuple[str, int, bool]]:
+    return [
+        (os.path.basename(i.filename), i.version, i.transaction) for i in infos
+    ]
+
+
+class TestIndexPath:
+    def test_per_directory(self) -> None:
+        assert index_path("/cache", "/foo") != index_path("/cache", "/bar")
+        assert os.path.dirname(index_path("/cache", "/foo")) == "/cache"
+
+    def test_relative(self) -> None:
+        assert index_path("/cache", ".") == index_path("/cache", os.getcwd())
+
+
+class TestParseSQLFilesIndexed:
+    @pytest.fixture
+    def index_file(self, tmp_path: Path) -> str:
+        return str(tmp_path / "cache" / "index.json")
+
+    @pytest.fixture
+    def scripts(self, tmp_path: Path) -> list[str]:
+        return [
+            _write_script(tmp_path / "0001.sql", 1),
+            _write_script(tmp_path / "0002.sql", 2, "no"),
+        ]
+
+    @pytest.fixture
+    def parse_sql_file(self, mocker: MockerFixture) -> Mock:
+        return mocker.spy(dbupgrade.index, "parse_sql_file")
+
+    def test_first_run(
+        self, index_file: str, scripts: list[str], parse_sql_file: Mock
+    ) -> None:
+        infos = parse_sql_files_indexed(scripts, index_file)
+        assert _describe(infos) == [
+            ("0001.sql", 1, True),
+            ("0002.sql", 2, False),
+        ]
+        assert infos[0].schema == "myschema"
+        assert infos[0].dialect == "sqlite"
+        assert infos[0].api_level == 3
+        assert parse_sql_file.call_count == 2
+        assert os.path.exists(index_file)
+
+    def test_cached(
+        self, index_file: str, scripts: list[str], parse_sql_file: Mock
+    ) -> None:
+        parse_sql_files_indexed(scripts, index_file)
+        parse_sql_file.reset_mock()
+        infos = parse_sql_files_indexed(scripts, index_file)
+        assert _describe(infos) == [
+            ("0001.sql", 1, True),
+            ("0002.sql", 2, False),
+        ]
+        parse_sql_file.assert_not_called()
+
+    def test_cached_execution(self, tmp_path: Path, index_file: str) -> None:
+        script = tmp_path / "0003.sql"
+        script.write_text(
+            "-- Schema: myschema\n"
+            "-- Dialect: sqlite\n"
+            "-- Version: 3\n"
+            "-- API-Level: 3\n"
+            "-- Execution: driver\n"
+        )
+        parse_sql_files_indexed([str(script)], index_file)
+        infos = parse_sql_files_indexed([str(script)], index_file)
+        assert infos[0].execution == "driver"
+
+    def test_cached_bulk_load(self, tmp_path: Path, index_file: str) -> None:
+        script = tmp_path / "0003.sql"
+        script.write_text(
+            "-- Schema: myschema\n"
+            "-- Dialect: postgresql\n"
+            "-- Version: 3\n"
+            "-- API-Level: 3\n"
+            "-- Bulk-Load: copy\n"
+        )
+        parse_sql_files_indexed([str(script)], index_file)
+        infos = parse_sql_files_indexed([str(script)], index_file)
+        assert infos[0].bulk_load == "copy"
+
+    def test_cached_body_offset(
+        self, index_file: str, scripts: list[str], parse_sql_file: Mock
+    ) -> None:
+        parse_sql_files_indexed(scripts, index_file)
+        parse_sql_file.reset_mock()
+        infos = parse_sql_files_indexed(scripts, index_file)
+        assert infos[0].body_offset == 89
+        parse_sql_file.assert_not_called()
+
+    def test_concurrent(
+        self, index_file: str, scripts: list[str], parse_sql_file: Mock
+    ) -> None:
+        infos = parse_sql_files_indexed(scripts, index_file, max_workers=4)
+        assert _describe(infos) == [
+            ("0001.sql", 1, True),
+            ("0002.sql", 2, False),
+        ]
+        parse_sql_file.reset_mock()
+        infos = parse_sql_files_indexed(scripts, index_file, max_workers=4)
+        assert [i.version for i in infos] == [1, 2]
+        parse_sql_file.assert_not_called()
+
+    def test_changed_file(
+        self,
+        tmp_path: Path,
+        index_file: str,
+        scripts: list[str],
+        parse_sql_file: Mock,
+    ) -> None:
+        parse_sql_files_indexed(scripts, index_file)
+        parse_sql_file.reset_mock()
+        _write_script(tmp_path / "0002.sql", 12, "no")
+        infos = parse_sql_files_indexed(scripts, index_file)
+        assert _describe(infos) == [
+            ("0001.sql", 1, True),
+            ("0002.sql", 12, False),
+        ]
+        parse_sql_file.assert_called_once_with(scripts[1])
+
+    def test_new_file(
+        self,
+        tmp_path: Path,
+        index_file: str,
+        scripts: list[str],
+        parse_sql_file: Mock,
+    ) -> None:
+        parse_sql_files_indexed(scripts, index_file)
+        parse_sql_file.reset_mock()
+        new_script = _write_script(tmp_path / "0003.sql", 3)
+        infos = parse_sql_files_indexed(scripts + [new_script], index_file)
+        assert [i.version for i in infos] == [1, 2, 3]
+        parse_sql_file.assert_called_once_with(new_script)
+
+    def test_removed_file(self, index_file: str, scripts: list[str]) -> None:
+        parse_sql_files_indexed(scripts, index_file)
+        os.remove(scripts[1])
+        infos = parse_sql_files_indexed(scripts[:1], index_file)
+        assert [i.version for i in infos] == [1]
+        with open(index_file) as f:
+            assert list(json.load(f)["files"]) == [scripts[0]]
+
+    def test_skipped_file(
+        self,
+        mocker: MockerFixture,
+        index_file: str,
+        scripts: list[str],
+        parse_sql_file: Mock,
+    ) -> None:
+        parse_sql_files_indexed(scripts, index_file)
+        write_index = mocker.spy(dbupgrade.index, "_write_index")
+        infos = parse_sql_files_indexed(scripts[1:], index_file)
+        assert [i.version for i in infos] == [2]
+        write_index.assert_not_called()
+        with open(index_file) as f:
+            assert list(json.load(f)["files"]) == scripts
+        parse_sql_file.reset_mock()
+        parse_sql_files_indexed(scripts, index_file)
+        parse_sql_file.assert_not_called()
+
+    def test_parse_error(
+        self,
+        tmp_path: Path,
+        index_file: str,
+        parse_sql_file: Mock,
+        caplog: pytest.LogCaptureFixture,
+    ) -> None:
+        invalid = tmp_path / "invalid.sql"
+        invalid.write_text("-- Schema: myschema\n")
+        parse_sql_files_indexed([str(invalid)], index_file)
+        caplog.clear()
+        parse_sql_file.reset_mock()
+        infos = parse_sql_files_indexed([str(invalid)], index_file)
+        assert infos == []
+        parse_sql_file.assert_not_called()
+        assert caplog.messages == ["invalid.sql: missing header: dialect"]
+
+    def test_invalid_index(
+        self, index_file: str, scripts: list[str], parse_sql_file: Mock
+    ) -> None:
+        os.makedirs(os.path.dirname(index_file))
+        with open(index_file, "w") as f:
+            f.write("INVALID")
+        infos = parse_sql_files_indexed(scripts, index_file)
+        assert [i.version for i in infos] == [1, 2]
+        assert parse_sql_file.call_count == 2
+
+    def test_other_version(
+        self, index_file: str, scripts: list[str], parse_sql_file: Mock
+    ) -> None:
+        parse_sql_files_indexed(scripts, index_file)
+        with open(index_file) as f:
+            j = json.load(f)
+        j["version"] = -1
+        with open(index_file, "w") as f:
+            json.dump(j, f)
+        parse_sql_file.reset_mock()
+        parse_sql_files_indexed(scripts, index_file)
+        assert parse_sql_file.call_count == 2
+
+    def test_unwritable_index(
+        self,
+        tmp_path: Path,
+        scripts: list[str],
+        caplog: pytest.LogCaptureFixture,
+    ) -> None:
+        (tmp_path / "file").write_text("")
+        index_file = str(tmp_path / "file" / "index.json")
+        infos = parse_sql_files_indexed(scripts, index_file)
+        assert [i.version for i in infos] == [1, 2]
+        assert "could not write index" in caplog.text
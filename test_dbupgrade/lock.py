@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import threading
+from collections.abc import Generator
+from pathlib import Path
+from unittest.mock import MagicMock, Mock
+
+import pytest
+from pytest_mock import MockerFixture
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Connection
+
+from dbupgrade.lock import LOCK_NAME, LockError, MigrationLock
+
+
+def _executed(conn: Mock) -> list[str]:
+    return [str(c[0][0]) for c in conn.execute.call_args_list]
+
+
+class TestMigrationLock:
+    @pytest.fixture
+    def conn(self) -> Mock:
+        conn = MagicMock()
+        conn.execute.return_value.scalar.return_value = 1
+        return conn
+
+    @pytest.fixture
+    def sqlite_conn(self, tmp_path: Path) -> Generator[Connection, None, None]:
+        engine = create_engine(f"sqlite:///{tmp_path}/db.sqlite")
+        with engine.connect() as conn:
+            yield conn
+        engine.dispose()
+
+    def test_postgresql(self, conn: Mock) -> None:
+        conn.dialect.name = "postgresql"
+        with MigrationLock(conn):
+            assert _executed(conn) == ["SELECT pg_advisory_lock(:key)"]
+        assert _executed(conn) == [
+            "SELECT pg_advisory_lock(:key)",
+            "SELECT pg_advisory_unlock(:key)",
+        ]
+        assert conn.begin.call_count == 2
+
+    def test_mysql(self, conn: Mock) -> None:
+        conn.dialect.name = "mysql"
+        with MigrationLock(conn):
+            assert _executed(conn) == ["SELECT GET_LOCK(:name, :timeout)"]
+        assert _executed(conn) == [
+            "SELECT GET_LOCK(:name, :timeout)",
+            "SELECT RELEASE_LOCK(:name)",
+        ]
+
+    def test_postgresql__non_blocking(self, conn: Mock) -> None:
+        conn.dialect.name = "postgresql"
+        conn.execute.return_value.scalar.return_value = False
+        lock = MigrationLock(conn)
+        assert not lock.acquire(blocking=False)
+        assert _executed(conn) == ["SELECT pg_try_advisory_lock(:key)"]
+        conn.execute.return_value.scalar.return_value = True
+        assert lock.acquire(blocking=False)
+
+    def test_mysql__non_blocking(self, conn: Mock) -> None:
+        conn.dialect.name = "mysql"
+        conn.execute.return_value.scalar.return_value = 0
+        assert not MigrationLock(conn).acquire(blocking=False)
+        assert conn.execute.call_args.args[1] == {
+            "name": LOCK_NAME,
+            "timeout": 0,
+        }
+
+    def test_mysql__not_acquired(self, conn: Mock) -> None:
+        conn.dialect.name = "mariadb"
+        conn.execute.return_value.scalar.return_value = None
+        with pytest.raises(LockError):
+            MigrationLock(conn).acquire()
+
+    def test_already_held(self, conn: Mock) -> None:
+        conn.dialect.name = "postgresql"
+        lock = MigrationLock(conn)
+        lock.acquire()
+        with pytest.raises(LockError):
+            lock.acquire()
+
+    def test_release_not_held(self, conn: Mock) -> None:
+        conn.dialect.name = "postgresql"
+        MigrationLock(conn).release()
+        conn.execute.assert_not_called()
+
+    def test_sqlite__memory(self) -> None:
+        engine = create_engine("sqlite://")
+        with engine.connect() as conn:
+            with MigrationLock(conn):
+                pass
+        engine.dispose()
+
+    def test_sqlite__exclusive(
+        self, tmp_path: Path, sqlite_conn: Connection
+    ) -> None:
+        events: list[str] = []
+
+        def other() -> None:
+            with MigrationLock(sqlite_conn):
+                events.append("other")
+
+        with MigrationLock(sqlite_conn):
+            thread = threading.Thread(target=other)
+            thread.start()
+            thread.join(0.2)
+            events.append("main")
+        thread.join()
+        assert events == ["main", "other"]
+        assert (tmp_path / "db.sqlite.lock").exists()
+
+    def test_sqlite__non_blocking(self, sqlite_conn: Connection) -> None:
+        results: list[bool] = []
+
+        def other() -> None:
+            lock = MigrationLock(sqlite_conn)
+            results.append(lock.acquire(blocking=False))
+            lock.release()
+
+        with MigrationLock(sqlite_conn):
+            thread = threading.Thread(target=other)
+            thread.start()
+            thread.join()
+        other()
+        assert results == [False, True]
+
+    def test_lock_table(
+        self, mocker: MockerFixture, sqlite_conn: Connection
+    ) -> None:
+        mocker.patch.object(sqlite_conn.dialect, "name", "oracle")
+        with MigrationLock(sqlite_conn):
+            pass
+        with MigrationLock(sqlite_conn):
+            rows = sqlite_conn.exec_driver_sql(
+                "SELECT name FROM dbupgrade_lock"
+            ).fetchall()
+            sqlite_conn.rollback()
+        assert rows == [(LOCK_NAME,)]
+        assert not sqlite_conn.dialect.has_table(sqlite_conn, "db_config")
+
+    def test_lock_table__non_blocking(
+        self, mocker: MockerFixture, sqlite_conn: Connection
+    ) -> None:
+        mocker.patch.object(sqlite_conn.dialect, "name", "oracle")
+        with pytest.raises(LockError):
+            MigrationLock(sqlite_conn).acquire(blocking=False)
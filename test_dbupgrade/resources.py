@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import importlib
+import sys
+import zipfile
+from collections.abc import Generator
+from pathlib import Path
+
+import pytest
+
+from dbupgrade.resources import resolve_script_path
+
+
+class TestResolveScriptPath:
+    @pytest.fixture
+    def archive(self, tmp_path: Path) -> str:
+        archive = tmp_path / "app.whl"
+        with zipfile.ZipFile(archive, "w") as zf:
+            zf.writestr("zipapp/__init__.py", "")
+            zf.writestr("zipapp/sql/0001.sql", "")
+        return str(archive)
+
+    @pytest.fixture
+    def zip_package(self, archive: str) -> Generator[None, None, None]:
+        sys.path.insert(0, archive)
+        importlib.invalidate_caches()
+        try:
+            yield
+        finally:
+            sys.path.remove(archive)
+            sys.modules.pop("zipapp", None)
+
+    def test_directory(self, tmp_path: Path) -> None:
+        assert resolve_script_path(str(tmp_path)) == str(tmp_path)
+
+    def test_missing(self, tmp_path: Path) -> None:
+        path = str(tmp_path / "missing" / "sql")
+        assert resolve_script_path(path) == path
+
+    def test_file_in_directory(self, tmp_path: Path) -> None:
+        (tmp_path / "foo").write_text("")
+        path = str(tmp_path / "foo" / "sql")
+        assert resolve_script_path(path) == path
+
+    def test_zip_file(self, archive: str) -> None:
+        resolved = resolve_script_path(archive)
+        assert isinstance(resolved, zipfile.Path)
+        assert [r.name for r in resolved.iterdir()] == ["zipapp"]
+
+    def test_directory_in_zip_file(self, archive: str) -> None:
+        resolved = resolve_script_path(archive + "/zipapp/sql")
+        assert isinstance(resolved, zipfile.Path)
+        assert [r.name for r in resolved.iterdir()] == ["0001.sql"]
+
+    def test_package(self) -> None:
+        resolved = resolve_script_path("package:test_dbupgrade")
+        assert resolved == str(Path(__file__).parent)
+
+    def test_zipped_package(self, zip_package: None) -> None:
+        resolved = resolve_script_path("package:zipapp/sql")
+        assert not isinstance(resolved, str)
+        assert [r.name for r in resolved.iterdir()] == ["0001.sql"]
+
+    def test_traversable(self, archive: str) -> None:
+        path = zipfile.Path(archive)
+        assert resolve_script_path(path) is path
+
+    def test_path(self, tmp_path: Path) -> None:
+        assert resolve_script_path(tmp_path) == str(tmp_path)
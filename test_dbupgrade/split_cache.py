@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import os
+from collections.abc import Generator
+from pathlib import Path
+
+import pytest
+from pytest_mock import MockerFixture
+
+import dbupgrade.split_cache
+from dbupgrade.files import FileInfo
+from dbupgrade.split_cache import SplitCache, split_cache_dir
+
+
+def _entries(directory: str) -> list[str]:
+    return sorted(fn for fn in os.listdir(directory) if fn.endswith(".jsonl"))
+
+
+class TestSplitCacheDir:
+    def test_in_cache_dir(self) -> None:
+        assert os.path.dirname(split_cache_dir("/cache")) == "/cache"
+
+
+class TestSplitCache:
+    @pytest.fixture
+    def directory(self, tmp_path: Path) -> str:
+        return str(tmp_path / "cache")
+
+    @pytest.fixture
+    def script(self, tmp_path: Path) -> FileInfo:
+        path = tmp_path / "script.sql"
+        path.write_text("SELECT 'a;b';\nSELECT 2;\n")
+        return FileInfo(str(path), "myschema", "sqlite", 1, 0)
+
+    def test_split(self, directory: str, script: FileInfo) -> None:
+        cache = SplitCache(directory)
+        assert list(cache(script)) == ["SELECT 'a;b'", "SELECT 2"]
+        assert len(_entries(directory)) == 1
+
+    def test_split_once(
+        self, mocker: MockerFixture, directory: str, script: FileInfo
+    ) -> None:
+        read_statements = mocker.spy(dbupgrade.split_cache, "read_statements")
+        list(SplitCache(directory)(script))
+        assert list(SplitCache(directory)(script)) == [
+            "SELECT 'a;b'",
+            "SELECT 2",
+        ]
+        read_statements.assert_called_once()
+
+    def test_content_changed(self, directory: str, script: FileInfo) -> None:
+        cache = SplitCache(directory)
+        list(cache(script))
+        with open(script.filename, "w") as f:
+            f.write("SELECT 3;\n")
+        assert list(cache(script)) == ["SELECT 3"]
+        assert len(_entries(directory)) == 2
+
+    def test_splitter_changed(self, directory: str, script: FileInfo) -> None:
+        list(SplitCache(directory, "native")(script))
+        list(SplitCache(directory, "sqlparse")(script))
+        assert len(_entries(directory)) == 2
+
+    def test_cache_version_changed(
+        self, mocker: MockerFixture, directory: str, script: FileInfo
+    ) -> None:
+        list(SplitCache(directory)(script))
+        mocker.patch("dbupgrade.split_cache.SPLIT_CACHE_VERSION", 999)
+        list(SplitCache(directory)(script))
+        assert len(_entries(directory)) == 2
+
+    def test_partially_read(self, directory: str, script: FileInfo) -> None:
+        statements = SplitCache(directory)(script)
+        assert isinstance(statements, Generator)
+        next(statements)
+        statements.close()
+        assert os.listdir(directory) == []
+
+    def test_evict_least_recently_used(
+        self, tmp_path: Path, directory: str
+    ) -> None:
+        scripts = []
+        for i in range(3):
+            path = tmp_path / f"{i}.sql"
+            path.write_text(f"SELECT {i};\n")
+            scripts.append(FileInfo(str(path), "myschema", "sqlite", i, 0))
+        cache = SplitCache(directory, max_size=30)
+        list(cache(scripts[0]))
+        list(cache(scripts[1]))
+        os.utime(os.path.join(directory, _entries(directory)[0]), ns=(0, 0))
+        list(cache(scripts[2]))
+        assert len(_entries(directory)) == 2
+        for script in scripts[1:]:
+            assert list(cache(script)) == [f"SELECT {script.version}"]
+
+    def test_unwritable(
+        self, mocker: MockerFixture, tmp_path: Path, script: FileInfo
+    ) -> None:
+        logging = mocker.patch("dbupgrade.split_cache.logging")
+        (tmp_path / "file").write_text("")
+        cache = SplitCache(str(tmp_path / "file" / "cache"))
+        assert list(cache(script)) == ["SELECT 'a;b'", "SELECT 2"]
+        logging.warning.assert_called_once()
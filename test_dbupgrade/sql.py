@@ -1,4 +1,82 @@
-from dbupgrade.sql import split_sql
+import glob
+import os.path
+from io import StringIO
+
+import pytest
+import sqlparse
+from pytest_mock import MockerFixture
+
+import dbupgrade.sql
+from dbupgrade.sql import Splitter, iter_sql, split_sql
+
+_DIFFERENTIAL_SCRIPTS = [
+    "SELECT 1;\nSELECT 2;\nSELECT 3",
+    "INSERT INTO foo VALUES ('a;\nb;');\nSELECT 2;",
+    "SELECT 'it''s;\n';\nSELECT 'x\\';\n';\nSELECT 3;",
+    'SELECT "a;\nb";\nSELECT `c;\nd`;\nSELECT 3;',
+    "/* a;\nb; */ SELECT 1;\n-- c;\n# d;\nSELECT 2; -- e\nSELECT 3;",
+    "CREATE FUNCTION f() RETURNS int AS $body$\nBEGIN\n  RETURN 1;\n"
+    "END;\n$body$ LANGUAGE plpgsql;\nSELECT 2;",
+    "CREATE TRIGGER t AFTER INSERT ON foo BEGIN\n  UPDATE foo SET x = 1;\n"
+    "  DELETE FROM bar;\nEND;\nSELECT 2;",
+    "ABC;\nDELIMITER $\nXXX;\nYYY$\nZZZ$\nDELIMITER ;\nDEF;\nGHI;",
+]
+
+# Scripts on which the native splitter must behave exactly like sqlparse.
+_SPLITTER_CORPUS = _DIFFERENTIAL_SCRIPTS + [
+    "",
+    "-- only a comment",
+    "SELECT 1;; SELECT 2",
+    "SELECT 1; -- comment\n-- another comment\nSELECT 2;",
+    "SELECT 1; /* comment */ SELECT 2;",
+    "SELECT /*+ hint */ 1; --+ hint\nSELECT 2;",
+    "SELECT 1; # comment\nSELECT #2;\n",
+    "SELECT 'unterminated; SELECT 2;",
+    "SELECT $$unterminated; SELECT 2;",
+    "SELECT /* unterminated; SELECT 2;",
+    "SELECT $1, :name, ?, %s, %(name)s; SELECT 2;",
+    "SELECT [a;b] FROM x; SELECT x[1;2];",
+    "SELECT a+--b;\nSELECT 2;",
+    "SELECT '\\'; SELECT 2;",
+    'SELECT "a""b;", "c\\";"; SELECT 2;',
+    "SELECT now() AT TIME ZONE 'UTC;'; SELECT 2;",
+    "SELECT begin.x, @begin, #begin, :begin FROM t; SELECT 2;",
+    "SELECT IF(a, b, c); SELECT END(1); SELECT 2;",
+    "BEGIN;\nUPDATE foo SET x = 1;\nCOMMIT;",
+    "BEGIN TRANSACTION;\nUPDATE foo SET x = 1;\nCOMMIT;",
+    "begin work; update foo set x = 1; commit work;",
+    "START TRANSACTION; SELECT 1; COMMIT;",
+    "CREATE OR REPLACE FUNCTION f(x integer) RETURNS integer AS $$\n"
+    "DECLARE\n  y integer;\nBEGIN\n  IF x > 0 THEN\n    y := 1;\n"
+    "  ELSE\n    y := 2;\n  END IF;\n  RETURN y;\nEND;\n$$ LANGUAGE plpgsql;"
+    "\nSELECT f(1);",
+    "CREATE PROCEDURE p()\nBEGIN\n  DECLARE i INT DEFAULT 0;\n"
+    "  WHILE i < 10 DO\n    SET i = i + 1;\n  END WHILE;\n"
+    "  FOR r IN SELECT 1 LOOP\n    SELECT 1;\n  END LOOP;\n"
+    "  CASE i WHEN 1 THEN SELECT 1; ELSE SELECT 2; END CASE;\n"
+    "END;\nSELECT 2;",
+    "CREATE TRIGGER t BEFORE UPDATE ON foo\nFOR EACH ROW\nBEGIN\n"
+    "  SELECT CASE WHEN NEW.x < 0 THEN RAISE(ABORT, 'x') END;\nEND;\n"
+    "INSERT INTO foo VALUES (1);",
+    "CREATE FUNCTION g() RETURNS void AS $body$\nBEGIN\n"
+    "  LOOP\n    EXIT;\n  END LOOP;\nEND;\n$body$ LANGUAGE plpgsql;\n"
+    "DO $$ BEGIN PERFORM g(); END $$;\nSELECT 3;",
+    "SELECT 1\nGO\nSELECT 2\nGO 2\nSELECT 3",
+    "DELIMITER //\nCREATE PROCEDURE p() BEGIN SELECT 1; SELECT 2; END//\n"
+    "DELIMITER ;\nCALL p();",
+    "INSERT INTO foo VALUES (1, 'a'), (2, 'b;c'), (3, E'd\\'e');\n"
+    "INSERT INTO foo VALUES (4, 'f');",
+    "SELECT 1;\r\nSELECT 2;\r\n-- comment\r\nSELECT 3;",
+]
+
+
+_SQLPARSE_VERSION = tuple(int(p) for p in sqlparse.__version__.split(".")[:2])
+
+_SCRIPT_FILES = sorted(
+    glob.glob(
+        os.path.join(os.path.dirname(__file__), "..", "test-scripts", "*.sql")
+    )
+)
 
 
 class TestSplitSQL:
@@ -80,3 +158,59 @@ DEF;GHI
 """
         )
         assert statements == ["ABC", "XXX;\n  YYY;ZZZ", "DEF", "GHI"]
+
+
+@pytest.mark.skipif(
+    _SQLPARSE_VERSION < (0, 6),
+    reason="the native splitter follows the rules of sqlparse 0.6.0",
+)
+class TestSplitters:
+    @pytest.mark.parametrize("sql", _SPLITTER_CORPUS)
+    def test_native_same_as_sqlparse(self, sql: str) -> None:
+        native = split_sql(sql, splitter="native")
+        assert native == split_sql(sql, splitter="sqlparse")
+
+    @pytest.mark.parametrize("filename", _SCRIPT_FILES)
+    def test_scripts_same_as_sqlparse(self, filename: str) -> None:
+        with open(filename, "r") as stream:
+            lines = list(stream)
+        native = list(iter_sql(lines, splitter="native"))
+        assert native == list(iter_sql(lines, splitter="sqlparse"))
+
+
+class TestIterSQL:
+    def test_read_stream(self) -> None:
+        stream = StringIO("SELECT 1;\nSELECT 2;\nSELECT 3;\n")
+        statements = iter_sql(stream, chunk_size=1)
+        assert next(statements) == "SELECT 1"
+        assert stream.tell() < len(stream.getvalue())
+        assert list(statements) == ["SELECT 2", "SELECT 3"]
+
+    @pytest.mark.parametrize("sql", _DIFFERENTIAL_SCRIPTS)
+    @pytest.mark.parametrize("chunk_size", [1, 10, 100])
+    def test_same_as_split_sql(self, sql: str, chunk_size: int) -> None:
+        lines = sql.splitlines(keepends=True)
+        assert list(iter_sql(lines, chunk_size=chunk_size)) == split_sql(sql)
+
+    @pytest.mark.parametrize("splitter", ["native", "sqlparse"])
+    def test_long_statement_linear(
+        self, mocker: MockerFixture, splitter: Splitter
+    ) -> None:
+        body = "  UPDATE foo SET x = 1;\n" * 2000
+        sql = "CREATE TRIGGER t AFTER INSERT ON foo BEGIN\n" + body + "END;\n"
+        split = dbupgrade.sql._SPLIT_FUNCTIONS[splitter]
+        sizes: list[int] = []
+
+        def counting_split(sql: str) -> list[str]:
+            sizes.append(len(sql))
+            return split(sql)
+
+        mocker.patch.dict(
+            dbupgrade.sql._SPLIT_FUNCTIONS, {splitter: counting_split}
+        )
+        statements = list(
+            iter_sql(sql.splitlines(), chunk_size=1000, splitter=splitter)
+        )
+        assert len(statements) == 1
+        # Each character is split a bounded number of times.
+        assert sum(sizes) < 4 * len(sql)
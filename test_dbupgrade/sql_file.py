@@ -1,19 +1,48 @@
 from __future__ import annotations
 
 import os.path
-from io import StringIO
+import zipfile
+from io import BytesIO, StringIO
+from pathlib import Path
 from typing import TYPE_CHECKING
 from unittest.mock import ANY, call, mock_open, patch
 
 import pytest
 
-from dbupgrade.files import FileInfo
-from dbupgrade.sql_file import ParseError, parse_sql_files, parse_sql_stream
+from dbupgrade.files import DEFAULT_FILENAME_PATTERN, FileInfo
+from dbupgrade.sql_file import (
+    ParseError,
+    check_filename_versions,
+    parse_sql_binary_stream,
+    parse_sql_files,
+    parse_sql_stream,
+    read_sql_headers,
+)
 
 if TYPE_CHECKING:
     from _typeshed import SupportsRead
 
 
+class TestCheckFilenameVersions:
+    def test_matching(self) -> None:
+        infos = [
+            FileInfo("/tmp/0012-foo.sql", "myschema", "sqlite", 12, 0),
+            FileInfo("/tmp/foo.sql", "myschema", "sqlite", 13, 0),
+        ]
+        assert (
+            check_filename_versions(infos, DEFAULT_FILENAME_PATTERN) == infos
+        )
+
+    def test_mismatch(self) -> None:
+        info = FileInfo("/tmp/0012-foo.sql", "myschema", "sqlite", 13, 0)
+        with patch("dbupgrade.sql_file.logging") as logging:
+            checked = check_filename_versions([info], DEFAULT_FILENAME_PATTERN)
+        assert checked == []
+        logging.warning.assert_called_once_with(
+            "0012-foo.sql: version header does not match file name"
+        )
+
+
 class TestParseSQLFiles:
     def _create_file_info(self) -> FileInfo:
         return FileInfo("", "myschema", "sqlite", 0, 0)
@@ -24,14 +53,16 @@ class TestParseSQLFiles:
     def test_parse(self) -> None:
         file_info = self._create_file_info()
 
-        def my_parse_stream(stream: SupportsRead[str], _: str) -> FileInfo:
-            assert stream.read() == "file content"
+        def my_parse_stream(stream: SupportsRead[bytes], _: str) -> FileInfo:
+            assert stream.read() == b"file content"
             return file_info
 
         with patch(
-            "dbupgrade.sql_file.open", mock_open(read_data="file content")
+            "dbupgrade.sql_file.open", mock_open(read_data=b"file content")
         ):
-            with patch("dbupgrade.sql_file.parse_sql_stream") as parse_stream:
+            with patch(
+                "dbupgrade.sql_file.parse_sql_binary_stream"
+            ) as parse_stream:
                 parse_stream.side_effect = my_parse_stream
                 files = parse_sql_files(["foo", "bar"])
                 parse_stream.assert_has_calls(
@@ -42,11 +73,11 @@ class TestParseSQLFiles:
     def test_skip_files_with_parse_errors(self) -> None:
         file_info = self._create_file_info()
         with patch(
-            "dbupgrade.sql_file.open", mock_open(read_data="file content")
+            "dbupgrade.sql_file.open", mock_open(read_data=b"file content")
         ):
             with patch("dbupgrade.sql_file.logging") as logging:
                 with patch(
-                    "dbupgrade.sql_file.parse_sql_stream"
+                    "dbupgrade.sql_file.parse_sql_binary_stream"
                 ) as parse_stream:
                     parse_stream.side_effect = [
                         ParseError("test error"),
@@ -58,6 +89,133 @@ class TestParseSQLFiles:
                 logging.warning.assert_called_once_with("foo: test error")
         assert files == [file_info]
 
+    def test_concurrent(
+        self, tmp_path: Path, caplog: pytest.LogCaptureFixture
+    ) -> None:
+        filenames = []
+        for i in range(20):
+            path = tmp_path / f"{i:04}.sql"
+            if i % 7 == 3:
+                path.write_text("-- Schema: myschema\n")
+            else:
+                path.write_text(
+                    "-- Schema: myschema\n"
+                    "-- Dialect: sqlite\n"
+                    f"-- Version: {i}\n"
+                    "-- API-Level: 0\n"
+                )
+            filenames.append(str(path))
+        files = parse_sql_files(filenames, max_workers=4)
+        assert [f.version for f in files] == [
+            i for i in range(20) if i % 7 != 3
+        ]
+        assert caplog.messages == [
+            f"{i:04}.sql: missing header: dialect" for i in [3, 10, 17]
+        ]
+
+    def test_resources(self, tmp_path: Path) -> None:
+        archive = tmp_path / "scripts.zip"
+        with zipfile.ZipFile(archive, "w") as zf:
+            zf.writestr(
+                "0001.sql",
+                "-- Schema: myschema\n"
+                "-- Dialect: sqlite\n"
+                "-- Version: 1\n"
+                "-- API-Level: 0\n",
+            )
+            zf.writestr("0002.sql", "-- Schema: myschema\n")
+        resources = [
+            zipfile.Path(archive, "0001.sql"),
+            zipfile.Path(archive, "0002.sql"),
+        ]
+        with patch("dbupgrade.sql_file.logging") as logging:
+            files = parse_sql_files(resources)
+        logging.warning.assert_called_once_with(
+            "0002.sql: missing header: dialect"
+        )
+        assert len(files) == 1
+        assert files[0].filename == os.path.join(str(archive), "0001.sql")
+        assert files[0].version == 1
+        assert files[0].resource is resources[0]
+
+
+_HEADERS = (
+    b"-- Schema: my-schema\n"
+    b"-- Dialect: sqlite\n"
+    b"-- Version: 13\n"
+    b"-- API-Level: 3\n"
+)
+
+
+class TestReadSQLHeaders:
+    def test_headers(self) -> None:
+        stream = BytesIO(_HEADERS + b"\nUPDATE foo SET bar = 99;\n")
+        headers, offset = read_sql_headers(stream)
+        assert headers == {
+            "schema": "my-schema",
+            "dialect": "sqlite",
+            "version": "13",
+            "api-level": "3",
+        }
+        assert offset == len(_HEADERS)
+
+    def test_crlf(self) -> None:
+        stream = BytesIO(
+            b"-- Schema: my-schema\r\n-- Version: 13\r\nSELECT 1;"
+        )
+        headers, offset = read_sql_headers(stream)
+        assert headers == {"schema": "my-schema", "version": "13"}
+        assert offset == 38
+
+    def test_no_trailing_newline(self) -> None:
+        headers, offset = read_sql_headers(BytesIO(b"-- Schema: my-schema"))
+        assert headers == {"schema": "my-schema"}
+        assert offset == 20
+
+    def test_lines_across_chunks(
+        self, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        monkeypatch.setattr("dbupgrade.sql_file.HEADER_CHUNK_SIZE", 21)
+        stream = BytesIO(
+            b"-- Schema: my-schema\r\n-- Comment: "
+            + b"x" * 50
+            + b"\nSELECT 1;"
+        )
+        headers, offset = read_sql_headers(stream)
+        assert headers == {"schema": "my-schema", "comment": "x" * 50}
+        assert offset == 85
+
+    def test_long_first_statement(self) -> None:
+        stream = BytesIO(
+            _HEADERS + b"INSERT INTO foo VALUES " + b"(1)," * 10**6
+        )
+        headers, offset = read_sql_headers(stream)
+        assert len(headers) == 4
+        assert offset == len(_HEADERS)
+        assert stream.tell() <= 2 * 4096
+
+    def test_not_decodable(self) -> None:
+        stream = BytesIO(b"-- Schema: my-schema\n-- Dialect: \xff\xfe\n")
+        headers, offset = read_sql_headers(stream)
+        assert headers == {"schema": "my-schema"}
+        assert offset == 21
+
+
+class TestParseSQLBinaryStream:
+    def test_parse(self) -> None:
+        info = parse_sql_binary_stream(
+            BytesIO(_HEADERS + b"-- Transaction: no\nSELECT 1;"), "/foo/bar"
+        )
+        assert info.filename == "/foo/bar"
+        assert info.schema == "my-schema"
+        assert info.version == 13
+        assert not info.transaction
+        assert info.body_offset == len(_HEADERS) + 19
+
+    def test_missing_header(self) -> None:
+        with pytest.raises(ParseError, match="missing header: api-level"):
+            parse_sql_binary_stream(BytesIO(_HEADERS[:-17]), "/foo/bar")
+
 
 class TestParseSQLStream:
     def test_required_headers(self) -> None:
@@ -79,6 +237,7 @@ UPDATE foo SET bar = 99;
         assert info.version == 13
         assert info.api_level == 3
         assert info.transaction
+        assert info.execution is None
 
     def test_transaction_yes(self) -> None:
         info = parse_sql_stream(
@@ -108,6 +267,84 @@ UPDATE foo SET bar = 99;
         )
         assert not info.transaction
 
+    def test_execution(self) -> None:
+        info = parse_sql_stream(
+            StringIO(
+                """-- Schema: my-schema
+-- Dialect: sqlite
+-- Version: 25
+-- API-Level: 3
+-- Execution: driver
+            """
+            ),
+            "",
+        )
+        assert info.execution == "driver"
+
+    def test_execution_invalid(self) -> None:
+        with pytest.raises(
+            ParseError,
+            match="header must be one of 'text', 'driver', 'batch': execution",
+        ):
+            parse_sql_stream(
+                StringIO(
+                    """-- Schema: my-schema
+-- Dialect: sqlite
+-- Version: 25
+-- API-Level: 3
+-- Execution: raw
+            """
+                ),
+                "",
+            )
+
+    def test_bulk_load(self) -> None:
+        info = parse_sql_stream(
+            StringIO(
+                """-- Schema: my-schema
+-- Dialect: postgresql
+-- Version: 25
+-- API-Level: 3
+-- Bulk-Load: copy
+            """
+            ),
+            "",
+        )
+        assert info.bulk_load == "copy"
+
+    def test_bulk_load_invalid(self) -> None:
+        with pytest.raises(
+            ParseError, match="header must be one of 'copy': bulk-load"
+        ):
+            parse_sql_stream(
+                StringIO(
+                    """-- Schema: my-schema
+-- Dialect: postgresql
+-- Version: 25
+-- API-Level: 3
+-- Bulk-Load: insert
+            """
+                ),
+                "",
+            )
+
+    def test_bulk_load_wrong_dialect(self) -> None:
+        with pytest.raises(
+            ParseError,
+            match="header requires the postgresql dialect: bulk-load",
+        ):
+            parse_sql_stream(
+                StringIO(
+                    """-- Schema: my-schema
+-- Dialect: sqlite
+-- Version: 25
+-- API-Level: 3
+-- Bulk-Load: copy
+            """
+                ),
+                "",
+            )
+
     def test_schema_missing(self) -> None:
         with pytest.raises(ParseError, match="missing header: schema"):
             parse_sql_stream(
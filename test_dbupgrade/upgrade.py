@@ -1,13 +1,40 @@
 from __future__ import annotations
 
+import asyncio
+import os.path
+import threading
+import zipfile
+from collections.abc import Generator
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from typing import cast
 from unittest.mock import ANY, Mock, patch
 
 import pytest
 from pytest_mock import MockerFixture
+from sqlalchemy import Engine, create_engine
 
-from dbupgrade.files import FileInfo
+import dbupgrade.apply
+import dbupgrade.upgrade
+from dbupgrade.bundle import write_bundle
+from dbupgrade.files import (
+    DEFAULT_FILENAME_PATTERN,
+    DIRECTORY_INDEX,
+    FileInfo,
+)
+from dbupgrade.filter import Filter
+from dbupgrade.index import index_path
+from dbupgrade.lock import MigrationLock
+from dbupgrade.options import UpgradeOptions
 from dbupgrade.result import UpgradeResult, VersionResult
-from dbupgrade.upgrade import db_upgrade
+from dbupgrade.sql import Splitter
+from dbupgrade.upgrade import (
+    db_upgrade,
+    db_upgrade_async,
+    db_upgrade_many,
+    db_upgrade_schemas,
+    filter_files,
+)
 from dbupgrade.version import MAX_VERSION, VersionInfo, VersionMatcher
 
 
@@ -16,6 +43,17 @@ class TestDBUpgrade:
     def logging(self, mocker: MockerFixture) -> Mock:
         return mocker.patch("dbupgrade.upgrade.logging")
 
+    @pytest.fixture(autouse=True)
+    def connect(self, mocker: MockerFixture) -> Mock:
+        connect = mocker.patch("dbupgrade.upgrade.connect")
+        conn = connect.return_value.__enter__.return_value
+        conn.dialect.name = "postgresql"
+        return connect
+
+    @pytest.fixture
+    def conn(self, connect: Mock) -> Mock:
+        return cast(Mock, connect.return_value.__enter__.return_value)
+
     @pytest.fixture(autouse=True)
     def fetch_current_db_versions(self, mocker: MockerFixture) -> Mock:
         return mocker.patch(
@@ -45,26 +83,155 @@ class TestDBUpgrade:
 
     def test_exercise(
         self,
+        connect: Mock,
+        conn: Mock,
         fetch_current_db_versions: Mock,
         collect_sql_files: Mock,
         parse_sql_files: Mock,
         apply_files: Mock,
     ) -> None:
         filenames = ["/tmp/foo", "/tmp/bar"]
-        file_infos = [FileInfo("", "myschema", "postgres", 150, 30)]
+        file_infos = [FileInfo("", "myschema", "postgresql", 150, 30)]
         fetch_current_db_versions.return_value = 123, 44
         collect_sql_files.return_value = filenames
         parse_sql_files.return_value = file_infos
         db_upgrade(
             "myschema", "postgres://localhost/foo", "/tmp", VersionInfo()
         )
-        fetch_current_db_versions.assert_called_once_with(
-            "postgres://localhost/foo", "myschema"
+        connect.assert_called_once_with("postgres://localhost/foo")
+        fetch_current_db_versions.assert_called_once_with(conn, "myschema")
+        collect_sql_files.assert_called_once_with(
+            "/tmp", None, 124, recursive=False, include=(), exclude=()
+        )
+        parse_sql_files.assert_called_once_with(filenames, max_workers=1)
+        apply_files.assert_called_once_with(
+            conn,
+            file_infos,
+            ANY,
+            execution="text",
+            bulk_inserts=False,
+            group_size=1,
+            version_batch_size=1,
+            atomic=False,
+        )
+
+    def test_no_lock(
+        self, mocker: MockerFixture, fetch_current_db_versions: Mock
+    ) -> None:
+        migration_lock = mocker.patch("dbupgrade.upgrade.MigrationLock")
+        db_upgrade(
+            "myschema", "postgres://localhost/foo", "/tmp", VersionInfo()
+        )
+        migration_lock.assert_not_called()
+
+    def test_lock(
+        self,
+        mocker: MockerFixture,
+        conn: Mock,
+        fetch_current_db_versions: Mock,
+        apply_files: Mock,
+    ) -> None:
+        manager = Mock()
+        migration_lock = mocker.patch("dbupgrade.upgrade.MigrationLock")
+        manager.attach_mock(migration_lock.return_value, "lock")
+        manager.attach_mock(fetch_current_db_versions, "fetch")
+        manager.attach_mock(apply_files, "apply")
+        db_upgrade(
+            "myschema",
+            "postgres://localhost/foo",
+            "/tmp",
+            VersionInfo(),
+            UpgradeOptions(lock=True),
+        )
+        migration_lock.assert_called_once_with(conn)
+        assert [c[0] for c in manager.mock_calls] == [
+            "lock.__enter__",
+            "fetch",
+            "apply",
+            "lock.__exit__",
+        ]
+
+    def test_cache_dir(
+        self,
+        mocker: MockerFixture,
+        collect_sql_files: Mock,
+        parse_sql_files: Mock,
+        apply_files: Mock,
+    ) -> None:
+        file_infos = [FileInfo("", "myschema", "postgresql", 150, 0)]
+        collect_sql_files.return_value = ["/tmp/foo"]
+        parse_indexed = mocker.patch(
+            "dbupgrade.upgrade.parse_sql_files_indexed",
+            return_value=file_infos,
+        )
+        db_upgrade(
+            "myschema",
+            "postgres://localhost/foo",
+            "/tmp",
+            VersionInfo(),
+            UpgradeOptions(cache_dir="/var/cache"),
+        )
+        parse_sql_files.assert_not_called()
+        parse_indexed.assert_called_once_with(
+            ["/tmp/foo"], index_path("/var/cache", "/tmp"), max_workers=1
+        )
+        apply_files.assert_called_once_with(
+            ANY,
+            file_infos,
+            ANY,
+            execution="text",
+            bulk_inserts=False,
+            group_size=1,
+            version_batch_size=1,
+            atomic=False,
+        )
+
+    def test_parse_workers(self, parse_sql_files: Mock) -> None:
+        db_upgrade(
+            "myschema",
+            "postgres://localhost/foo",
+            "/tmp",
+            VersionInfo(),
+            UpgradeOptions(parse_workers=8),
+        )
+        parse_sql_files.assert_called_once_with([], max_workers=8)
+
+    def test_filename_versions(
+        self,
+        fetch_current_db_versions: Mock,
+        collect_sql_files: Mock,
+        parse_sql_files: Mock,
+        apply_files: Mock,
+    ) -> None:
+        fetch_current_db_versions.return_value = 12, 0
+        collect_sql_files.return_value = ["/tmp/0013-foo.sql"]
+        good = FileInfo("/tmp/0013-foo.sql", "myschema", "postgresql", 13, 0)
+        bad = FileInfo("/tmp/0014-foo.sql", "myschema", "postgresql", 15, 0)
+        parse_sql_files.return_value = [good, bad]
+        db_upgrade(
+            "myschema",
+            "postgres://localhost/foo",
+            "/tmp",
+            VersionInfo(),
+            UpgradeOptions(filename_pattern=DEFAULT_FILENAME_PATTERN),
+        )
+        collect_sql_files.assert_called_once_with(
+            "/tmp",
+            DEFAULT_FILENAME_PATTERN,
+            13,
+            recursive=False,
+            include=(),
+            exclude=(),
         )
-        collect_sql_files.assert_called_once_with("/tmp")
-        parse_sql_files.assert_called_once_with(filenames)
         apply_files.assert_called_once_with(
-            "postgres://localhost/foo", file_infos
+            ANY,
+            [good],
+            ANY,
+            execution="text",
+            bulk_inserts=False,
+            group_size=1,
+            version_batch_size=1,
+            atomic=False,
         )
 
     def test_filter(
@@ -74,13 +241,15 @@ class TestDBUpgrade:
         apply_files: Mock,
     ) -> None:
         fetch_current_db_versions.return_value = 130, 34
-        file_info = FileInfo("", "myschema", "", 0, 0)
+        file_info = FileInfo("", "myschema", "postgresql", 131, 12)
         parse_sql_files.return_value = [
             file_info,
-            FileInfo("", "otherschema", "", 0, 0),
+            FileInfo("", "otherschema", "postgresql", 131, 0),
+            FileInfo("", "myschema", "sqlite", 131, 0),
+            FileInfo("", "myschema", "postgresql", 130, 0),
+            FileInfo("", "myschema", "postgresql", 132, 13),
         ]
-        with patch("dbupgrade.upgrade.Filter") as filter_:
-            filter_.return_value.matches = lambda fi: fi.schema == "myschema"
+        with patch("dbupgrade.upgrade.Filter", wraps=Filter) as filter_:
             db_upgrade(
                 "myschema",
                 "postgres://localhost/foo",
@@ -88,24 +257,40 @@ class TestDBUpgrade:
                 VersionInfo(api_level=12),
             )
             filter_.assert_called_once_with(
-                "myschema", "postgres", VersionMatcher(131, MAX_VERSION, 12)
+                "myschema", "postgresql", VersionMatcher(131, MAX_VERSION, 12)
             )
-            apply_files.assert_called_once_with(ANY, [file_info])
+        apply_files.assert_called_once_with(
+            ANY,
+            [file_info],
+            ANY,
+            execution="text",
+            bulk_inserts=False,
+            group_size=1,
+            version_batch_size=1,
+            atomic=False,
+        )
 
     def test_order(self, parse_sql_files: Mock, apply_files: Mock) -> None:
-        fi123 = FileInfo("", "myschema", "postgres", 123, 0)
-        fi122 = FileInfo("", "myschema", "postgres", 122, 0)
-        fi124 = FileInfo("", "myschema", "postgres", 124, 0)
+        fi123 = FileInfo("", "myschema", "postgresql", 123, 0)
+        fi122 = FileInfo("", "myschema", "postgresql", 122, 0)
+        fi124 = FileInfo("", "myschema", "postgresql", 124, 0)
         parse_sql_files.return_value = [fi123, fi122, fi124]
-        with patch("dbupgrade.upgrade.Filter") as filter_:
-            filter_.return_value.return_value.matches.return_value = True
-            db_upgrade(
-                "myschema",
-                "postgres://localhost/foo",
-                "/tmp",
-                VersionInfo(),
-            )
-            apply_files.assert_called_once_with(ANY, [fi122, fi123, fi124])
+        db_upgrade(
+            "myschema",
+            "postgres://localhost/foo",
+            "/tmp",
+            VersionInfo(),
+        )
+        apply_files.assert_called_once_with(
+            ANY,
+            [fi122, fi123, fi124],
+            ANY,
+            execution="text",
+            bulk_inserts=False,
+            group_size=1,
+            version_batch_size=1,
+            atomic=False,
+        )
 
     def test_log(self, logging: Mock, fetch_current_db_versions: Mock) -> None:
         fetch_current_db_versions.return_value = 123, 44
@@ -170,3 +355,447 @@ class TestDBUpgrade:
             [file_info1],
             file_info2,
         )
+
+
+class TestFilterFiles:
+    def test_filter(self) -> None:
+        fi2 = FileInfo("", "myschema", "postgresql", 2, 0)
+        fi1 = FileInfo("", "myschema", "postgresql", 1, 0)
+        files = [
+            fi2,
+            FileInfo("", "otherschema", "postgresql", 1, 0),
+            FileInfo("", "myschema", "sqlite", 1, 0),
+            FileInfo("", "myschema", "postgresql", 0, 0),
+            FileInfo("", "myschema", "postgresql", 3, 5),
+            fi1,
+        ]
+        filter_ = Filter("myschema", "postgresql", VersionMatcher(1, 10, 4))
+        assert filter_files(files, filter_) == [fi1, fi2]
+
+
+class TestDBUpgradeWithEngine:
+    @pytest.fixture
+    def engine(self) -> Generator[Engine, None, None]:
+        with NamedTemporaryFile(prefix="test-", suffix=".sqlite") as f:
+            engine = create_engine(f"sqlite:///{f.name}")
+            yield engine
+            engine.dispose()
+
+    @pytest.fixture
+    def script_path(self) -> str:
+        return os.path.join(os.path.dirname(__file__), "..", "test-scripts")
+
+    def test_engine(self, engine: Engine, script_path: str) -> None:
+        result = db_upgrade("dbupgrade", engine, script_path, VersionInfo())
+        assert result.success
+        assert result.new_version == VersionResult(1, 0)
+
+    def test_connection(self, engine: Engine, script_path: str) -> None:
+        with engine.connect() as conn:
+            result = db_upgrade("dbupgrade", conn, script_path, VersionInfo())
+            assert not conn.closed
+        assert result.success
+        assert result.new_version == VersionResult(1, 0)
+
+
+class TestDBUpgradeBundle:
+    @pytest.fixture
+    def bundle_file(self, tmp_path: Path) -> str:
+        script_path = os.path.join(
+            os.path.dirname(__file__), "..", "test-scripts"
+        )
+        bundle_file = str(tmp_path / "scripts.bundle")
+        write_bundle(script_path, bundle_file)
+        return bundle_file
+
+    @pytest.fixture
+    def db_url(self, tmp_path: Path) -> str:
+        return f"sqlite:///{tmp_path}/db.sqlite"
+
+    def test_upgrade(self, db_url: str, bundle_file: str) -> None:
+        result = db_upgrade("dbupgrade", db_url, bundle_file, VersionInfo())
+        assert result.success
+        assert result.new_version == VersionResult(1, 0)
+        assert [
+            os.path.basename(f.filename) for f in result.applied_scripts
+        ] == [
+            "0000-init.sql",
+            "0001-modulo.sql",
+        ]
+
+    def test_only_load_pending(
+        self, mocker: MockerFixture, db_url: str, bundle_file: str
+    ) -> None:
+        db_upgrade(
+            "dbupgrade", db_url, bundle_file, VersionInfo(max_version=0)
+        )
+        read_bundled_statements = mocker.spy(
+            dbupgrade.upgrade, "read_bundled_statements"
+        )
+        db_upgrade("dbupgrade", db_url, bundle_file, VersionInfo())
+        read_bundled_statements.assert_called_once()
+        assert read_bundled_statements.call_args.args[0].version == 1
+
+    def test_cache_dir(
+        self, tmp_path: Path, db_url: str, bundle_file: str
+    ) -> None:
+        options = UpgradeOptions(cache_dir=str(tmp_path / "cache"))
+        result = db_upgrade(
+            "dbupgrade", db_url, bundle_file, VersionInfo(), options
+        )
+        assert result.success
+        assert not os.path.exists(tmp_path / "cache")
+
+
+class TestDBUpgradeZip:
+    @pytest.fixture
+    def archive(self, tmp_path: Path) -> str:
+        script_path = os.path.join(
+            os.path.dirname(__file__), "..", "test-scripts"
+        )
+        archive = str(tmp_path / "scripts.zip")
+        with zipfile.ZipFile(archive, "w") as zf:
+            for fn in os.listdir(script_path):
+                zf.write(os.path.join(script_path, fn), "sql/" + fn)
+        return archive
+
+    @pytest.fixture
+    def db_url(self, tmp_path: Path) -> str:
+        return f"sqlite:///{tmp_path}/db.sqlite"
+
+    def test_upgrade(self, db_url: str, archive: str) -> None:
+        result = db_upgrade(
+            "dbupgrade", db_url, archive + "/sql", VersionInfo()
+        )
+        assert result.success
+        assert result.new_version == VersionResult(1, 0)
+        assert [
+            os.path.basename(f.filename) for f in result.applied_scripts
+        ] == [
+            "0000-init.sql",
+            "0001-modulo.sql",
+        ]
+
+    def test_traversable(self, db_url: str, archive: str) -> None:
+        script_path = zipfile.Path(archive, "sql/")
+        result = db_upgrade("dbupgrade", db_url, script_path, VersionInfo())
+        assert result.new_version == VersionResult(1, 0)
+
+    def test_cache_dir(
+        self, tmp_path: Path, db_url: str, archive: str
+    ) -> None:
+        options = UpgradeOptions(cache_dir=str(tmp_path / "cache"))
+        result = db_upgrade(
+            "dbupgrade", db_url, archive + "/sql", VersionInfo(), options
+        )
+        assert result.success
+        assert len(os.listdir(tmp_path / "cache" / "statements")) == 2
+
+    def test_bundle(self, tmp_path: Path, db_url: str, archive: str) -> None:
+        bundle_file = str(tmp_path / "scripts.bundle")
+        write_bundle(archive + "/sql", bundle_file)
+        result = db_upgrade("dbupgrade", db_url, bundle_file, VersionInfo())
+        assert result.new_version == VersionResult(1, 0)
+
+
+class TestDBUpgradeSchemas:
+    @pytest.fixture
+    def script_path(self, tmp_path: Path) -> str:
+        for schema in ["schema1", "schema2"]:
+            for version in range(2):
+                path = tmp_path / f"{schema}-{version}.sql"
+                path.write_text(
+                    f"-- Schema: {schema}\n"
+                    "-- Dialect: sqlite\n"
+                    f"-- Version: {version}\n"
+                    "-- API-Level: 0\n"
+                    "\n"
+                    f"CREATE TABLE {schema}_{version}(id INTEGER);\n"
+                )
+        (tmp_path / "other.sql").write_text(
+            "-- Schema: other\n"
+            "-- Dialect: postgresql\n"
+            "-- Version: 0\n"
+            "-- API-Level: 0\n"
+        )
+        return str(tmp_path)
+
+    @pytest.fixture
+    def db_url(self, tmp_path: Path) -> str:
+        return f"sqlite:///{tmp_path}/db.sqlite"
+
+    def test_schemas(self, db_url: str, script_path: str) -> None:
+        results = db_upgrade_schemas(
+            ["schema2", "schema1"], db_url, script_path, VersionInfo()
+        )
+        assert list(results) == ["schema2", "schema1"]
+        for result in results.values():
+            assert result.success
+            assert result.new_version == VersionResult(1, 0)
+            assert len(result.applied_scripts) == 2
+
+    def test_all_schemas(self, db_url: str, script_path: str) -> None:
+        results = db_upgrade_schemas(None, db_url, script_path, VersionInfo())
+        assert list(results) == ["schema1", "schema2"]
+
+    def test_parse_once(
+        self, mocker: MockerFixture, db_url: str, script_path: str
+    ) -> None:
+        collect_sql_files = mocker.spy(dbupgrade.upgrade, "collect_sql_files")
+        parse_sql_files = mocker.spy(dbupgrade.upgrade, "parse_sql_files")
+        db_upgrade_schemas(None, db_url, script_path, VersionInfo())
+        assert collect_sql_files.call_count == 1
+        assert parse_sql_files.call_count == 1
+
+    def test_filename_versions(
+        self, mocker: MockerFixture, db_url: str, script_path: str
+    ) -> None:
+        pattern = r"schema\d-(\d+)\."
+        options = UpgradeOptions(filename_pattern=pattern)
+        db_upgrade_schemas(
+            ["schema1"], db_url, script_path, VersionInfo(max_version=0)
+        )
+        collect_sql_files = mocker.spy(dbupgrade.upgrade, "collect_sql_files")
+        results = db_upgrade_schemas(
+            ["schema1", "schema2"], db_url, script_path, VersionInfo(), options
+        )
+        collect_sql_files.assert_called_once_with(
+            script_path, pattern, 0, recursive=False, include=(), exclude=()
+        )
+        assert len(results["schema1"].applied_scripts) == 1
+        assert len(results["schema2"].applied_scripts) == 2
+
+
+class TestDBUpgradeRecursive:
+    @pytest.fixture
+    def script_path(self, tmp_path: Path) -> str:
+        for year, version in [(2023, 0), (2023, 1), (2024, 2)]:
+            path = tmp_path / "sql" / "myschema" / str(year) / f"{version}.sql"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(
+                "-- Schema: myschema\n"
+                "-- Dialect: sqlite\n"
+                f"-- Version: {version}\n"
+                "-- API-Level: 0\n"
+                "\n"
+                f"CREATE TABLE t{version}(id INTEGER);\n"
+            )
+        return str(tmp_path / "sql")
+
+    @pytest.fixture
+    def db_url(self, tmp_path: Path) -> str:
+        return f"sqlite:///{tmp_path}/db.sqlite"
+
+    def test_upgrade(self, db_url: str, script_path: str) -> None:
+        options = UpgradeOptions(recursive=True)
+        result = db_upgrade(
+            "myschema", db_url, script_path, VersionInfo(), options
+        )
+        assert result.new_version == VersionResult(2, 0)
+        assert len(result.applied_scripts) == 3
+
+    def test_prune_applied_directories(
+        self, mocker: MockerFixture, db_url: str, script_path: str
+    ) -> None:
+        options = UpgradeOptions(recursive=True)
+        db_upgrade(
+            "myschema",
+            db_url,
+            script_path,
+            VersionInfo(max_version=1),
+            options,
+        )
+        with open(
+            os.path.join(script_path, "myschema", "2023", DIRECTORY_INDEX), "w"
+        ) as f:
+            f.write('{"maxVersion": 1}')
+        parse_sql_files = mocker.spy(dbupgrade.upgrade, "parse_sql_files")
+        result = db_upgrade(
+            "myschema", db_url, script_path, VersionInfo(), options
+        )
+        assert len(parse_sql_files.call_args.args[0]) == 1
+        assert result.new_version == VersionResult(2, 0)
+
+
+class TestDBUpgradeMany:
+    @pytest.fixture
+    def script_path(self) -> str:
+        return os.path.join(os.path.dirname(__file__), "..", "test-scripts")
+
+    @pytest.fixture
+    def db_urls(self, tmp_path: Path) -> list[str]:
+        return [f"sqlite:///{tmp_path}/db{i}.sqlite" for i in range(3)]
+
+    def test_upgrade_all(self, db_urls: list[str], script_path: str) -> None:
+        results = db_upgrade_many(
+            "dbupgrade", db_urls, script_path, VersionInfo(), max_workers=2
+        )
+        assert list(results) == db_urls
+        for result in results.values():
+            assert result.success
+            assert result.new_version == VersionResult(1, 0)
+
+    def test_parse_and_split_once(
+        self, mocker: MockerFixture, db_urls: list[str], script_path: str
+    ) -> None:
+        parse_sql_files = mocker.spy(dbupgrade.upgrade, "parse_sql_files")
+        iter_sql = mocker.spy(dbupgrade.apply, "iter_sql")
+        db_upgrade_many("dbupgrade", db_urls, script_path, VersionInfo())
+        assert parse_sql_files.call_count == 1
+        assert iter_sql.call_count == 2
+
+    def test_database_error(
+        self, tmp_path: Path, db_urls: list[str], script_path: str
+    ) -> None:
+        bad_url = f"sqlite:///{tmp_path}/missing/db.sqlite"
+        urls = [db_urls[0], bad_url, db_urls[1]]
+        results = db_upgrade_many(
+            "dbupgrade", urls, script_path, VersionInfo(), max_workers=1
+        )
+        assert list(results) == urls
+        assert results[db_urls[0]].success
+        assert results[db_urls[1]].success
+        failed = results[bad_url]
+        assert not failed.success
+        assert failed.error is not None
+        assert "unable to open database file" in failed.error
+        assert failed.failed_script is None
+        assert failed.applied_scripts == []
+
+    def test_exception(
+        self, mocker: MockerFixture, db_urls: list[str], script_path: str
+    ) -> None:
+        mocker.patch(
+            "dbupgrade.upgrade.fetch_current_db_versions",
+            side_effect=RuntimeError(),
+        )
+        with pytest.raises(RuntimeError):
+            db_upgrade_many("dbupgrade", db_urls, script_path, VersionInfo())
+
+
+class TestDBUpgradeAsync:
+    @pytest.fixture(autouse=True)
+    def aiosqlite(self) -> None:
+        pytest.importorskip("aiosqlite")
+        pytest.importorskip("greenlet")
+
+    @pytest.fixture
+    def db_url(self) -> Generator[str, None, None]:
+        with NamedTemporaryFile(prefix="test-", suffix=".sqlite") as f:
+            yield f"sqlite+aiosqlite:///{f.name}"
+
+    @pytest.fixture
+    def script_path(self) -> str:
+        return os.path.join(os.path.dirname(__file__), "..", "test-scripts")
+
+    def test_upgrade(self, db_url: str, script_path: str) -> None:
+        result = asyncio.run(
+            db_upgrade_async("dbupgrade", db_url, script_path, VersionInfo())
+        )
+        assert result.success
+        assert result.old_version == VersionResult(-1, 0)
+        assert result.new_version == VersionResult(1, 0)
+        assert [f.version for f in result.applied_scripts] == [0, 1]
+
+    def test_lock(self, db_url: str, script_path: str) -> None:
+        result = asyncio.run(
+            db_upgrade_async(
+                "dbupgrade",
+                db_url,
+                script_path,
+                VersionInfo(),
+                UpgradeOptions(lock=True),
+            )
+        )
+        assert result.success
+        assert result.new_version == VersionResult(1, 0)
+
+    def test_lock_does_not_block_loop(
+        self, db_url: str, script_path: str
+    ) -> None:
+        engine = create_engine(db_url.replace("+aiosqlite", ""))
+        ticks = 0
+
+        async def tick() -> None:
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        async def upgrade() -> UpgradeResult:
+            ticker = asyncio.create_task(tick())
+            with engine.connect() as conn:
+                lock = MigrationLock(conn)
+                lock.acquire()
+                asyncio.get_running_loop().call_later(0.3, lock.release)
+                result = await db_upgrade_async(
+                    "dbupgrade",
+                    db_url,
+                    script_path,
+                    VersionInfo(),
+                    UpgradeOptions(lock=True),
+                )
+            ticker.cancel()
+            return result
+
+        result = asyncio.run(upgrade())
+        engine.dispose()
+        assert result.success
+        assert ticks >= 10
+
+    def test_parse_off_loop(
+        self, mocker: MockerFixture, db_url: str, script_path: str
+    ) -> None:
+        threads: list[int] = []
+
+        def parse_sql_files(
+            files: list[str], *, max_workers: int
+        ) -> list[FileInfo]:
+            threads.append(threading.get_ident())
+            return []
+
+        mocker.patch(
+            "dbupgrade.upgrade.parse_sql_files", side_effect=parse_sql_files
+        )
+        asyncio.run(
+            db_upgrade_async("dbupgrade", db_url, script_path, VersionInfo())
+        )
+        assert len(threads) == 1
+        assert threads[0] != threading.get_ident()
+
+    def test_split_off_loop(
+        self, mocker: MockerFixture, db_url: str, script_path: str
+    ) -> None:
+        threads: list[int] = []
+
+        def read_statements(
+            file_info: FileInfo, splitter: Splitter
+        ) -> list[str]:
+            threads.append(threading.get_ident())
+            return list(dbupgrade.apply.read_statements(file_info, splitter))
+
+        mocker.patch(
+            "dbupgrade.upgrade.read_statements", side_effect=read_statements
+        )
+        result = asyncio.run(
+            db_upgrade_async("dbupgrade", db_url, script_path, VersionInfo())
+        )
+        assert result.success
+        assert len(threads) == 2
+        assert threading.get_ident() not in threads
+
+    def test_split_error(self, tmp_path: Path, db_url: str) -> None:
+        headers = "-- Schema: dbupgrade\n-- Dialect: sqlite\n-- API-Level: 0\n"
+        (tmp_path / "0000.sql").write_text(
+            headers + "-- Version: 0\n\nCREATE TABLE foo(x INT);\n"
+        )
+        (tmp_path / "0001.sql").write_bytes(
+            (headers + "-- Version: 1\n\nSELECT 1;\n").encode() + b"\xff;\n"
+        )
+        result = asyncio.run(
+            db_upgrade_async("dbupgrade", db_url, str(tmp_path), VersionInfo())
+        )
+        assert not result.success
+        assert [f.version for f in result.applied_scripts] == [0]
+        assert result.failed_script is not None
+        assert result.failed_script.version == 1